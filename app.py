@@ -1,8 +1,20 @@
-from flask import Flask, render_template, request, jsonify, url_for, redirect, flash
+from flask import Flask, Response, render_template, request, jsonify, url_for, redirect, flash
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user, AnonymousUserMixin
-from datetime import datetime
-from utils.twse import get_stock_basic_info, get_market_summary, get_stock_name
+from datetime import datetime, timedelta
+from utils.twse import get_stock_basic_info, get_stock_quotes, get_market_summary, get_cache_stats, clean_stock_code, reject_stock_code, is_pending
 from utils.chatbot import process_chat_message
+from utils.source_health import get_source_health
+from utils.source_ranking import get_source_rankings
+from utils.poller import POLLER_CONFIG, start_poller, get_poller_stats
+from utils.quote import Quote, as_dict, format_change, format_percent, format_price as format_quote_price
+from utils.indicators import INDICATOR_CONFIG, get_indicators, get_indicator_summary, parse_indicator_spec
+from utils.history import schedule_backfill
+from utils.intraday import INTRADAY_CONFIG, get_ticks, get_intraday_stats
+from utils.screener import SCREENER_FILTERS, SORT_KEYS, parse_filters, screen
+from utils.popular import POPULAR_STOCKS, get_popular_codes, get_popular_snapshot
+from utils.stream import STREAM_CONFIG, quote_events, open_stream
+from utils.hub import get_hub_stats
+from utils.alerts import ALERT_CONFIG, start_alert_evaluator, get_alert_stats
 
 from models import db, User, Watchlist, SearchHistory, PriceAlert
 from forms import LoginForm, RegisterForm, ProfileForm, ChangePasswordForm, WatchlistForm, PriceAlertForm
@@ -28,28 +40,92 @@ login_manager.login_message_category = 'info'
 def load_user(user_id):
     return db.session.get(User, int(user_id))
 
+
+# 批次報價 API 單次請求的代碼數量上限（依會員等級，未登入為 anonymous）
+BULK_QUOTE_LIMITS = {
+    'anonymous': 10,
+    'free': 30,
+    'premium': 200,
+    'vip': 1000,
+}
+
+# 熱門清單納入近期搜尋的天數與筆數上限
+HOT_SEARCH_DAYS = 7
+HOT_SEARCH_LIMIT = 200
+
+# 自選股頁面等待上游報價的最長秒數，逾時的股票由頁面以 /api/quotes 補上
+WATCHLIST_QUOTE_DEADLINE = 2.0
+
+
+def get_hot_symbols():
+    """熱門清單：熱門股票、所有會員的自選股、近期搜尋的股票（供背景輪詢使用）"""
+    codes = get_popular_codes()
+    with app.app_context():
+        codes += [row[0] for row in db.session.query(Watchlist.stock_code).distinct()]
+        since = datetime.utcnow() - timedelta(days=HOT_SEARCH_DAYS)
+        recent_searches = db.session.query(SearchHistory.stock_code)\
+            .filter(SearchHistory.created_at >= since)\
+            .group_by(SearchHistory.stock_code)\
+            .order_by(db.func.max(SearchHistory.created_at).desc())\
+            .limit(HOT_SEARCH_LIMIT)
+        codes += [row[0] for row in recent_searches]
+    return codes
+
+
+def parse_code_list(codes):
+    """
+    解析批次查詢的股票代碼（逗號分隔字串或列表），去除重複並檢查會員等級的數量上限
+    :return: (代碼列表, None)；不合法時回傳 (None, 錯誤回應)
+    """
+    if isinstance(codes, str):
+        codes = codes.split(',')
+    
+    stock_codes = []
+    for code in codes:
+        code = str(code).strip().upper()
+        if code and code not in stock_codes:
+            stock_codes.append(code)
+    if not stock_codes:
+        return None, (jsonify({
+            'success': False,
+            'error': '請提供股票代碼（codes）',
+            'timestamp': datetime.now().isoformat()
+        }), 400)
+    
+    tier = current_user.membership_level if current_user.is_authenticated else 'anonymous'
+    limit = BULK_QUOTE_LIMITS.get(tier, BULK_QUOTE_LIMITS['anonymous'])
+    if len(stock_codes) > limit:
+        return None, (jsonify({
+            'success': False,
+            'error': f'您的會員等級單次最多查詢 {limit} 檔股票',
+            'timestamp': datetime.now().isoformat()
+        }), 403)
+    return stock_codes, None
+
+
+def get_user_features():
+    """目前使用者的會員功能，未登入時為空字典"""
+    if current_user.is_authenticated:
+        return current_user.get_membership_features()
+    return {}
+
+
 @app.route('/')
 def home():
     """首頁 - 股票搜尋和大盤資訊"""
     try:
-        # 獲取大盤摘要
-        market_info = get_market_summary()
-        
-        # 熱門股票列表
-        popular_stocks = [
-            {'code': '2330', 'name': '台積電'},
-            {'code': '0050', 'name': '元大台灣50'},
-            {'code': '0056', 'name': '元大高股息'},
-            {'code': '006208', 'name': '富邦台50'},
-            {'code': '00878', 'name': '國泰永續高股息'},
-            {'code': '00919', 'name': '群益台灣精選高息'},
-            {'code': '2317', 'name': '鴻海'},
-            {'code': '2454', 'name': '聯發科'}
-        ]
+        # 大盤摘要與熱門股票報價由背景預先計算，請求只讀取記憶體中的快照
+        snapshot = get_popular_snapshot()
+        if snapshot is None:
+            return render_template('home.html', 
+                                 market_info={'錯誤': '大盤資訊載入中，請稍後重新整理'},
+                                 popular_stocks=[dict(stock, price=None, change=None, change_percent=None)
+                                                 for stock in POPULAR_STOCKS],
+                                 current_time=datetime.now())
         
         return render_template('home.html', 
-                             market_info=market_info,
-                             popular_stocks=popular_stocks,
+                             market_info=snapshot['market'],
+                             popular_stocks=snapshot['stocks'],
                              current_time=datetime.now())
         
     except Exception as e:
@@ -75,14 +151,14 @@ def stock_page():
         # 獲取股票資訊
         stock_info = get_stock_basic_info(stock_code)
         
-        if stock_info and not stock_info.get('錯誤'):
+        if isinstance(stock_info, Quote):
             # 記錄搜尋歷史
             try:
                 search_history = SearchHistory(
                     user_id=current_user.id if current_user.is_authenticated else None,
                     stock_code=stock_code,
-                    stock_name=stock_info.get('股票名稱'),
-                    search_price=stock_info.get('即時股價', stock_info.get('收盤價')),
+                    stock_name=stock_info.name,
+                    search_price=stock_info.price,
                     ip_address=request.remote_addr,
                     user_agent=request.headers.get('User-Agent', '')[:500]
                 )
@@ -100,11 +176,22 @@ def stock_page():
                     stock_code=stock_code
                 ).first() is not None
             
+            # 付費會員顯示技術指標（只使用本地歷史資料）
+            features = get_user_features()
+            indicators = None
+            if features.get('advanced_analysis'):
+                try:
+                    indicators = get_indicator_summary(stock_code)
+                except Exception as e:
+                    print(f"❌ 計算技術指標失敗 {stock_code}: {e}")
+            
             return render_template('stock.html',
                                  stock_code=stock_code,
                                  stock_info=stock_info,
                                  error=None,
                                  in_watchlist=in_watchlist,
+                                 features=features,
+                                 indicators=indicators,
                                  current_time=datetime.now())
         else:
             error_msg = stock_info.get('錯誤', '無法找到股票資料') if stock_info else '無法找到股票資料'
@@ -261,18 +348,26 @@ def watchlist():
     """自選股列表"""
     watchlist_items = db.session.query(Watchlist).filter_by(user_id=current_user.id).order_by(Watchlist.created_at.desc()).all()
     
-    # 獲取即時股價
+    # 批次獲取即時股價：快取命中立即使用，未命中的同時查詢，最多等待 WATCHLIST_QUOTE_DEADLINE 秒
+    try:
+        quotes = get_stock_quotes([item.stock_code for item in watchlist_items],
+                                  deadline=WATCHLIST_QUOTE_DEADLINE)
+    except Exception as e:
+        print(f"自選股報價獲取失敗: {e}")
+        quotes = {}
+    
     for item in watchlist_items:
-        try:
-            stock_info = get_stock_basic_info(item.stock_code)
-            if stock_info and not stock_info.get('錯誤'):
-                item.current_price = stock_info.get('即時股價', stock_info.get('收盤價'))
-                item.change = stock_info.get('漲跌價差')
-                item.change_percent = stock_info.get('漲跌幅')
-        except:
-            item.current_price = 'N/A'
-            item.change = 'N/A'
-            item.change_percent = 'N/A'
+        stock_info = quotes.get(clean_stock_code(item.stock_code))
+        if isinstance(stock_info, Quote):
+            item.current_price = stock_info.price
+            item.change = stock_info.change
+            item.change_percent = stock_info.change_percent
+        else:
+            item.current_price = None
+            item.change = None
+            item.change_percent = None
+        # 尚未取得（或批次查詢失敗）的股票由頁面載入後再補上
+        item.pending = stock_info is None or is_pending(stock_info)
     
     features = current_user.get_membership_features()
     return render_template('member/watchlist.html', 
@@ -308,7 +403,7 @@ def add_to_watchlist():
     
     # 獲取股票資訊
     stock_info = get_stock_basic_info(stock_code)
-    if not stock_info or stock_info.get('錯誤'):
+    if not isinstance(stock_info, Quote):
         flash('無法找到此股票代號', 'danger')
         return redirect(url_for('watchlist'))
     
@@ -316,15 +411,15 @@ def add_to_watchlist():
     watchlist_item = Watchlist(
         user_id=current_user.id,
         stock_code=stock_code,
-        stock_name=stock_info.get('股票名稱'),
-        added_price=stock_info.get('即時股價', stock_info.get('收盤價')),
+        stock_name=stock_info.name,
+        added_price=stock_info.price,
         notes=notes
     )
     
     db.session.add(watchlist_item)
     db.session.commit()
     
-    flash(f'已將 {stock_code} {stock_info.get("股票名稱", "")} 加入自選股', 'success')
+    flash(f'已將 {stock_code} {stock_info.name} 加入自選股', 'success')
     return redirect(url_for('watchlist'))
 
 
@@ -344,6 +439,35 @@ def remove_from_watchlist(item_id):
     return redirect(url_for('watchlist'))
 
 
+@app.route('/screener')
+@login_required
+def screener():
+    """全市場選股（付費會員）"""
+    features = current_user.get_membership_features()
+    if not features.get('advanced_analysis'):
+        flash('選股功能僅限付費會員使用', 'warning')
+        return redirect(url_for('dashboard'))
+    
+    result = None
+    error = None
+    try:
+        filters, sort, ascending, limit = parse_filters(request.args)
+        result = screen(filters, sort, ascending, limit)
+        if result is None:
+            error = '選股資料準備中，請稍後再試'
+    except ValueError as e:
+        error = str(e)
+    
+    return render_template('member/screener.html',
+                         result=result,
+                         error=error,
+                         filters=SCREENER_FILTERS,
+                         sort_keys=SORT_KEYS,
+                         args=request.args,
+                         features=features,
+                         current_time=datetime.now())
+
+
 # === 聊天機器人功能 ===
 
 @app.route('/chatbot')
@@ -401,10 +525,10 @@ def api_stock(stock_code):
     try:
         stock_info = get_stock_basic_info(stock_code)
         
-        if stock_info and not stock_info.get('錯誤'):
+        if isinstance(stock_info, Quote):
             return jsonify({
                 'success': True,
-                'data': stock_info,
+                'data': as_dict(stock_info),
                 'timestamp': datetime.now().isoformat()
             })
         else:
@@ -423,11 +547,90 @@ def api_stock(stock_code):
         }), 500
 
 
+@app.route('/api/quotes', methods=['GET', 'POST'])
+def api_quotes():
+    """
+    API: 批次獲取多檔股票資訊
+    GET /api/quotes?codes=2330,2317；POST 以 JSON {"codes": [...]} 傳送較長的清單
+    每檔股票各自回傳成功或錯誤，單次數量上限依會員等級（BULK_QUOTE_LIMITS）
+    """
+    try:
+        if request.method == 'POST':
+            payload = request.get_json(silent=True) or {}
+            codes = payload.get('codes') or request.form.get('codes', '')
+        else:
+            codes = request.args.get('codes', '')
+        stock_codes, error = parse_code_list(codes)
+        if error:
+            return error
+        
+        # 一次走批次查詢與快取路徑
+        quotes = get_stock_quotes(stock_codes)
+        results = []
+        for code in stock_codes:
+            stock_info = quotes.get(clean_stock_code(code))
+            if isinstance(stock_info, Quote):
+                results.append({'code': code, 'success': True, 'data': as_dict(stock_info)})
+            else:
+                error_msg = stock_info.get('錯誤', '無法找到股票資料') if stock_info else '無法找到股票資料'
+                results.append({'code': code, 'success': False, 'error': error_msg})
+        
+        return jsonify({
+            'success': True,
+            'data': results,
+            'count': len(results),
+            'failed': sum(1 for result in results if not result['success']),
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+
+@app.route('/stream/quotes')
+def stream_quotes():
+    """
+    即時報價串流 (Server-Sent Events)
+    GET /stream/quotes?codes=2330,2317；報價更新時只推送有變動的欄位，代碼數量上限同批次報價 API
+    每條連線佔用一個工作執行緒（最長 STREAM_CONFIG['max_duration'] 秒），每位使用者同時開啟的連線數有上限
+    """
+    stock_codes, error = parse_code_list(request.args.get('codes', ''))
+    if error:
+        return error
+    
+    client = f"user:{current_user.id}" if current_user.is_authenticated else f"ip:{request.remote_addr}"
+    release = open_stream(client)
+    if release is None:
+        return jsonify({
+            'success': False,
+            'error': f"同時開啟的即時報價連線最多 {STREAM_CONFIG['max_streams_per_client']} 條",
+            'timestamp': datetime.now().isoformat()
+        }), 429
+    
+    response = Response(quote_events(stock_codes),
+                        mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(release)
+    return response
+
+
 @app.route('/api/market')
 def api_market():
     """API: 獲取大盤資訊"""
     try:
-        market_info = get_market_summary()
+        # 與首頁共用背景更新的快照；第一份快照尚未完成時直接查詢
+        snapshot = get_popular_snapshot()
+        market_info = snapshot['market'] if snapshot else get_market_summary()
+        if market_info.get('錯誤'):
+            return jsonify({
+                'success': False,
+                'error': market_info['錯誤'],
+                'timestamp': datetime.now().isoformat()
+            }), 503
         
         return jsonify({
             'success': True,
@@ -447,23 +650,21 @@ def api_market():
 def api_popular():
     """API: 獲取熱門股票清單"""
     try:
-        popular_codes = ['2330', '0050', '0056', '2317', '2454', '2882', '2412', '00878']
-        popular_stocks = []
+        snapshot = get_popular_snapshot()
+        if snapshot is None:
+            return jsonify({
+                'success': False,
+                'error': '熱門股票資料載入中，請稍後再試',
+                'timestamp': datetime.now().isoformat()
+            }), 503
         
-        for code in popular_codes:
-            try:
-                stock_info = get_stock_basic_info(code)
-                if stock_info and not stock_info.get('錯誤'):
-                    popular_stocks.append({
-                        'code': code,
-                        'name': stock_info.get('股票名稱', get_stock_name(code)),
-                        'price': stock_info.get('收盤價', 'N/A'),
-                        'change': stock_info.get('漲跌價差', 'N/A'),
-                        'change_percent': stock_info.get('漲跌幅', 'N/A')
-                    })
-            except:
-                # 如果個別股票失敗，跳過
-                continue
+        popular_stocks = [{
+            'code': stock['code'],
+            'name': stock['name'],
+            'price': format_quote_price(stock['price']),
+            'change': format_change(stock['change']),
+            'change_percent': format_percent(stock['change_percent'])
+        } for stock in snapshot['stocks'] if stock['price'] is not None]
         
         return jsonify({
             'success': True,
@@ -479,6 +680,230 @@ def api_popular():
         }), 500
 
 
+@app.route('/api/health/sources')
+def api_source_health():
+    """API: 各資料來源的斷路器、健康狀態與動態排序"""
+    return jsonify({
+        'success': True,
+        'data': {
+            'health': get_source_health(),
+            'rankings': get_source_rankings(),
+        },
+        'timestamp': datetime.now().isoformat()
+    })
+
+
+@app.route('/api/health/cache')
+def api_cache_health():
+    """API: 記憶體快取統計"""
+    return jsonify({
+        'success': True,
+        'data': dict(get_cache_stats(), intraday=get_intraday_stats()),
+        'timestamp': datetime.now().isoformat()
+    })
+
+
+@app.route('/api/intraday/<stock_code>')
+def api_intraday(stock_code):
+    """API: 當日盤中走勢（走勢小圖用），查詢參數 points 為最多回傳的點數，0 為全部"""
+    try:
+        stock_code = clean_stock_code(stock_code)
+        points = int(request.args.get('points', INTRADAY_CONFIG['sparkline_points']))
+        ticks = get_ticks(stock_code, points if points > 0 else None)
+        
+        data = {'stock_code': stock_code, 'trade_date': None, 'times': [], 'prices': [], 'volumes': []}
+        if ticks:
+            data.update({
+                'trade_date': ticks['trade_date'],
+                'times': ticks['times'].tolist(),
+                'prices': ticks['prices'].tolist(),
+                'volumes': ticks['volumes'].tolist(),
+            })
+        
+        return jsonify({
+            'success': True,
+            'data': data,
+            'timestamp': datetime.now().isoformat()
+        })
+    
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'points 必須是整數',
+            'timestamp': datetime.now().isoformat()
+        }), 400
+
+
+@app.route('/api/health/hub')
+def api_hub_health():
+    """API: 報價發布中心與價格提醒檢查狀態"""
+    return jsonify({
+        'success': True,
+        'data': {'hub': get_hub_stats(), 'alerts': get_alert_stats()},
+        'timestamp': datetime.now().isoformat()
+    })
+
+
+@app.route('/api/health/poller')
+def api_poller_health():
+    """API: 熱門股票背景輪詢狀態"""
+    return jsonify({
+        'success': True,
+        'data': get_poller_stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+
+@app.route('/api/indicators/<stock_code>')
+def api_indicators(stock_code):
+    """
+    API: 技術指標（付費會員）
+    查詢參數：indicators=sma:60,rsi:9,macd:8:21:5（自訂參數限 VIP）、start、end、limit（最近筆數，0 為全部）
+    """
+    features = get_user_features()
+    if not features.get('advanced_analysis'):
+        return jsonify({
+            'success': False,
+            'error': '技術指標僅限付費會員使用',
+            'timestamp': datetime.now().isoformat()
+        }), 403
+    
+    try:
+        indicators = None
+        if request.args.get('indicators'):
+            if not features.get('custom_indicators'):
+                return jsonify({
+                    'success': False,
+                    'error': '自訂指標參數僅限 VIP 會員使用',
+                    'timestamp': datetime.now().isoformat()
+                }), 403
+            indicators = [parse_indicator_spec(text) for text in request.args['indicators'].split(',') if text.strip()]
+        limit = int(request.args.get('limit', INDICATOR_CONFIG['series_limit']))
+        start, end = request.args.get('start'), request.args.get('end')
+        
+        stock_code = clean_stock_code(stock_code)
+        result = get_indicators(stock_code, indicators, start, end)
+        if result is None:
+            # 沒有本地歷史資料時於背景回補，請求不等待下載
+            rejected = reject_stock_code(stock_code)
+            if rejected:
+                return jsonify({
+                    'success': False,
+                    'error': rejected['錯誤'],
+                    'timestamp': datetime.now().isoformat()
+                }), 404
+            if schedule_backfill(stock_code):
+                return jsonify({
+                    'success': False,
+                    'pending': True,
+                    'error': f'正在下載 {stock_code} 的歷史資料，請稍後再試',
+                    'timestamp': datetime.now().isoformat()
+                }), 202
+            return jsonify({
+                'success': False,
+                'error': f'無法取得 {stock_code} 的歷史資料',
+                'timestamp': datetime.now().isoformat()
+            }), 404
+        
+        window = slice(-limit, None) if limit > 0 else slice(None)
+        
+        def to_list(values):
+            return [round(float(value), 4) if value == value else None for value in values[window]]
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'stock_code': stock_code,
+                'dates': [int(value) for value in result['dates'][window]],
+                'indicators': {
+                    label: {
+                        'name': indicator['name'],
+                        'title': indicator['title'],
+                        'params': indicator['params'],
+                        'values': {output: to_list(values) for output, values in indicator['values'].items()},
+                    }
+                    for label, indicator in result['indicators'].items()
+                },
+            },
+            'timestamp': datetime.now().isoformat()
+        })
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+
+@app.route('/api/screener')
+def api_screener():
+    """API: 全市場選股（付費會員），查詢參數見 utils.screener.SCREENER_FILTERS 與 sort、order、limit"""
+    if not get_user_features().get('advanced_analysis'):
+        return jsonify({
+            'success': False,
+            'error': '選股功能僅限付費會員使用',
+            'timestamp': datetime.now().isoformat()
+        }), 403
+    
+    try:
+        filters, sort, ascending, limit = parse_filters(request.args)
+        result = screen(filters, sort, ascending, limit)
+        if result is None:
+            return jsonify({
+                'success': False,
+                'error': '選股資料準備中，請稍後再試',
+                'timestamp': datetime.now().isoformat()
+            }), 503
+        
+        return jsonify({
+            'success': True,
+            'data': result,
+            'timestamp': datetime.now().isoformat()
+        })
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 400
+
+
+# 設定 QUOTE_POLLER=1 時隨網站啟動熱門股票背景輪詢
+if POLLER_CONFIG['enabled']:
+    start_poller(get_hot_symbols)
+
+
+def load_active_alerts():
+    """啟用中且尚未觸發的價格提醒（供價格提醒檢查使用）"""
+    with app.app_context():
+        alerts = db.session.query(PriceAlert).filter_by(is_active=True, is_triggered=False).all()
+        return [(alert.id, alert.stock_code, alert.alert_type, alert.target_price) for alert in alerts]
+
+
+def trigger_price_alert(alert_id, quote):
+    """標記價格提醒已觸發（在價格提醒的背景執行緒中呼叫，不佔用報價發布中心的執行緒）"""
+    with app.app_context():
+        alert = db.session.get(PriceAlert, alert_id)
+        if alert is None or not alert.is_active or alert.is_triggered:
+            return
+        alert.is_triggered = True
+        alert.triggered_at = datetime.utcnow()
+        db.session.commit()
+        print(f"🔔 價格提醒觸發: {alert.stock_code} {alert.alert_type} {alert.target_price}（目前 {quote.price}）")
+
+
+# 設定 PRICE_ALERTS=1 時隨網站啟動價格提醒檢查
+if ALERT_CONFIG['enabled']:
+    start_alert_evaluator(load_active_alerts, trigger_price_alert)
+
 
 # === 錯誤處理 ===
 
@@ -503,6 +928,8 @@ def internal_error(error):
 @app.template_filter('format_number')
 def format_number(value):
     """格式化數字顯示"""
+    if isinstance(value, (int, float)):
+        return f"{value:,.0f}"
     try:
         if value and value != 'N/A':
             # 移除逗號並轉換為浮點數
@@ -516,6 +943,8 @@ def format_number(value):
 @app.template_filter('format_price')
 def format_price(value):
     """格式化價格顯示"""
+    if isinstance(value, (int, float)):
+        return f"{value:.2f}"
     try:
         if value and value != 'N/A':
             num = float(str(value).replace(',', ''))
@@ -525,9 +954,27 @@ def format_price(value):
         return value
 
 
+@app.template_filter('format_change')
+def format_change_filter(value):
+    """格式化漲跌價差顯示（帶正負號）"""
+    return format_change(value) if isinstance(value, (int, float)) else (value or 'N/A')
+
+
+@app.template_filter('format_percent')
+def format_percent_filter(value):
+    """格式化漲跌幅顯示（帶正負號的百分比）"""
+    return format_percent(value) if isinstance(value, (int, float)) else (value or 'N/A')
+
+
 @app.template_filter('change_class')
 def change_class(value):
     """根據漲跌返回 CSS 類別"""
+    if isinstance(value, (int, float)):
+        if value > 0:
+            return 'text-success'  # 綠色 (上漲)
+        if value < 0:
+            return 'text-danger'   # 紅色 (下跌)
+        return 'text-muted'
     try:
         if value and value != 'N/A':
             if value.startswith('+'):
@@ -0,0 +1,53 @@
+// 即時報價串流：訂閱 /stream/quotes，收到變動欄位時就地更新頁面（不重新載入整頁）
+// 每則訊息只包含變動的欄位，onUpdate(code, changed, quote) 的 quote 為累積後的完整欄位
+// 連線從未開啟就失敗（如代碼數量超過會員上限的 403、連線數上限的 429）或瀏覽器放棄重新連線時，
+// 關閉串流並呼叫 onFallback()，由頁面改用其他更新方式
+
+function subscribeQuotes(codes, onUpdate, onFallback) {
+    if (!window.EventSource || !codes.length) {
+        return null;
+    }
+
+    const quotes = {};
+    const source = new EventSource(`/stream/quotes?codes=${encodeURIComponent(codes.join(','))}`);
+    let opened = false;
+    source.addEventListener('open', () => { opened = true; });
+    source.addEventListener('error', () => {
+        // 曾經開啟過的連線中斷時由瀏覽器自動重新連線
+        if (opened && source.readyState !== EventSource.CLOSED) {
+            return;
+        }
+        source.close();
+        if (onFallback) {
+            onFallback();
+            onFallback = null;
+        }
+    });
+    source.addEventListener('quotes', event => {
+        Object.entries(JSON.parse(event.data)).forEach(([code, changed]) => {
+            quotes[code] = Object.assign(quotes[code] || {}, changed);
+            onUpdate(code, changed, quotes[code]);
+        });
+    });
+    return source;
+}
+
+// 與伺服器端的 change_class 一致：上漲綠色、下跌紅色
+function changeClass(value) {
+    return value > 0 ? 'text-success' : value < 0 ? 'text-danger' : 'text-muted';
+}
+
+function formatSigned(value, digits) {
+    return (value > 0 ? '+' : '') + value.toFixed(digits);
+}
+
+function formatNumber(value) {
+    return Math.round(value).toLocaleString('en-US');
+}
+
+// 更新後短暫標示變動的元素
+function flashElement(element) {
+    element.style.transition = 'background-color 0.6s';
+    element.style.backgroundColor = 'rgba(255, 193, 7, 0.35)';
+    setTimeout(() => { element.style.backgroundColor = ''; }, 600);
+}
@@ -0,0 +1,46 @@
+// 盤中走勢小圖：為所有 data-sparkline="股票代碼" 的元素載入 /api/intraday 並繪製 SVG 折線
+// data-prev-close 為昨收價（決定顏色與基準線），未提供時以第一筆價格比較
+
+function drawSparkline(element, prices, prevClose) {
+    const width = parseInt(element.dataset.width || 120, 10);
+    const height = parseInt(element.dataset.height || 32, 10);
+    if (!prices || prices.length < 2) {
+        element.innerHTML = '<small class="text-muted">-</small>';
+        return;
+    }
+
+    const base = prevClose || prices[0];
+    const min = Math.min(base, ...prices);
+    const max = Math.max(base, ...prices);
+    const range = max - min || 1;
+    const x = i => (i / (prices.length - 1) * (width - 2) + 1).toFixed(1);
+    const y = value => (height - 1 - (value - min) / range * (height - 2)).toFixed(1);
+
+    const points = prices.map((price, i) => `${x(i)},${y(price)}`).join(' ');
+    const last = prices[prices.length - 1];
+    // 與其他頁面一致：上漲綠色、下跌紅色
+    const color = last > base ? '#198754' : last < base ? '#dc3545' : '#6c757d';
+
+    element.innerHTML = `
+        <svg width="${width}" height="${height}" viewBox="0 0 ${width} ${height}">
+            <line x1="0" x2="${width}" y1="${y(base)}" y2="${y(base)}" stroke="#adb5bd" stroke-dasharray="2,2" stroke-width="1"/>
+            <polyline points="${points}" fill="none" stroke="${color}" stroke-width="1.5"/>
+        </svg>`;
+}
+
+function loadSparklines(root) {
+    (root || document).querySelectorAll('[data-sparkline]').forEach(element => {
+        const code = element.dataset.sparkline;
+        const points = element.dataset.points || 60;
+        fetch(`/api/intraday/${encodeURIComponent(code)}?points=${points}`)
+            .then(response => response.json())
+            .then(result => {
+                if (result.success) {
+                    drawSparkline(element, result.data.prices, parseFloat(element.dataset.prevClose) || null);
+                }
+            })
+            .catch(() => {});
+    });
+}
+
+document.addEventListener('DOMContentLoaded', () => loadSparklines());
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """在暫存目錄中執行（快取、快照與歷史資料都以相對路徑寫入 cache/）"""
+    monkeypatch.chdir(tmp_path)
+    yield tmp_path
+    # 延遲寫回的股票主檔在離開暫存目錄前寫入，避免行程結束時寫到專案目錄
+    symbols = sys.modules.get('utils.symbols')
+    if symbols is not None:
+        symbols._flush_on_exit()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""報價發布中心 (utils/hub.py) 與價格提醒 (utils/alerts.py) 的測試"""
+
+import pytest
+from utils.quote import Quote
+
+
+@pytest.fixture
+def hub(workdir, monkeypatch):
+    """不啟動執行緒的發布中心，記錄每次有期限的查詢"""
+    from utils import hub
+
+    from utils.twse import PENDING_STATUS
+    requests = []
+
+    def get_stock_quotes(codes, deadline=None, **kwargs):
+        requests.append(list(codes))
+        return {code: {'股票代碼': code, '狀態': PENDING_STATUS} for code in codes}
+
+    monkeypatch.setattr(hub, 'get_stock_quotes', get_stock_quotes)
+    monkeypatch.setattr(hub, 'reject_stock_code', lambda code, count=True: None)
+    quote_hub = hub.QuoteHub()
+    quote_hub.requests = requests
+    return quote_hub
+
+
+def test_pending_codes_not_requested_again(hub):
+    hub.lease(['2330', '2317'])
+    hub.poll_once()
+    hub.poll_once()
+
+    assert hub.requests == [['2330', '2317']]
+    assert hub.get_stats()['pending'] == 2
+
+
+def test_cache_write_releases_pending_code(hub):
+    hub.lease(['2330', '2317'])
+    hub.poll_once()
+    hub._on_cache_write(['stock_basic_2330'])
+    hub.poll_once()
+
+    assert hub.requests == [['2330', '2317'], ['2330']]
+
+
+class _Subscription:
+    def update(self, codes):
+        pass
+
+
+def test_rearmed_alert_triggers_again(monkeypatch):
+    from utils import alerts
+
+    active = [(1, '2330', 'above', 500.0)]
+    triggered = []
+    evaluator = alerts.AlertEvaluator(lambda: list(active), lambda alert_id, quote: triggered.append(alert_id))
+    evaluator._subscription = _Subscription()
+    quote = Quote('2330', '台積電', price=600.0)
+
+    evaluator.reload()
+    evaluator.check('2330', quote)
+    evaluator.check('2330', quote)
+    evaluator._trigger_executor.shutdown(wait=True)
+    assert triggered == [1]
+
+    # 觸發後不再是啟用中的提醒，重新啟用後可以再次觸發
+    active.clear()
+    evaluator.reload()
+    assert evaluator._triggered == set()
+    active.append((1, '2330', 'above', 500.0))
+    evaluator.reload()
+    evaluator._trigger_executor = alerts.ThreadPoolExecutor(max_workers=1)
+    evaluator.check('2330', quote)
+    evaluator._trigger_executor.shutdown(wait=True)
+    assert triggered == [1, 1]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""台股交易行事曆 (utils/market_calendar.py) 的測試"""
+
+import json
+import os
+from datetime import date
+import pytest
+
+
+@pytest.fixture
+def calendar(workdir):
+    from utils import market_calendar
+    market_calendar.reload_holidays()
+    yield market_calendar
+    if os.path.exists(market_calendar.HOLIDAYS_FILE):
+        os.remove(market_calendar.HOLIDAYS_FILE)
+    market_calendar.reload_holidays()
+
+
+def test_missing_year_warns_once(calendar, capsys):
+    calendar.is_trading_day(date(2099, 1, 5))
+    calendar.is_trading_day(date(2099, 1, 6))
+
+    assert capsys.readouterr().out.count('沒有 2099 年的休市日資料') == 1
+    assert not calendar.has_holiday_schedule(2099)
+
+
+def test_override_file_covers_year(calendar, capsys):
+    os.makedirs('cache', exist_ok=True)
+    with open(calendar.HOLIDAYS_FILE, 'w', encoding='utf-8') as f:
+        json.dump({'2099': ['2099-01-01']}, f)
+    calendar.reload_holidays()
+
+    assert calendar.has_holiday_schedule(2099)
+    assert not calendar.is_trading_day(date(2099, 1, 1))
+    assert '沒有 2099 年' not in capsys.readouterr().out
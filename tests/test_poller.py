@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""熱門股票背景輪詢 (utils/poller.py) 的測試"""
+
+import pytest
+
+
+@pytest.fixture
+def poller(workdir):
+    from utils import poller
+    return poller
+
+
+def test_single_leader_per_host(poller):
+    first = poller.QuotePoller(lambda: [])
+    second = poller.QuotePoller(lambda: [])
+    try:
+        assert first.acquire_leadership()
+        assert not second.acquire_leadership()
+
+        # 主控行程停止後由待命的輪詢接手
+        first._leader_lock.release()
+        first.is_leader = False
+        assert second.acquire_leadership()
+    finally:
+        first._leader_lock.release()
+        second._leader_lock.release()
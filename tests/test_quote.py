@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""報價資料型別 (utils/quote.py) 的測試"""
+
+import pytest
+from utils.quote import Quote
+
+QUOTES = [
+    Quote('2330', '台積電', price=600.0, prev_close=590.0, volume=1234, source='twse_mis'),
+    Quote('2317', price=100.0, shares=5, turnover=10, trades=2, trade_date='115/10/16',
+          source='twse_stock_day', status='延遲資料', fetched_at=1.7e9),
+    Quote('9999'),
+]
+
+
+@pytest.mark.parametrize('quote', QUOTES)
+def test_key_access_matches_to_dict(quote):
+    legacy = quote.to_dict()
+    for key in list(legacy) + ['即時股價', '成交量', '狀態', '不存在']:
+        assert quote.get(key, 'N/A') == legacy.get(key, 'N/A')
+        assert (key in quote) == (key in legacy)
+        if key in legacy:
+            assert quote[key] == legacy[key]
+        else:
+            with pytest.raises(KeyError):
+                quote[key]
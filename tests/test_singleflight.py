@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""跨行程鎖 (utils/singleflight.py FileLock) 的測試"""
+
+import threading
+import time
+import pytest
+
+
+@pytest.fixture(params=['flock', 'process_only'])
+def singleflight(workdir, monkeypatch, request):
+    from utils import singleflight
+    if request.param == 'process_only':
+        # 模擬沒有 fcntl 與 msvcrt 的平台
+        monkeypatch.setattr(singleflight, 'fcntl', None)
+        monkeypatch.setattr(singleflight, 'msvcrt', None)
+    return singleflight
+
+
+def test_threads_are_mutually_exclusive(singleflight):
+    inside = []
+    overlaps = []
+
+    def work():
+        with singleflight.FileLock('history_2330'):
+            inside.append(1)
+            if len(inside) > 1:
+                overlaps.append(len(inside))
+            time.sleep(0.01)
+            inside.pop()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert overlaps == []
+
+
+def test_non_blocking_lock_held_until_release(singleflight):
+    first = singleflight.FileLock('quote_poller', blocking=False)
+    second = singleflight.FileLock('quote_poller', blocking=False)
+    assert first.acquire()
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+    second.release()
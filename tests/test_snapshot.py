@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""全市場收盤行情 (utils/snapshot.py) 的解析與寫入測試，使用錄下的 STOCK_DAY_ALL 回應"""
+
+import json
+import os
+from datetime import datetime
+import numpy as np
+import pytest
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'stock_day_all.json')
+
+
+@pytest.fixture
+def data():
+    with open(FIXTURE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def snapshot(workdir, monkeypatch):
+    """在暫存目錄中匯入模組，並固定最近交易日為回應的資料日期"""
+    from utils import snapshot, symbols, twse
+    from utils.market_calendar import TAIPEI_TZ
+
+    cached = {}
+    monkeypatch.setattr(twse, 'save_cache_many', cached.update)
+    monkeypatch.setattr(snapshot, 'last_trading_close', lambda: datetime(2024, 10, 18, 13, 30, tzinfo=TAIPEI_TZ))
+    monkeypatch.setattr(snapshot, 'is_market_open', lambda: False)
+    monkeypatch.setattr(symbols, '_symbols', {})
+    monkeypatch.setattr(snapshot, '_snapshot', None)
+    snapshot.cached_quotes = cached
+    return snapshot
+
+
+def row_index(table, code):
+    return table['code'].tolist().index(code)
+
+
+def test_parse_numbers_with_commas(snapshot, data):
+    table = snapshot.parse_stock_day_all(data)
+
+    assert table['date'] == 20241018
+    assert table['code'].tolist() == ['0050', '0056', '1101', '2317', '2330', '2454', '9962']
+    i = row_index(table, '2330')
+    assert table['name'][i] == '台積電'
+    assert table['close'][i] == 1045.0
+    assert table['open'][i] == 1050.0
+    assert table['volume'][i] == 46364238
+    assert table['turnover'][i] == 48428114356
+    assert table['trades'][i] == 155004
+    assert table['volume'].dtype == np.int64
+
+
+def test_parse_negative_change(snapshot, data):
+    table = snapshot.parse_stock_day_all(data)
+
+    assert table['change'][row_index(table, '2317')] == -2.0
+    assert table['change'][row_index(table, '1101')] == -0.35
+
+
+def test_parse_untraded_row(snapshot, data):
+    table = snapshot.parse_stock_day_all(data)
+    i = row_index(table, '9962')
+
+    # "--" 為缺值：價格為 NaN，無成交時漲跌價差也視為缺值
+    for column in ('open', 'high', 'low', 'close', 'change'):
+        assert np.isnan(table[column][i])
+    assert table['volume'][i] == 0
+    assert table['trades'][i] == 0
+
+
+@pytest.mark.parametrize('text', ['113/10/18', '1131018', '20241018'])
+def test_parse_report_date(snapshot, data, text):
+    data['date'] = text
+    assert snapshot.parse_stock_day_all(data)['date'] == 20241018
+
+
+def test_parse_missing_field(snapshot, data):
+    data['fields'] = [field for field in data['fields'] if field != '收盤價']
+    with pytest.raises(ValueError):
+        snapshot.parse_stock_day_all(data)
+
+
+def test_parse_empty_response(snapshot):
+    assert snapshot.parse_stock_day_all({'stat': '很抱歉，沒有符合條件的資料!', 'date': '20241019'}) is None
+
+
+def test_ingest_and_load_round_trip(snapshot, data):
+    result = snapshot.ingest_snapshot(path=FIXTURE)
+
+    assert result['date'] == 20241018
+    assert result['symbols'] == 7
+    assert result['symbols_added'] == 7
+    assert os.path.exists(snapshot.SNAPSHOT_FILE)
+
+    parsed = snapshot.parse_stock_day_all(data)
+    loaded = snapshot.load_snapshot()
+    assert loaded['date'] == parsed['date']
+    assert set(loaded) == set(parsed)
+    for column in parsed:
+        if column == 'date':
+            continue
+        assert loaded[column].dtype == parsed[column].dtype
+        np.testing.assert_array_equal(loaded[column], parsed[column])
+
+    # 再次讀取使用已載入的快照表
+    assert snapshot.load_snapshot() is loaded
+    assert snapshot.snapshot_is_current()
+
+
+def test_ingest_caches_quotes(snapshot):
+    result = snapshot.ingest_snapshot(path=FIXTURE)
+
+    cached = snapshot.cached_quotes
+    assert result['quotes_cached'] == len(cached)
+    quote = cached['stock_basic_2330']
+    assert quote.price == 1045.0
+    assert quote.prev_close == 1035.0
+    assert quote.shares == 46364238
+    assert quote.trade_date == '113/10/18'
+    assert 'stock_basic_9962' not in cached
+
+
+def test_ingest_skips_stale_date(snapshot, data):
+    data['date'] = '20241017'
+    result = snapshot.ingest_snapshot(data=data)
+
+    assert result['quotes_cached'] == 0
+    assert snapshot.cached_quotes == {}
+    assert not snapshot.snapshot_is_current()
+
+
+def test_ingest_appends_history(snapshot):
+    from utils import history
+
+    # 已有連續到前一個交易日的歷史資料才接上當日日線
+    history.ingest_stock_day('2330', {'data': [
+        ['113/10/16', '30,000,000', '31,050,000,000', '1,030.00', '1,040.00', '1,025.00', '1,035.00', '5.00', '90,000'],
+        ['113/10/17', '35,000,000', '36,400,000,000', '1,040.00', '1,045.00', '1,030.00', '1,035.00', '0.00', '100,000'],
+    ]})
+    result = snapshot.ingest_snapshot(path=FIXTURE)
+
+    assert result['history_appended'] == 1
+    bars = history.get_history('2330')
+    assert bars['date'].tolist() == [20241016, 20241017, 20241018]
+    assert bars['close'][-1] == 1045.0
+    assert bars['volume'][-1] == 46364238
+    assert history.get_history('2317')['date'].size == 0
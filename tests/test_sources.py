@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""多重資料來源執行器 (utils/sources.py) 與斷路器的測試"""
+
+import pytest
+
+
+@pytest.fixture
+def sources(workdir):
+    from utils import sources, source_health
+    source_health.reset_source_health()
+    yield sources
+    source_health.reset_source_health()
+
+
+def _raise():
+    raise ConnectionError('連線失敗')
+
+
+@pytest.mark.parametrize('hedged', [False, True])
+def test_no_data_does_not_open_breaker(sources, hedged):
+    from utils.source_health import get_breaker, HEALTH_CONFIG
+
+    data_sources = [('即時', lambda: None), ('備援', lambda: 'ok')]
+    for _ in range(HEALTH_CONFIG['failure_threshold'] + 1):
+        assert sources.run_sources(data_sources, bool, hedged=hedged) == ('備援', 'ok')
+
+    assert get_breaker('即時').state == 'closed'
+    assert get_breaker('即時').consecutive_failures == 0
+
+
+def test_errors_open_breaker_when_sibling_succeeds(sources):
+    from utils.source_health import get_breaker, HEALTH_CONFIG
+
+    data_sources = [('即時', _raise), ('備援', lambda: 'ok')]
+    for _ in range(HEALTH_CONFIG['failure_threshold']):
+        assert sources.run_sources(data_sources, bool, hedged=False) == ('備援', 'ok')
+
+    assert get_breaker('即時').state == 'open'
+    assert get_breaker('即時').last_error == '連線失敗'
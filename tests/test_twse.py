@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""查詢前拒絕未知代碼 (utils/twse.py reject_stock_code) 的測試"""
+
+import time
+import pytest
+
+MASTER = {
+    '2330': {'code': '2330', 'name': '台積電', 'market': '上市', 'industry': None, 'status': 'listed'},
+    '1234': {'code': '1234', 'name': '已下市', 'market': '上市', 'industry': None, 'status': 'delisted'},
+}
+
+
+@pytest.fixture
+def twse(workdir, monkeypatch):
+    """在暫存目錄中匯入模組，記錄所有上游查詢與背景主檔更新"""
+    from utils import symbols, twse
+
+    monkeypatch.setattr(symbols, '_symbols', dict(MASTER))
+    monkeypatch.setattr(symbols, '_checked_at', time.monotonic())
+    twse.upstream_calls = []
+    twse.scheduled = []
+    monkeypatch.setattr(twse, 'run_sources', lambda data_sources, *args, **kwargs:
+                        twse.upstream_calls.append([name for name, _ in data_sources]) or (None, None))
+    monkeypatch.setattr(twse, 'schedule_symbol_master', lambda: twse.scheduled.append(True))
+    monkeypatch.setattr(twse, 'get_stock_name', lambda stock_code: stock_code)
+    return twse
+
+
+def test_unknown_code_short_circuits(twse, monkeypatch):
+    from utils import symbols
+    monkeypatch.setattr(symbols, '_complete', True)
+
+    result = twse.get_stock_basic_info('9999')
+
+    assert result['錯誤'] == '查無股票代碼 9999'
+    assert twse.upstream_calls == []
+
+
+def test_delisted_code_short_circuits(twse, monkeypatch):
+    from utils import symbols
+    monkeypatch.setattr(symbols, '_complete', True)
+
+    result = twse.get_stock_basic_info('1234')
+
+    assert '已下市' in result['錯誤']
+    assert twse.upstream_calls == []
+
+
+def test_incomplete_master_does_not_reject(twse, monkeypatch):
+    from utils import symbols
+    monkeypatch.setattr(symbols, '_complete', False)
+
+    assert twse.reject_stock_code('9999') is None
+    assert twse.scheduled
+    twse.get_stock_basic_info('9999')
+    assert twse.upstream_calls
+
+
+def test_empty_code_rejected(twse):
+    assert twse.reject_stock_code('')['錯誤'] == '請輸入有效的股票代碼'
+
+
+def test_deferred_codes_not_resubmitted(twse, monkeypatch):
+    import threading
+    release = threading.Event()
+    batches = []
+
+    def slow_fetch(codes, fallback=True):
+        batches.append(list(codes))
+        release.wait(5)
+        return {code: {'股票代碼': code, '錯誤': '測試'} for code in codes}
+
+    monkeypatch.setattr(twse, '_fetch_stock_quotes', slow_fetch)
+
+    first = twse._fetch_stock_quotes_within(['2330', '2317'], False, 0.05)
+    second = twse._fetch_stock_quotes_within(['2330', '2454'], False, 0.05)
+    assert all(twse.is_pending(result) for result in {**first, **second}.values())
+    assert batches == [['2330', '2317'], ['2454']]
+
+    release.set()
+    assert set(twse._fetch_stock_quotes_within(['2330', '2454'], False, 5)) == {'2330', '2454'}
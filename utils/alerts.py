@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+價格提醒檢查
+向報價發布中心（hub.py）訂閱所有啟用中提醒的股票代碼，報價更新時逐一檢查提醒條件；
+提醒的讀取與觸發後的處理由呼叫端提供（網站以資料庫中的 PriceAlert 實作），
+因此本模組不依賴資料庫。觸發後的處理交給專用的背景執行緒依序執行，不佔用發布中心的廣播執行緒。
+
+設定環境變數 PRICE_ALERTS=1 時隨網站啟動。
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .twse import clean_stock_code
+from .hub import subscribe
+
+# 價格提醒設定
+ALERT_CONFIG = {
+    'enabled': os.environ.get('PRICE_ALERTS') == '1',  # 是否隨網站啟動提醒檢查
+    'reload_interval': 60,  # 重新讀取啟用中提醒的間隔秒數
+}
+
+
+def alert_triggered(alert_type, target, quote):
+    """
+    報價是否符合提醒條件
+    :param alert_type: 'above'（股價高於）、'below'（股價低於）、'change_percent'（漲跌幅絕對值超過）
+    """
+    if alert_type == 'above':
+        return quote.price is not None and quote.price >= target
+    if alert_type == 'below':
+        return quote.price is not None and quote.price <= target
+    if alert_type == 'change_percent':
+        return quote.change_percent is not None and abs(quote.change_percent) >= target
+    return False
+
+
+class AlertEvaluator(threading.Thread):
+    """價格提醒檢查執行緒：定期重新讀取提醒並更新訂閱的代碼"""
+
+    def __init__(self, load_alerts, on_trigger):
+        """
+        :param load_alerts: 回傳啟用中提醒的無參數函式，每筆為 (提醒 ID, 股票代碼, 提醒類型, 目標值)
+        :param on_trigger: on_trigger(提醒 ID, Quote)，觸發時在背景執行緒中依序呼叫（可進行資料庫操作）
+        """
+        super().__init__(name='price-alerts', daemon=True)
+        self.load_alerts = load_alerts
+        self.on_trigger = on_trigger
+        self._alerts = {}  # 代碼 -> [(提醒 ID, 類型, 目標值)]
+        self._triggered = set()  # 已觸發、等待處理完成的提醒 ID（不再是啟用中的提醒時於 reload 移除）
+        self._subscription = None
+        self._trigger_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='alert-trigger')
+        self._stop_event = threading.Event()
+        self.stats = {'alerts': 0, 'symbols': 0, 'checks': 0, 'triggered': 0, 'errors': 0}
+
+    def stop(self):
+        self._stop_event.set()
+
+    def reload(self):
+        """
+        重新讀取啟用中的提醒並更新訂閱
+        已觸發的提醒處理完成後不再出現在啟用中的提醒，刪除的提醒亦同，其 ID 一併移除；
+        之後重新啟用的提醒因此可以再次觸發
+        """
+        alerts = {}
+        for alert_id, stock_code, alert_type, target in self.load_alerts():
+            alerts.setdefault(clean_stock_code(stock_code), []).append((alert_id, alert_type, target))
+        self._alerts = alerts
+        # 原地更新，不會遺失廣播執行緒同時加入的 ID
+        self._triggered.intersection_update(alert_id for items in alerts.values() for alert_id, _, _ in items)
+        self.stats.update(alerts=sum(len(items) for items in alerts.values()), symbols=len(alerts))
+
+        if self._subscription is None:
+            self._subscription = subscribe(list(alerts), self.check)
+        else:
+            self._subscription.update(list(alerts))
+
+    def check(self, stock_code, quote):
+        """發布中心的回呼：檢查該代碼的所有提醒，觸發的提醒交給背景執行緒處理後立即返回"""
+        for alert_id, alert_type, target in self._alerts.get(stock_code, ()):
+            self.stats['checks'] += 1
+            if alert_id in self._triggered or not alert_triggered(alert_type, target, quote):
+                continue
+            self._triggered.add(alert_id)
+            self.stats['triggered'] += 1
+            self._trigger_executor.submit(self._handle_trigger, alert_id, quote)
+
+    def _handle_trigger(self, alert_id, quote):
+        """執行觸發後的處理；失敗時允許下次報價更新再次觸發"""
+        try:
+            self.on_trigger(alert_id, quote)
+        except Exception as e:
+            self.stats['errors'] += 1
+            self._triggered.discard(alert_id)
+            print(f"❌ 價格提醒處理失敗 {alert_id}: {e}")
+
+    def run(self):
+        print("🔔 價格提醒檢查啟動")
+        while not self._stop_event.is_set():
+            try:
+                self.reload()
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"❌ 讀取價格提醒失敗: {e}")
+            self._stop_event.wait(ALERT_CONFIG['reload_interval'])
+        if self._subscription is not None:
+            self._subscription.close()
+        self._trigger_executor.shutdown(wait=True)
+        print("🛑 價格提醒檢查已停止")
+
+
+_evaluator = None
+_evaluator_lock = threading.Lock()
+
+
+def start_alert_evaluator(load_alerts, on_trigger):
+    """啟動價格提醒檢查（同一行程只會啟動一次）"""
+    global _evaluator
+
+    with _evaluator_lock:
+        if _evaluator is None or not _evaluator.is_alive():
+            _evaluator = AlertEvaluator(load_alerts, on_trigger)
+            _evaluator.start()
+    return _evaluator
+
+
+def get_alert_stats():
+    """取得價格提醒檢查統計，未啟動時回傳 None"""
+    evaluator = _evaluator
+    return dict(evaluator.stats, running=evaluator.is_alive()) if evaluator is not None else None
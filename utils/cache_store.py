@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQLite 快取儲存
+所有快取項目存放在同一個 WAL 模式的 SQLite 資料表，
+多個 worker 行程可以同時讀寫，不會讀到寫到一半的資料；
+批次讀寫在單一交易內完成，並依到期時間索引定期清除過舊的項目。
+行程第一次取得儲存時會刪除改用 SQLite 前遺留的每鍵值一個 JSON 快取檔。
+"""
+
+import os
+import json
+import sqlite3
+import threading
+import time
+from .quote import Quote
+
+CACHE_DB = os.path.join('cache', 'quote_cache.db')
+
+# 儲存設定
+STORE_CONFIG = {
+    'busy_timeout': 5.0,  # 等待其他行程寫入完成的秒數
+    'purge_interval': 600,  # 清除過期項目的最短間隔秒數
+    'max_keys_per_query': 500,  # 單一 SQL 查詢的鍵值數量上限
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    stored_at REAL NOT NULL,
+    fresh_until REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    data BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_cache_entries_expires_at ON cache_entries (expires_at);
+"""
+
+
+def _encode(obj):
+    """Quote 以數值欄位序列化"""
+    if isinstance(obj, Quote):
+        return {'__quote__': obj.to_record()}
+    raise TypeError(f"無法序列化 {type(obj).__name__}")
+
+
+def _decode(obj):
+    if '__quote__' in obj:
+        return Quote.from_record(obj['__quote__'])
+    return obj
+
+
+def _dumps(data):
+    """以精簡 JSON 序列化"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=_encode).encode('utf-8')
+
+
+def _loads(blob):
+    return json.loads(blob, object_hook=_decode)
+
+
+class CacheStore:
+    """
+    SQLite 快取儲存
+    每個項目有三個時間：寫入時間 stored_at、資料新鮮期限 fresh_until，
+    以及可刪除時間 expires_at（超過後不再作為延遲資料使用）。
+    """
+
+    def __init__(self, path=CACHE_DB):
+        self.path = path
+        self._local = threading.local()
+        self._last_purge = 0.0
+        self._purge_lock = threading.Lock()
+
+    def _connect(self):
+        """取得目前執行緒的連線（各執行緒與行程各自建立）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=STORE_CONFIG['busy_timeout'], isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(_SCHEMA)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """取得單一項目，回傳 (資料, 寫入時間, 新鮮期限)；不存在或已可刪除時回傳 None"""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        """批次取得多個項目，回傳 {鍵值: (資料, 寫入時間, 新鮮期限)}"""
+        keys = list(keys)
+        results = {}
+        if not keys:
+            return results
+
+        now = time.time()
+        try:
+            conn = self._connect()
+            step = STORE_CONFIG['max_keys_per_query']
+            for start in range(0, len(keys), step):
+                chunk = keys[start:start + step]
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute(
+                    f"SELECT key, stored_at, fresh_until, data FROM cache_entries "
+                    f"WHERE key IN ({placeholders}) AND expires_at > ?",
+                    (*chunk, now),
+                )
+                for key, stored_at, fresh_until, blob in rows:
+                    results[key] = (_loads(blob), stored_at, fresh_until)
+        except (sqlite3.Error, ValueError) as e:
+            print(f"❌ 讀取快取失敗: {e}")
+        return results
+
+    def put(self, key, data, stored_at, fresh_until, expires_at):
+        """寫入單一項目"""
+        self.put_many([(key, data, stored_at, fresh_until, expires_at)])
+
+    def put_many(self, entries):
+        """
+        在單一交易內寫入多個項目
+        :param entries: [(鍵值, 資料, 寫入時間, 新鮮期限, 可刪除時間), ...]
+        """
+        rows = [(key, stored_at, fresh_until, expires_at, _dumps(data))
+                for key, data, stored_at, fresh_until, expires_at in entries]
+        if not rows:
+            return
+
+        try:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO cache_entries (key, stored_at, fresh_until, expires_at, data) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            print(f"❌ 儲存快取失敗: {e}")
+            return
+
+        if time.monotonic() - self._last_purge >= STORE_CONFIG['purge_interval']:
+            self.purge_expired()
+
+    def delete(self, key):
+        """刪除單一項目"""
+        try:
+            self._connect().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            print(f"❌ 刪除快取失敗: {e}")
+
+    def purge_expired(self):
+        """刪除已超過可刪除時間的項目，回傳刪除數量"""
+        if not self._purge_lock.acquire(blocking=False):
+            return 0
+        try:
+            self._last_purge = time.monotonic()
+            cursor = self._connect().execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),))
+            if cursor.rowcount:
+                print(f"🧹 已清除 {cursor.rowcount} 筆過期快取")
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            print(f"❌ 清除過期快取失敗: {e}")
+            return 0
+        finally:
+            self._purge_lock.release()
+
+    def stats(self):
+        """取得項目數量與資料大小"""
+        try:
+            now = time.time()
+            count, fresh, size = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(fresh_until > ?), 0), COALESCE(SUM(LENGTH(data)), 0) "
+                "FROM cache_entries",
+                (now,),
+            ).fetchone()
+            return {'entries': count, 'fresh_entries': fresh, 'data_bytes': size}
+        except sqlite3.Error as e:
+            return {'error': str(e)}
+
+
+def remove_legacy_files(cache_dir):
+    """
+    刪除舊版每個鍵值一個的 JSON 快取檔（內容為 {'timestamp', 'data'}，報價早已過期，不轉移）
+    同目錄中其他的 JSON 檔（股票主檔、休市日、來源排序等）不受影響
+    :return: 刪除的檔案數
+    """
+    try:
+        names = os.listdir(cache_dir)
+    except FileNotFoundError:
+        return 0
+
+    removed = 0
+    for name in names:
+        path = os.path.join(cache_dir, name)
+        if not name.endswith('.json') or not os.path.isfile(path):
+            continue
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+            if isinstance(payload, dict) and 'timestamp' in payload and 'data' in payload:
+                os.remove(path)
+                removed += 1
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 無法檢查舊版快取檔 {name}: {e}")
+    if removed:
+        print(f"🧹 已刪除 {removed} 個舊版 JSON 快取檔")
+    return removed
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """取得共用的快取儲存（第一次呼叫時刪除舊版 JSON 快取檔）"""
+    global _store
+
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                remove_legacy_files(os.path.dirname(CACHE_DB) or '.')
+                _store = CacheStore()
+    return _store
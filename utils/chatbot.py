@@ -7,6 +7,7 @@
 import re
 from datetime import datetime
 from .twse import get_stock_basic_info, get_market_summary, get_stock_name
+from .hub import lease_symbols
 
 class StockChatbot:
     """股票聊天機器人"""
@@ -139,6 +140,9 @@ class StockChatbot:
             if not stock_info or stock_info.get('錯誤'):
                 return f"抱歉，無法找到股票代碼 {stock_code} 的資訊。請確認代碼是否正確。"
             
+            # 使用者通常會接著追問同一檔股票，暫時交由發布中心持續更新
+            lease_symbols([stock_code])
+            
             stock_name = stock_info.get('股票名稱', stock_code)
             
             # 根據查詢類型回應
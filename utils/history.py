@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+歷史日線資料 (OHLCV) 本地儲存
+每檔股票一個資料夾，每個欄位一個原始二進位檔（欄式儲存），讀取時以 memory-map 開啟
+manifest.json 記錄的筆數，get_history() 回傳的陣列是直接指向檔案的切片，不複製資料。
+資料來自證交所 STOCK_DAY（每次回應為一整個月），已結束的月份視為不可變，只下載一次；
+當月資料在最近一個交易日收盤後才重新下載。
+
+新的交易日接在既有資料之後時，只把新資料列附加到欄位檔尾端，再以原子操作更新 manifest 的筆數；
+內容沒有變動的回應不寫入欄位檔。其他修改（如補上較早的月份）先產生新版本的資料夾，
+再更新 manifest 指向新版本；舊版本保留 version_grace 秒，讓讀取中的行程切換後才刪除。
+讀取中的行程不會看到寫到一半的資料。
+"""
+
+import os
+import json
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+import numpy as np
+from .market_calendar import now_taipei, last_trading_close, previous_trading_day, TAIPEI_TZ
+from .singleflight import FileLock, SingleFlight
+
+HISTORY_DIR = os.path.join('cache', 'history')
+
+# 欄位與資料型別（價格缺值為 NaN，數量缺值為 -1）
+COLUMNS = {
+    'date': np.int32,  # 西元日期 YYYYMMDD
+    'open': np.float64,
+    'high': np.float64,
+    'low': np.float64,
+    'close': np.float64,
+    'change': np.float64,
+    'volume': np.int64,  # 成交股數
+    'turnover': np.int64,  # 成交金額
+    'trades': np.int64,  # 成交筆數
+}
+
+# 歷史資料設定
+HISTORY_CONFIG = {
+    'backfill_months': 12,  # 未指定起始日期時回補的月數
+    'request_interval': 0.5,  # 回補時每次請求間隔秒數（避免被證交所限流）
+    'retry_backoff': 300,  # 月份下載失敗（或查無資料）後再次嘗試的秒數，每次失敗加倍
+    'max_backoff': 21600,  # 失敗退避秒數上限
+    'backfill_workers': 2,  # 背景回補的執行緒數量
+    'version_grace': 600,  # 舊版本資料夾在被取代後保留的秒數
+}
+
+_views = {}  # 股票代碼 -> (manifest 修改時間, 欄位陣列)
+_views_lock = threading.Lock()
+
+# 下載失敗的月份：(股票代碼, YYYYMM) -> (連續失敗次數, 可再次嘗試的時間)
+_failures = {}
+_failures_lock = threading.Lock()
+
+# 背景回補（同一代碼同時只回補一次）
+_backfill_executor = ThreadPoolExecutor(max_workers=HISTORY_CONFIG['backfill_workers'], thread_name_prefix='backfill')
+_backfill_flight = SingleFlight()
+_backfilling = set()
+_backfilling_lock = threading.Lock()
+
+
+def _symbol_dir(stock_code):
+    return os.path.join(HISTORY_DIR, stock_code)
+
+
+def _manifest_path(stock_code):
+    return os.path.join(_symbol_dir(stock_code), 'manifest.json')
+
+
+def load_manifest(stock_code):
+    """
+    讀取股票的 manifest
+    格式：{'version': 版本號, 'rows': 筆數, 'format': 'raw', 'months': {'YYYYMM': {'complete': bool, 'fetched_at': timestamp}},
+          'retired': {'舊版本號': 被取代的時間}}
+    """
+    path = _manifest_path(stock_code)
+    if not os.path.exists(path):
+        return {'version': 0, 'rows': 0, 'months': {}}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"❌ 讀取歷史資料 manifest 失敗 {stock_code}: {e}")
+        return {'version': 0, 'rows': 0, 'months': {}}
+
+
+def roc_to_int(roc_date):
+    """民國日期字串（如 '115/10/16'）轉為 YYYYMMDD 整數，無法解析時回傳 None"""
+    try:
+        year, month, day = (int(part) for part in str(roc_date).strip().split('/'))
+        return (year + 1911) * 10000 + month * 100 + day
+    except ValueError:
+        return None
+
+
+def _to_number(value, dtype):
+    """解析 STOCK_DAY 欄位字串，無法解析時回傳缺值"""
+    text = str(value).replace(',', '').strip()
+    if text.startswith('+'):
+        text = text[1:]
+    try:
+        number = float(text)
+    except ValueError:
+        return np.nan if dtype == np.float64 else -1
+    return number if dtype == np.float64 else int(number)
+
+
+def parse_stock_day_rows(rows):
+    """將 STOCK_DAY 的 data 列轉換為欄位陣列（依日期排序）"""
+    # 欄位：日期、成交股數、成交金額、開盤價、最高價、最低價、收盤價、漲跌價差、成交筆數
+    index = {'volume': 1, 'turnover': 2, 'open': 3, 'high': 4, 'low': 5, 'close': 6, 'change': 7, 'trades': 8}
+    records = []
+    for row in rows:
+        trade_date = roc_to_int(row[0]) if row else None
+        if trade_date is None or len(row) < 9:
+            continue
+        record = {'date': trade_date}
+        for column, position in index.items():
+            record[column] = _to_number(row[position], COLUMNS[column])
+        records.append(record)
+    records.sort(key=lambda record: record['date'])
+
+    return {column: np.array([record[column] for record in records], dtype=dtype)
+            for column, dtype in COLUMNS.items()}
+
+
+def _load_columns(stock_code, manifest):
+    """以 memory-map 開啟目前版本的所有欄位（只對應 manifest 記錄的筆數）"""
+    rows = manifest.get('rows')
+    if not rows:
+        return {column: np.empty(0, dtype=dtype) for column, dtype in COLUMNS.items()}
+    version_dir = os.path.join(_symbol_dir(stock_code), f"v{manifest['version']}")
+    if manifest.get('format') != 'raw':
+        # 舊格式：每個欄位一個 .npy 檔，下次寫入時轉為新格式
+        return {column: np.load(os.path.join(version_dir, f"{column}.npy"), mmap_mode='r')
+                for column in COLUMNS}
+    return {column: np.memmap(os.path.join(version_dir, f"{column}.bin"), dtype=dtype, mode='r', shape=(rows,))
+            for column, dtype in COLUMNS.items()}
+
+
+def _rows_equal(columns, mask, new_columns, count):
+    """既有資料中 mask 選取的資料列是否與新資料的前 count 列相同"""
+    for column, dtype in COLUMNS.items():
+        old = np.asarray(columns[column][mask])
+        new = new_columns[column][:count]
+        if not np.array_equal(old, new, equal_nan=dtype == np.float64):
+            return False
+    return True
+
+
+def _month_is_complete(month, fetched_at):
+    """月份已結束，且下載時間在該月最後一個交易日收盤之後"""
+    today = now_taipei().date()
+    if month >= today.strftime('%Y%m'):
+        return False
+    month_start = datetime.strptime(month, '%Y%m').date()
+    next_month = date(month_start.year + month_start.month // 12, month_start.month % 12 + 1, 1)
+    month_close = last_trading_close(datetime.combine(next_month, datetime.min.time(), TAIPEI_TZ))
+    return fetched_at >= month_close.timestamp()
+
+
+def month_needs_fetch(stock_code, month, manifest=None):
+    """月份 (YYYYMM) 是否需要向證交所下載"""
+    manifest = manifest or load_manifest(stock_code)
+    info = manifest['months'].get(month)
+    if info is None:
+        return True
+    if info.get('complete'):
+        return False
+    # 當月資料：最近一個交易日收盤後尚未更新過才下載
+    return info.get('fetched_at', 0) < last_trading_close().timestamp()
+
+
+def ingest_stock_day(stock_code, data):
+    """
+    將 STOCK_DAY 回應寫入歷史資料，取代同月份既有的資料列
+    既有資料已包含回應的前段且該月份是最後一個月份時，只附加新的交易日；內容未變動時只記錄下載時間
+    :param data: STOCK_DAY 的 JSON 回應（需有 'data' 欄位）
+    :return: 回應中該月份的資料列數
+    """
+    new_columns = parse_stock_day_rows(data.get('data') or [])
+    count = len(new_columns['date'])
+    if not count:
+        return 0
+
+    month = str(int(new_columns['date'][0]) // 100)
+    month_start = int(month) * 100
+    month_end = month_start + 99
+
+    with FileLock(f"history_{stock_code}"):
+        manifest = load_manifest(stock_code)
+        columns = _load_columns(stock_code, manifest)
+        dates = columns['date']
+
+        in_month = (dates >= month_start) & (dates <= month_end)
+        existing = int(np.count_nonzero(in_month))
+        is_tail = not len(dates) or int(dates[-1]) <= month_end
+        if is_tail and existing <= count and _rows_equal(columns, in_month, new_columns, existing):
+            if existing == count:
+                # 內容未變動（如報價查詢重複取得當月資料）：下載時間已過最近收盤時不必寫入
+                if month_needs_fetch(stock_code, month, manifest):
+                    _mark_fetched(manifest, month)
+                    _save_manifest(stock_code, manifest)
+            else:
+                _append_rows(stock_code, manifest, columns,
+                             {column: values[existing:] for column, values in new_columns.items()}, month)
+            return count
+
+        # 移除同月份的舊資料後合併
+        keep = ~in_month
+        merged = {column: np.concatenate([columns[column][keep], new_columns[column]])
+                  for column in COLUMNS}
+        _write_version(stock_code, manifest, merged, month)
+
+    return count
+
+
+def append_daily_bar(stock_code, bar):
+    """
+    將單日日線（如全市場收盤行情）接在既有歷史資料之後
+    只在本地資料已連續到前一個交易日時寫入，避免月份中出現缺漏；
+    尚無歷史資料或中間有缺漏的股票略過，留給 backfill() 下載整月
+    :param bar: {欄位: 數值}，需包含 COLUMNS 的所有欄位
+    :return: 是否寫入
+    """
+    if not os.path.exists(_manifest_path(stock_code)):
+        return False
+
+    trade_date = int(bar['date'])
+    previous = _date_key(previous_trading_day(datetime.strptime(str(trade_date), '%Y%m%d').date()))
+
+    with FileLock(f"history_{stock_code}"):
+        manifest = load_manifest(stock_code)
+        if not manifest.get('rows'):
+            return False
+        columns = _load_columns(stock_code, manifest)
+        if int(columns['date'][-1]) != previous:
+            return False
+
+        rows = {column: np.array([bar[column]], dtype=dtype) for column, dtype in COLUMNS.items()}
+        _append_rows(stock_code, manifest, columns, rows, str(trade_date // 100))
+    return True
+
+
+def _mark_fetched(manifest, month):
+    """記錄月份 (YYYYMM) 的下載時間與是否已定案"""
+    fetched_at = time.time()
+    manifest['months'][month] = {
+        'complete': _month_is_complete(month, fetched_at),
+        'fetched_at': fetched_at,
+    }
+
+
+def _save_manifest(stock_code, manifest):
+    """以原子操作寫入 manifest，並刪除被取代超過 version_grace 秒的舊版本"""
+    now = time.time()
+    retired = manifest.setdefault('retired', {})
+    expired = [version for version, retired_at in retired.items()
+               if now - retired_at >= HISTORY_CONFIG['version_grace']]
+    for version in expired:
+        del retired[version]
+
+    tmp_file = f"{_manifest_path(stock_code)}.{os.getpid()}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_file, _manifest_path(stock_code))
+
+    for version in expired:
+        shutil.rmtree(os.path.join(_symbol_dir(stock_code), f"v{version}"), ignore_errors=True)
+
+
+def _append_rows(stock_code, manifest, columns, rows, month):
+    """
+    將日期在既有資料之後的資料列附加到目前版本的欄位檔尾端，再更新 manifest 的筆數
+    （呼叫端需持有該股票的 FileLock）；舊格式或尚無資料時改為寫入新版本
+    :param rows: {欄位: 陣列}
+    """
+    if manifest.get('format') != 'raw' or not manifest.get('rows'):
+        merged = {column: np.concatenate([columns[column], rows[column]]) for column in COLUMNS}
+        _write_version(stock_code, manifest, merged, month)
+        return
+
+    # 從 manifest 記錄的筆數之後寫入（覆蓋先前中斷時可能留下的多餘資料），讀取端只對應記錄的筆數
+    version_dir = os.path.join(_symbol_dir(stock_code), f"v{manifest['version']}")
+    for column, dtype in COLUMNS.items():
+        with open(os.path.join(version_dir, f"{column}.bin"), 'r+b') as f:
+            f.seek(manifest['rows'] * np.dtype(dtype).itemsize)
+            f.write(np.ascontiguousarray(rows[column], dtype=dtype).tobytes())
+
+    manifest['rows'] += int(len(rows['date']))
+    _mark_fetched(manifest, month)
+    _save_manifest(stock_code, manifest)
+
+
+def _write_version(stock_code, manifest, merged, month):
+    """
+    寫入新版本的欄位檔，再以原子操作更新 manifest（呼叫端需持有該股票的 FileLock）
+    被取代的版本保留 version_grace 秒後才刪除，讓其他行程讀取中的舊版本不會消失
+    :param month: 本次更新的月份 (YYYYMM)，記錄下載時間與是否已定案
+    """
+    order = np.argsort(merged['date'], kind='stable')
+
+    version = manifest['version'] + 1
+    version_dir = os.path.join(_symbol_dir(stock_code), f"v{version}")
+    os.makedirs(version_dir, exist_ok=True)
+    for column, dtype in COLUMNS.items():
+        np.ascontiguousarray(merged[column][order], dtype=dtype).tofile(os.path.join(version_dir, f"{column}.bin"))
+
+    if manifest.get('rows'):
+        manifest.setdefault('retired', {})[str(manifest['version'])] = time.time()
+    _mark_fetched(manifest, month)
+    manifest['version'] = version
+    manifest['rows'] = int(len(order))
+    manifest['format'] = 'raw'
+    _save_manifest(stock_code, manifest)
+
+
+def _get_columns(stock_code):
+    """取得股票所有欄位的 memory-map（manifest 更新時重新開啟）"""
+    try:
+        mtime = os.stat(_manifest_path(stock_code)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    cached = _views.get(stock_code)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    columns = _load_columns(stock_code, load_manifest(stock_code))
+    with _views_lock:
+        _views[stock_code] = (mtime, columns)
+    return columns
+
+
+def _date_key(value):
+    """日期參數（date、datetime、'YYYY-MM-DD' 或 YYYYMMDD）轉為 YYYYMMDD 整數"""
+    if value is None:
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.year * 10000 + value.month * 100 + value.day
+    text = str(value).replace('-', '').replace('/', '')
+    return int(text)
+
+
+def get_history(stock_code, start=None, end=None):
+    """
+    取得本地的歷史日線資料（不發出網路請求）
+    :param start: 起始日期（含），None 表示最早
+    :param end: 結束日期（含），None 表示最新
+    :return: {欄位: NumPy 陣列}，陣列為唯讀的 memory-map 切片；無資料時各欄位為空陣列
+    """
+    columns = _get_columns(stock_code)
+    if columns is None:
+        return {column: np.empty(0, dtype=dtype) for column, dtype in COLUMNS.items()}
+
+    dates = columns['date']
+    start_key, end_key = _date_key(start), _date_key(end)
+    lo = int(np.searchsorted(dates, start_key, side='left')) if start_key else 0
+    hi = int(np.searchsorted(dates, end_key, side='right')) if end_key else len(dates)
+    return {column: values[lo:hi] for column, values in columns.items()}
+
+
+def _months_between(start, end):
+    """列出 start 到 end 之間的月份 (YYYYMM)"""
+    year, month = start.year, start.month
+    months = []
+    while (year, month) <= (end.year, end.month):
+        months.append(f"{year}{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def _record_failure(stock_code, month):
+    """記錄月份下載失敗，退避時間每次加倍"""
+    with _failures_lock:
+        count = _failures.get((stock_code, month), (0, 0))[0] + 1
+        backoff = min(HISTORY_CONFIG['retry_backoff'] * 2 ** (count - 1), HISTORY_CONFIG['max_backoff'])
+        _failures[(stock_code, month)] = (count, time.time() + backoff)
+
+
+def _in_backoff(stock_code, month):
+    failure = _failures.get((stock_code, month))
+    return failure is not None and failure[1] > time.time()
+
+
+def months_to_fetch(stock_code, start=None, end=None):
+    """
+    需要下載的月份 (YYYYMM)：本地缺少或尚未定案，且不在失敗退避中
+    :param start: 起始日期，預設為 HISTORY_CONFIG['backfill_months'] 個月前
+    :param end: 結束日期，預設為今天
+    """
+    today = now_taipei().date()
+    end = datetime.strptime(str(_date_key(end)), '%Y%m%d').date() if end else today
+    if start:
+        start = datetime.strptime(str(_date_key(start)), '%Y%m%d').date()
+    else:
+        months_back = HISTORY_CONFIG['backfill_months'] - 1
+        year, month = divmod(end.year * 12 + end.month - 1 - months_back, 12)
+        start = date(year, month + 1, 1)
+
+    manifest = load_manifest(stock_code)
+    return [month for month in _months_between(start, min(end, today))
+            if month_needs_fetch(stock_code, month, manifest) and not _in_backoff(stock_code, month)]
+
+
+def backfill(stock_code, start=None, end=None):
+    """
+    下載本地缺少或尚未定案的月份（同步執行，網站請求請使用 schedule_backfill）
+    下載失敗或查無資料的月份依 retry_backoff 退避，期間內不再嘗試
+    :param start: 起始日期，預設為 HISTORY_CONFIG['backfill_months'] 個月前
+    :param end: 結束日期，預設為今天
+    :return: 實際寫入的月份數
+    """
+    # 避免與 twse 模組循環匯入
+    from .twse import get_stock_day
+
+    ingested = failed = 0
+    for index, month in enumerate(months_to_fetch(stock_code, start, end)):
+        if index:
+            time.sleep(HISTORY_CONFIG['request_interval'])
+        try:
+            data = get_stock_day(stock_code, f"{month}01")
+        except Exception as e:
+            print(f"⚠️ {stock_code} {month} 歷史資料下載失敗: {e}")
+            data = None
+        if data and ingest_stock_day(stock_code, data):
+            ingested += 1
+            with _failures_lock:
+                _failures.pop((stock_code, month), None)
+        else:
+            failed += 1
+            _record_failure(stock_code, month)
+    if ingested:
+        print(f"📚 {stock_code} 已回補 {ingested} 個月份的歷史資料")
+    if failed:
+        print(f"⚠️ {stock_code} 有 {failed} 個月份無法取得歷史資料，稍後再試")
+    return ingested
+
+
+def schedule_backfill(stock_code):
+    """
+    在背景回補歷史資料（同一代碼同時只回補一次，跨行程以 SingleFlight 合併）
+    :return: 回補是否已排程或進行中；沒有需要下載的月份（含都在失敗退避中）時回傳 False
+    """
+    with _backfilling_lock:
+        if stock_code in _backfilling:
+            return True
+        if not months_to_fetch(stock_code):
+            return False
+        _backfilling.add(stock_code)
+
+    def run():
+        try:
+            _backfill_flight.do(f"history_backfill_{stock_code}", lambda: backfill(stock_code))
+        except Exception as e:
+            print(f"❌ 背景回補歷史資料失敗 {stock_code}: {e}")
+        finally:
+            with _backfilling_lock:
+                _backfilling.discard(stock_code)
+
+    _backfill_executor.submit(run)
+    return True
+
+
+if __name__ == "__main__":
+    import sys
+
+    code = sys.argv[1] if len(sys.argv) > 1 else '2330'
+    backfill(code)
+    history = get_history(code)
+    print(f"📈 {code} 共 {len(history['date'])} 筆日線資料")
+    for i in range(max(0, len(history['date']) - 5), len(history['date'])):
+        print(f"  {history['date'][i]}  收盤 {history['close'][i]:.2f}  成交股數 {history['volume'][i]:,}")
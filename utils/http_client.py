@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共用 HTTP 連線池
+所有上游資料來源（證交所、Yahoo Finance 等）共用同一個 requests.Session，
+每個主機保持長連線，避免每次查詢都重新建立 TCP 與 TLS 連線。
+非同步查詢則共用一個背景事件迴圈與 aiohttp 連線池。
+"""
+
+import os
+import asyncio
+import threading
+import time
+from concurrent.futures import CancelledError
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+# 連線池設定
+POOL_CONFIG = {
+    'pool_connections': 10,  # 快取連線池的主機數量
+    'pool_maxsize': 20,  # 每個主機保留的連線數上限
+    'pool_block': False,  # 連線數滿時不阻塞，超出的連線用完即關閉
+    'async_limit': 200,  # 非同步連線池同時進行的連線總數上限
+    'async_limit_per_host': 50,  # 非同步連線池每個主機的連線數上限
+}
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+_loop = None
+_loop_pid = None
+_loop_thread = None
+_loop_lock = threading.Lock()
+_async_session = None
+_scopes = threading.local()  # 目前執行緒所在的 CancelScope
+
+
+def _create_session():
+    """建立掛載連線池的 Session"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONFIG['pool_connections'],
+        pool_maxsize=POOL_CONFIG['pool_maxsize'],
+        pool_block=POOL_CONFIG['pool_block'],
+        max_retries=0,
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    """取得目前行程共用的 Session（fork 後的子行程會重新建立）"""
+    global _session, _session_pid
+
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _create_session()
+                _session_pid = pid
+    return _session
+
+
+def http_get(url, timeout, headers=None, **kwargs):
+    """
+    透過共用連線池發出 GET 請求
+    :param timeout: (連線逾時, 讀取逾時) 秒數
+    """
+    return get_session().get(url, timeout=timeout, headers=headers, **kwargs)
+
+
+def get_event_loop():
+    """取得目前行程共用的背景事件迴圈（第一次呼叫時啟動）"""
+    global _loop, _loop_pid, _loop_thread, _async_session
+
+    pid = os.getpid()
+    if _loop is None or _loop_pid != pid:
+        with _loop_lock:
+            if _loop is None or _loop_pid != pid:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name='quote-engine', daemon=True)
+                thread.start()
+                _loop = loop
+                _loop_pid = pid
+                _loop_thread = thread
+                _async_session = None
+    return _loop
+
+
+class CancelScope:
+    """
+    可整組取消的同步等待範圍（例如對沖模式中的一次來源嘗試）
+    在 with 區塊內呼叫的 run_sync 以範圍的期限為逾時，cancel() 會取消事件迴圈上執行中的協程，
+    等待中的執行緒立即收到 CancelledError。
+    """
+
+    def __init__(self, timeout=None):
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.cancelled = False
+        self._futures = set()
+        self._lock = threading.Lock()
+        self._parent = None
+
+    def __enter__(self):
+        self._parent = getattr(_scopes, 'current', None)
+        _scopes.current = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _scopes.current = self._parent
+        return False
+
+    def cancel(self):
+        """取消範圍內執行中與之後的協程"""
+        with self._lock:
+            self.cancelled = True
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()
+
+    def wait(self, future, timeout=None):
+        """等待 run_coroutine_threadsafe 的結果（期限取 timeout 與範圍期限中較早者）"""
+        with self._lock:
+            if self.cancelled:
+                future.cancel()
+                raise CancelledError()
+            self._futures.add(future)
+        if self.deadline is not None:
+            remaining = max(0.0, self.deadline - time.monotonic())
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        try:
+            return future.result(timeout)
+        finally:
+            with self._lock:
+                self._futures.discard(future)
+
+
+def run_sync(coro, timeout=None):
+    """
+    在背景事件迴圈執行協程，並以同步方式等待結果
+    在 CancelScope 中呼叫時以範圍的期限為逾時；逾時或範圍被取消時一併取消事件迴圈上的協程
+    """
+    loop = get_event_loop()
+    if threading.current_thread() is _loop_thread:
+        coro.close()
+        raise RuntimeError('不可在事件迴圈執行緒中同步等待協程')
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    scope = getattr(_scopes, 'current', None)
+    try:
+        return scope.wait(future, timeout) if scope is not None else future.result(timeout)
+    except TimeoutError:
+        future.cancel()
+        raise TimeoutError('協程執行逾時') from None
+
+
+def _get_async_session():
+    """取得共用的 aiohttp Session（只能在背景事件迴圈中呼叫）"""
+    global _async_session
+
+    if _async_session is None or _async_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=POOL_CONFIG['async_limit'],
+            limit_per_host=POOL_CONFIG['async_limit_per_host'],
+        )
+        _async_session = aiohttp.ClientSession(connector=connector)
+    return _async_session
+
+
+async def async_http_get_json(url, timeout, headers=None, raise_for_status=True):
+    """
+    透過共用非同步連線池發出 GET 請求並解析 JSON
+    :param timeout: (連線逾時, 讀取逾時) 秒數
+    :return: (HTTP 狀態碼, JSON 資料)；未檢查狀態且非 200 時資料為 None
+    """
+    connect_timeout, read_timeout = timeout
+    client_timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+
+    async with _get_async_session().get(url, timeout=client_timeout, headers=headers) as resp:
+        if raise_for_status:
+            resp.raise_for_status()
+        elif resp.status != 200:
+            return resp.status, None
+        # 證交所回應的 Content-Type 不一定是 application/json
+        return resp.status, await resp.json(content_type=None)
+
+
+async def _close_async_session():
+    """關閉共用 aiohttp Session"""
+    global _async_session
+
+    if _async_session is not None and not _async_session.closed:
+        await _async_session.close()
+    _async_session = None
+
+
+def close_session():
+    """關閉共用 Session 並釋放所有連線"""
+    global _session, _session_pid
+
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+        _session_pid = None
+
+    if _loop is not None and _loop_pid == os.getpid():
+        run_sync(_close_async_session())
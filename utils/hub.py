@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+報價發布/訂閱中心
+報價串流連線、價格提醒與聊天機器人等訂閱者向中心登記關注的股票代碼，
+中心對每個代碼維護參考計數，由單一執行緒定期更新所有被關注的代碼：
+    - 快取即將到期的代碼每批只發出一次上游請求（與背景輪詢相同的批次路徑）
+    - 報價有變動時廣播給該代碼的所有訂閱者
+因此上游請求量只隨「不同的代碼數」增加，與同時觀看的使用者數量無關。
+
+本行程寫入關注代碼的報價快取時（例如其他請求剛好查詢到）會立即喚醒中心並廣播。
+"""
+
+import threading
+import time
+from .twse import CONFIG, get_stock_quotes, clean_stock_code, reject_stock_code, is_pending, add_cache_listener
+from .quote import Quote
+from .poller import due_cache_keys
+from .market_calendar import now_taipei, is_market_open, next_phase_change
+
+# 發布中心設定
+HUB_CONFIG = {
+    'open_interval': 5,  # 盤中檢查快取的間隔秒數
+    'idle_interval': 300,  # 非盤中檢查的最長間隔秒數
+    'min_interval': 1,  # 兩次廣播的最短間隔秒數（合併短時間內的多次快取寫入）
+    'refresh_ahead': 8,  # 快取剩餘秒數低於此值時提前更新
+    'deadline': 2.0,  # 新關注的代碼等待上游查詢的最長秒數（逾時者於背景完成後再廣播）
+    'pending_seconds': 30,  # 逾時的代碼在此秒數內不再重新查詢（背景查詢寫入快取時提前解除）
+    'lease_seconds': 300,  # 暫時關注（lease）的預設秒數
+    'max_symbols': 2000,  # 同時更新的代碼數量上限
+}
+
+
+class Subscription:
+    """一個訂閱者關注的代碼與回呼函式"""
+
+    __slots__ = ('codes', 'callback')
+
+    def __init__(self, codes, callback):
+        self.codes = codes
+        self.callback = callback  # callback(代碼, Quote)，在發布中心的執行緒中呼叫，必須立即返回
+
+    def update(self, stock_codes):
+        """改為關注另一組代碼"""
+        get_hub().update(self, stock_codes)
+
+    def close(self):
+        """取消訂閱"""
+        get_hub().unsubscribe(self)
+
+
+class QuoteHub(threading.Thread):
+    """報價發布/訂閱中心執行緒"""
+
+    def __init__(self):
+        super().__init__(name='quote-hub', daemon=True)
+        self._listeners = {}  # 代碼 -> 訂閱集合（集合大小即參考計數）
+        self._leases = {}  # 代碼 -> 暫時關注的到期時間
+        self._latest = {}  # 代碼 -> 最後廣播的 Quote
+        self._pending = {}  # 代碼 -> 背景查詢中、暫不重新查詢的期限
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self.stats = {
+            'cycles': 0,
+            'batches': 0,
+            'symbols_refreshed': 0,
+            'published': 0,
+            'deliveries': 0,
+            'errors': 0,
+            'last_cycle': None,
+            'last_error': None,
+        }
+        add_cache_listener(self._on_cache_write)
+
+    # === 訂閱 ===
+
+    def subscribe(self, stock_codes, callback):
+        """
+        關注一組代碼；已有報價的代碼立即以目前報價呼叫一次 callback
+        :return: Subscription
+        """
+        subscription = Subscription(self._clean(stock_codes), callback)
+        with self._lock:
+            for code in subscription.codes:
+                self._listeners.setdefault(code, set()).add(subscription)
+            replay = [(code, self._latest[code]) for code in subscription.codes if code in self._latest]
+        self._deliver(subscription, replay)
+        self._wake.set()
+        return subscription
+
+    def update(self, subscription, stock_codes):
+        """改變訂閱關注的代碼（新代碼同樣立即取得目前報價）"""
+        codes = self._clean(stock_codes)
+        with self._lock:
+            self._remove(subscription)
+            added = [code for code in codes if code not in subscription.codes]
+            subscription.codes = codes
+            for code in codes:
+                self._listeners.setdefault(code, set()).add(subscription)
+            replay = [(code, self._latest[code]) for code in added if code in self._latest]
+        self._deliver(subscription, replay)
+        self._wake.set()
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._remove(subscription)
+
+    def lease(self, stock_codes, seconds=None):
+        """暫時關注代碼（到期自動取消，重複呼叫會延長），用於沒有持續連線的訂閱者"""
+        expires = time.monotonic() + (seconds or HUB_CONFIG['lease_seconds'])
+        with self._lock:
+            for code in self._clean(stock_codes):
+                self._leases[code] = max(expires, self._leases.get(code, 0))
+        self._wake.set()
+
+    def latest(self, stock_code):
+        """最後廣播的報價，沒有時回傳 None"""
+        return self._latest.get(clean_stock_code(stock_code))
+
+    def _clean(self, stock_codes):
+        codes = []
+        for stock_code in stock_codes:
+            code = clean_stock_code(stock_code)
+            if code and code not in codes:
+                codes.append(code)
+        return codes
+
+    def _remove(self, subscription):
+        for code in subscription.codes:
+            listeners = self._listeners.get(code)
+            if listeners is not None:
+                listeners.discard(subscription)
+                if not listeners:
+                    del self._listeners[code]
+                    if code not in self._leases:
+                        self._latest.pop(code, None)
+
+    def _on_cache_write(self, keys):
+        """本行程寫入關注代碼的報價快取時喚醒（背景查詢中的代碼解除等待）"""
+        wake = False
+        with self._lock:
+            for key in keys:
+                if key.startswith('stock_basic_'):
+                    code = key[len('stock_basic_'):]
+                    self._pending.pop(code, None)
+                    if code in self._listeners or code in self._leases:
+                        wake = True
+        if wake:
+            self._wake.set()
+
+    # === 更新與廣播 ===
+
+    def subscribed_codes(self):
+        """目前被關注的代碼（移除到期的暫時關注）"""
+        now = time.monotonic()
+        with self._lock:
+            for code in [code for code, expires in self._leases.items() if expires <= now]:
+                del self._leases[code]
+                if code not in self._listeners:
+                    self._latest.pop(code, None)
+            codes = list(self._listeners) + [code for code in self._leases if code not in self._listeners]
+        return [code for code in codes if not reject_stock_code(code, count=False)][:HUB_CONFIG['max_symbols']]
+
+    def poll_once(self):
+        """更新即將到期的代碼並廣播有變動的報價，回傳本輪廣播的代碼數"""
+        self.stats['cycles'] += 1
+        self.stats['last_cycle'] = now_taipei().isoformat()
+
+        codes = self.subscribed_codes()
+        if not codes:
+            return 0
+
+        # 已有快取但即將到期的代碼：每批一次上游請求
+        due_keys = due_cache_keys([f"stock_basic_{code}" for code in codes], HUB_CONFIG['refresh_ahead'])
+        due = [code for code in codes if f"stock_basic_{code}" in due_keys and code in self._latest]
+        batch_size = CONFIG['batch_size']
+        for start in range(0, len(due), batch_size):
+            if self._stop_event.is_set():
+                return 0
+            get_stock_quotes(due[start:start + batch_size], fallback=False, refresh=True)
+            self.stats['batches'] += 1
+        self.stats['symbols_refreshed'] += len(due)
+
+        # 其餘代碼經由快取讀取；尚無報價的代碼於期限內查詢，逾時者完成後寫入快取再喚醒。
+        # 逾時仍在背景查詢的代碼不再重複送出，等快取寫入或 pending_seconds 後再查
+        now = time.monotonic()
+        with self._lock:
+            for code in [code for code, expires in self._pending.items() if expires <= now]:
+                del self._pending[code]
+            ready = [code for code in codes if code not in self._pending]
+        quotes = get_stock_quotes(ready, deadline=HUB_CONFIG['deadline']) if ready else {}
+        deferred = [code for code, quote in quotes.items() if is_pending(quote)]
+        if deferred:
+            expires = time.monotonic() + HUB_CONFIG['pending_seconds']
+            with self._lock:
+                for code in deferred:
+                    self._pending[code] = expires
+            # 標記前已完成並寫入快取的代碼不必等待
+            missing = due_cache_keys([f"stock_basic_{code}" for code in deferred], 0)
+            with self._lock:
+                for code in deferred:
+                    if f"stock_basic_{code}" not in missing and self._pending.pop(code, None):
+                        self._wake.set()
+        changed = []
+        for code in codes:
+            quote = quotes.get(code)
+            previous = self._latest.get(code)
+            if isinstance(quote, Quote) and (previous is None or (quote.fetched_at, quote.price) != (previous.fetched_at, previous.price)):
+                changed.append((code, quote))
+
+        with self._lock:
+            deliveries = {}
+            for code, quote in changed:
+                listeners = self._listeners.get(code)
+                if listeners is None and code not in self._leases:
+                    continue  # 查詢期間已取消關注
+                self._latest[code] = quote
+                for subscription in listeners or ():
+                    deliveries.setdefault(subscription, []).append((code, quote))
+        for subscription, updates in deliveries.items():
+            self._deliver(subscription, updates)
+
+        self.stats['published'] += len(changed)
+        return len(changed)
+
+    def _deliver(self, subscription, updates):
+        for code, quote in updates:
+            try:
+                subscription.callback(code, quote)
+                self.stats['deliveries'] += 1
+            except Exception as e:
+                print(f"❌ 報價訂閱者處理失敗 {code}: {e}")
+
+    def next_delay(self):
+        """依盤勢決定下次檢查前等待的秒數（快取寫入或新訂閱時提前喚醒）"""
+        now = now_taipei()
+        if is_market_open(now):
+            return HUB_CONFIG['open_interval']
+        seconds_to_change = (next_phase_change(now) - now).total_seconds()
+        return max(1.0, min(seconds_to_change, HUB_CONFIG['idle_interval']))
+
+    def stop(self):
+        """停止發布中心"""
+        self._stop_event.set()
+        self._wake.set()
+
+    def run(self):
+        print("📣 報價發布中心啟動")
+        while not self._stop_event.is_set():
+            self._wake.clear()
+            try:
+                self.poll_once()
+            except Exception as e:
+                self.stats['errors'] += 1
+                self.stats['last_error'] = str(e)
+                print(f"❌ 報價發布中心發生異常: {e}")
+            self._stop_event.wait(HUB_CONFIG['min_interval'])
+            self._wake.wait(self.next_delay())
+        print("🛑 報價發布中心已停止")
+
+    def get_stats(self):
+        with self._lock:
+            refcounts = {code: len(listeners) for code, listeners in self._listeners.items()}
+            subscriptions = len({subscription for listeners in self._listeners.values() for subscription in listeners})
+            leases = len(self._leases)
+            pending = len(self._pending)
+        return dict(self.stats,
+                    running=self.is_alive(),
+                    symbols=len(set(refcounts) | set(self._leases)),
+                    subscriptions=subscriptions,
+                    leases=leases,
+                    pending=pending,
+                    top_symbols=sorted(refcounts.items(), key=lambda item: -item[1])[:10])
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    """取得發布中心（第一次呼叫時啟動，同一行程只有一個）"""
+    global _hub
+
+    with _hub_lock:
+        if _hub is None:
+            _hub = QuoteHub()
+            _hub.start()
+    return _hub
+
+
+def subscribe(stock_codes, callback):
+    """關注一組代碼，報價變動時呼叫 callback(代碼, Quote)；回傳的 Subscription 用完須 close()"""
+    return get_hub().subscribe(stock_codes, callback)
+
+
+def lease_symbols(stock_codes, seconds=None):
+    """暫時關注代碼（預設 HUB_CONFIG['lease_seconds'] 秒）"""
+    get_hub().lease(stock_codes, seconds)
+
+
+def get_hub_stats():
+    """取得發布中心統計，未啟動時回傳 None"""
+    hub = _hub
+    return hub.get_stats() if hub is not None else None
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+技術指標計算
+以 NumPy 向量運算計算日線的 SMA、EMA、RSI、MACD、布林通道、ATR 與均量。
+所有函式沿最後一軸計算，傳入 1-D 陣列計算單檔股票，傳入 2-D 陣列（每列一檔股票）一次計算多檔；
+資料不足的位置為 NaN。
+指數平滑以分段閉合式 (cumsum) 計算，不逐日迴圈，數年的日線也只需數毫秒。
+
+計算結果依 (股票代碼, 指標, 參數, 最後一根日線日期) 快取，有新日線時自然失效。
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from .history import get_history, _date_key
+from .memory_cache import TTLCache
+
+# 指標設定
+INDICATOR_CONFIG = {
+    'cache_size': 5000,  # 快取的計算結果數量上限
+    'cache_ttl': 86400,  # 計算結果保留秒數（有新日線時鍵值不同，自然不會命中）
+    'max_window': 250,  # 週期參數上限
+    'max_num_std': 5,  # 布林通道標準差倍數上限
+    'series_limit': 120,  # API 預設回傳的最近日線筆數
+    # 個股頁面與 API 預設顯示的指標
+    'defaults': [
+        ('sma', {'window': 5}),
+        ('sma', {'window': 20}),
+        ('sma', {'window': 60}),
+        ('ema', {'span': 12}),
+        ('ema', {'span': 26}),
+        ('rsi', {'period': 14}),
+        ('macd', {'fast': 12, 'slow': 26, 'signal': 9}),
+        ('bollinger', {'window': 20, 'num_std': 2}),
+        ('atr', {'period': 14}),
+        ('volume_ma', {'window': 5}),
+        ('volume_ma', {'window': 20}),
+    ],
+}
+
+# 指數平滑分段長度的上限：衰減係數的次方維持在 1e-150 以上，避免溢位
+_MAX_EXPONENT = 150 * np.log(10)
+
+_cache = TTLCache(INDICATOR_CONFIG['cache_size'], INDICATOR_CONFIG['cache_ttl'])
+
+
+# === 基本運算 ===
+
+def _ffill(values):
+    """沿最後一軸以前值補齊缺值（停牌日沿用前一日價格），開頭的缺值維持 NaN"""
+    valid = np.isfinite(values)
+    if valid.all():
+        return values
+    index = np.where(valid, np.arange(values.shape[-1]), 0)
+    np.maximum.accumulate(index, axis=-1, out=index)
+    return np.take_along_axis(values, index, axis=-1)
+
+
+def _shift(values, periods=1):
+    """沿最後一軸向後移動，開頭補 NaN"""
+    shifted = np.full(values.shape, np.nan)
+    shifted[..., periods:] = values[..., :-periods]
+    return shifted
+
+
+def _linear_filter(inputs, decay):
+    """
+    求解 s[t] = decay * s[t-1] + inputs[t]（初值為 0）
+    每段內以 s[t] = decay^t * (s[-1] * decay + cumsum(inputs / decay^t)) 計算
+    """
+    if decay <= 0:
+        return inputs.copy()
+
+    out = np.empty(inputs.shape)
+    length = inputs.shape[-1]
+    block = max(1, int(_MAX_EXPONENT / -np.log(decay)))
+    carry = np.zeros(inputs.shape[:-1])
+    for start in range(0, length, block):
+        chunk = inputs[..., start:start + block]
+        powers = decay ** np.arange(chunk.shape[-1])
+        segment = powers * (decay * carry[..., np.newaxis] + np.cumsum(chunk / powers, axis=-1))
+        out[..., start:start + chunk.shape[-1]] = segment
+        carry = segment[..., -1]
+    return out
+
+
+def _smooth(values, period, alpha):
+    """指數平滑：以前 period 筆的簡單平均為起始值，之後 s = s + alpha * (x - s)"""
+    values = _ffill(np.asarray(values, dtype=np.float64))
+    seed = sma(values, period)
+    started = np.cumsum(np.isfinite(seed), axis=-1)
+    inputs = np.where(started == 1, seed, np.where(started > 1, alpha * values, 0.0))
+    inputs = np.nan_to_num(inputs)
+    out = _linear_filter(inputs, 1.0 - alpha)
+    out[started == 0] = np.nan
+    return out
+
+
+# === 指標 ===
+
+def sma(values, window):
+    """簡單移動平均（視窗內有缺值時為 NaN）"""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(values.shape, np.nan)
+    if window < 1 or values.shape[-1] < window:
+        return out
+
+    valid = np.isfinite(values)
+    pad = np.zeros(values.shape[:-1] + (1,))
+    sums = np.concatenate([pad, np.cumsum(np.where(valid, values, 0.0), axis=-1)], axis=-1)
+    counts = np.concatenate([pad, np.cumsum(valid, axis=-1)], axis=-1)
+    window_sums = sums[..., window:] - sums[..., :-window]
+    full = (counts[..., window:] - counts[..., :-window]) == window
+    out[..., window - 1:] = np.where(full, window_sums / window, np.nan)
+    return out
+
+
+def ema(values, span):
+    """指數移動平均（alpha = 2 / (span + 1)）"""
+    return _smooth(values, span, 2.0 / (span + 1))
+
+
+def rsi(close, period=14):
+    """相對強弱指標（Wilder 平滑）"""
+    close = _ffill(np.asarray(close, dtype=np.float64))
+    delta = close - _shift(close)
+    avg_gain = _smooth(np.clip(delta, 0, None), period, 1.0 / period)
+    avg_loss = _smooth(np.clip(-delta, 0, None), period, 1.0 / period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    # 期間內沒有下跌時為 100，完全沒有漲跌時為 50
+    flat = avg_loss == 0
+    out[flat] = np.where(avg_gain[flat] > 0, 100.0, 50.0)
+    return out
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    """MACD：回傳 (DIF, 訊號線, 柱狀體)"""
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return line, signal_line, line - signal_line
+
+
+def bollinger(close, window=20, num_std=2):
+    """布林通道：回傳 (上軌, 中軌, 下軌)，標準差為母體標準差"""
+    close = _ffill(np.asarray(close, dtype=np.float64))
+    middle = sma(close, window)
+    std = np.full(close.shape, np.nan)
+    if close.shape[-1] >= window:
+        std[..., window - 1:] = sliding_window_view(close, window, axis=-1).std(axis=-1)
+    return middle + num_std * std, middle, middle - num_std * std
+
+
+def atr(high, low, close, period=14):
+    """平均真實區間（Wilder 平滑）"""
+    high = _ffill(np.asarray(high, dtype=np.float64))
+    low = _ffill(np.asarray(low, dtype=np.float64))
+    prev_close = _shift(_ffill(np.asarray(close, dtype=np.float64)))
+    # 第一根日線沒有昨收，fmax 會忽略 NaN 而只用高低價差
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return _smooth(true_range, period, 1.0 / period)
+
+
+def volume_ma(volume, window=20):
+    """成交量移動平均（負數視為缺值）"""
+    volume = np.asarray(volume, dtype=np.float64)
+    return sma(np.where(volume >= 0, volume, np.nan), window)
+
+
+# 指標定義：計算函式、輸入欄位、參數（依序，含預設值）與輸出名稱
+INDICATORS = {
+    'sma': {'func': sma, 'inputs': ('close',), 'params': {'window': 20}, 'outputs': ('sma',)},
+    'ema': {'func': ema, 'inputs': ('close',), 'params': {'span': 20}, 'outputs': ('ema',)},
+    'rsi': {'func': rsi, 'inputs': ('close',), 'params': {'period': 14}, 'outputs': ('rsi',)},
+    'macd': {'func': macd, 'inputs': ('close',), 'params': {'fast': 12, 'slow': 26, 'signal': 9},
+             'outputs': ('dif', 'signal', 'histogram')},
+    'bollinger': {'func': bollinger, 'inputs': ('close',), 'params': {'window': 20, 'num_std': 2},
+                  'outputs': ('upper', 'middle', 'lower')},
+    'atr': {'func': atr, 'inputs': ('high', 'low', 'close'), 'params': {'period': 14}, 'outputs': ('atr',)},
+    'volume_ma': {'func': volume_ma, 'inputs': ('volume',), 'params': {'window': 20}, 'outputs': ('volume_ma',)},
+}
+
+# 顯示名稱
+INDICATOR_NAMES = {
+    'sma': 'SMA',
+    'ema': 'EMA',
+    'rsi': 'RSI',
+    'macd': 'MACD',
+    'bollinger': '布林通道',
+    'atr': 'ATR',
+    'volume_ma': '均量',
+}
+
+OUTPUT_NAMES = {
+    'dif': 'DIF',
+    'signal': '訊號',
+    'histogram': '柱狀',
+    'upper': '上軌',
+    'middle': '中軌',
+    'lower': '下軌',
+}
+
+
+def normalize_params(name, params=None):
+    """檢查指標名稱與參數，補上預設值；不合法時拋出 ValueError"""
+    spec = INDICATORS.get(name)
+    if spec is None:
+        raise ValueError(f"不支援的指標: {name}")
+
+    normalized = {}
+    for key, default in spec['params'].items():
+        value = (params or {}).get(key, default)
+        try:
+            value = float(value) if key == 'num_std' else int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} 的參數 {key} 必須是數字")
+        limit = INDICATOR_CONFIG['max_num_std'] if key == 'num_std' else INDICATOR_CONFIG['max_window']
+        if not 0 < value <= limit:
+            raise ValueError(f"{name} 的參數 {key} 必須介於 0 與 {limit} 之間")
+        normalized[key] = value
+    if name == 'macd' and normalized['fast'] >= normalized['slow']:
+        raise ValueError("macd 的 fast 必須小於 slow")
+    return normalized
+
+
+def parse_indicator_spec(text):
+    """
+    解析指標字串，格式為 名稱[:參數1[:參數2...]]，參數依定義順序
+    例如 'sma:60'、'macd:8:21:5'、'bollinger:20:2.5'
+    """
+    name, *values = text.strip().lower().split(':')
+    spec = INDICATORS.get(name)
+    if spec is None:
+        raise ValueError(f"不支援的指標: {name}")
+    if len(values) > len(spec['params']):
+        raise ValueError(f"{name} 最多只有 {len(spec['params'])} 個參數")
+    return name, normalize_params(name, dict(zip(spec['params'], values)))
+
+
+def indicator_label(name, params):
+    """指標的識別名稱，例如 'sma_20'、'macd_12_26_9'"""
+    return '_'.join([name] + [f"{params[key]:g}" for key in INDICATORS[name]['params']])
+
+
+def indicator_title(name, params):
+    """指標的顯示名稱，例如 'SMA 20'、'MACD 12/26/9'"""
+    return f"{INDICATOR_NAMES[name]} {'/'.join(f'{params[key]:g}' for key in INDICATORS[name]['params'])}"
+
+
+def compute(name, columns, **params):
+    """
+    計算指標
+    :param columns: {欄位: 陣列}，1-D 或 2-D（每列一檔股票）
+    :return: {輸出名稱: 陣列}，形狀與輸入相同
+    """
+    spec = INDICATORS[name]
+    params = normalize_params(name, params)
+    result = spec['func'](*(columns[column] for column in spec['inputs']), **params)
+    if not isinstance(result, tuple):
+        result = (result,)
+    return dict(zip(spec['outputs'], result))
+
+
+def _cache_key(stock_code, name, params, last_date):
+    return (stock_code, name, tuple(params[key] for key in INDICATORS[name]['params']), last_date)
+
+
+def _price_columns(history, columns):
+    """history 欄位轉為 float64（成交量的缺值 -1 由 volume_ma 處理）"""
+    return {column: np.asarray(history[column], dtype=np.float64) for column in columns}
+
+
+def get_indicators(stock_code, indicators=None, start=None, end=None):
+    """
+    計算單檔股票的指標（只讀取本地歷史資料，不發出網路請求）
+    一律以完整歷史計算，再切出 start–end 的區間，區間開頭的數值不受暖身期影響
+    :param indicators: [(指標名稱, 參數), ...]，預設為 INDICATOR_CONFIG['defaults']
+    :return: {'dates': 日期陣列, 'indicators': {識別名稱: {'name', 'params', 'title', 'values': {輸出名稱: 陣列}}}}；
+             沒有本地歷史資料時回傳 None
+    """
+    history = get_history(stock_code)
+    dates = history['date']
+    if not len(dates):
+        return None
+
+    last_date = int(dates[-1])
+    start_key, end_key = _date_key(start), _date_key(end)
+    lo = int(np.searchsorted(dates, start_key, side='left')) if start_key else 0
+    hi = int(np.searchsorted(dates, end_key, side='right')) if end_key else len(dates)
+
+    results = {}
+    for name, params in indicators or INDICATOR_CONFIG['defaults']:
+        params = normalize_params(name, params)
+        key = _cache_key(stock_code, name, params, last_date)
+        outputs = _cache.get(key)
+        if outputs is None:
+            outputs = compute(name, _price_columns(history, INDICATORS[name]['inputs']), **params)
+            _cache.set(key, outputs)
+        results[indicator_label(name, params)] = {
+            'name': name,
+            'params': params,
+            'title': indicator_title(name, params),
+            'values': {output: values[lo:hi] for output, values in outputs.items()},
+        }
+
+    return {'dates': dates[lo:hi], 'indicators': results}
+
+
+def get_indicator_summary(stock_code, indicators=None):
+    """
+    各指標最新一根日線的數值（個股頁面顯示用）
+    :return: {'date': YYYYMMDD, 'rows': [{'label', 'title', 'name', 'values': [(輸出名稱, 數值)]}]}；無資料時回傳 None
+    """
+    result = get_indicators(stock_code, indicators)
+    if result is None:
+        return None
+
+    rows = []
+    for label, indicator in result['indicators'].items():
+        values = []
+        for output, series in indicator['values'].items():
+            value = float(series[-1])
+            values.append((OUTPUT_NAMES.get(output, ''), value if np.isfinite(value) else None))
+        rows.append({'label': label, 'title': indicator['title'], 'name': indicator['name'], 'values': values})
+    return {'date': int(result['dates'][-1]), 'rows': rows}
+
+
+def compute_many(stock_codes, name, **params):
+    """
+    一次計算多檔股票的同一指標
+    各股票的日線靠右對齊：最後一欄是各自最新的交易日，較短的序列左側補 NaN，
+    因此每列的計算結果與單獨計算該股票相同；已快取的股票不重新計算。
+    :return: {'codes': 有資料的代碼, 'dates': 2-D 日期陣列（補 0）, 'values': {輸出名稱: 2-D 陣列}}
+    """
+    params = normalize_params(name, params)
+    spec = INDICATORS[name]
+
+    histories = {}
+    for stock_code in stock_codes:
+        history = get_history(stock_code)
+        if len(history['date']):
+            histories[stock_code] = history
+    codes = list(histories)
+    width = max((len(history['date']) for history in histories.values()), default=0)
+
+    dates = np.zeros((len(codes), width), dtype=np.int32)
+    for row, stock_code in enumerate(codes):
+        history_dates = histories[stock_code]['date']
+        dates[row, width - len(history_dates):] = history_dates
+
+    # 找出未快取的股票，組成 2-D 陣列一次計算
+    cached = {}
+    missing = []
+    for stock_code in codes:
+        key = _cache_key(stock_code, name, params, int(histories[stock_code]['date'][-1]))
+        outputs = _cache.get(key)
+        if outputs is None:
+            missing.append(stock_code)
+        else:
+            cached[stock_code] = outputs
+
+    if missing:
+        missing_width = max(len(histories[stock_code]['date']) for stock_code in missing)
+        matrices = {}
+        for column in spec['inputs']:
+            matrix = np.full((len(missing), missing_width), np.nan)
+            for row, stock_code in enumerate(missing):
+                values = histories[stock_code][column]
+                matrix[row, missing_width - len(values):] = values
+            matrices[column] = matrix
+
+        computed = compute(name, matrices, **params)
+        for row, stock_code in enumerate(missing):
+            length = len(histories[stock_code]['date'])
+            outputs = {output: values[row, missing_width - length:].copy() for output, values in computed.items()}
+            _cache.set(_cache_key(stock_code, name, params, int(histories[stock_code]['date'][-1])), outputs)
+            cached[stock_code] = outputs
+
+    values = {output: np.full((len(codes), width), np.nan) for output in spec['outputs']}
+    for row, stock_code in enumerate(codes):
+        for output, series in cached[stock_code].items():
+            values[output][row, width - len(series):] = series
+
+    return {'codes': codes, 'dates': dates, 'values': values}
+
+
+def get_cache_stats():
+    """指標快取統計"""
+    return _cache.stats()
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    code = sys.argv[1] if len(sys.argv) > 1 else '2330'
+    started = time.perf_counter()
+    summary = get_indicator_summary(code)
+    elapsed = (time.perf_counter() - started) * 1000
+    if summary is None:
+        print(f"⚠️ {code} 沒有本地歷史資料，請先執行 python -m utils.history {code}")
+    else:
+        print(f"📐 {code} 技術指標（{summary['date']}，計算 {elapsed:.1f} ms）")
+        for row in summary['rows']:
+            text = ' '.join(f"{label}{value:.2f}" if value is not None else f"{label}N/A"
+                            for label, value in row['values'])
+            print(f"  {row['title']:<16} {text}")
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+盤中走勢暫存
+證交所即時報價 (mis) 每次回應的成交價、累積成交量與報價時間，依股票記錄在固定大小的環狀緩衝區；
+任何查詢或背景輪詢取得的報價都會寫入，供走勢小圖 (sparkline) 使用。
+
+每檔股票的緩衝區在第一筆資料時一次配置（NumPy 定長陣列），寫入只是覆寫下一格，為 O(1)；
+股票數量超過上限時淘汰最久未更新者，因此記憶體用量固定有上限：
+    max_symbols × capacity × 20 bytes（預設約 30 MB）
+資料只存在目前行程的記憶體中，新的交易日開始時清空。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+import numpy as np
+from .market_calendar import TAIPEI_TZ
+from .quote import parse_number, parse_int
+
+# 盤中走勢設定
+INTRADAY_CONFIG = {
+    'capacity': 600,  # 每檔股票保留的筆數（盤中 270 分鐘、每 30 秒一筆）
+    'min_interval': 30,  # 同一檔股票兩筆紀錄的最短間隔秒數（較密的報價只更新最後一筆）
+    'max_symbols': 2500,  # 同時保留的股票數量上限（涵蓋所有上市櫃股票）
+    'sparkline_points': 120,  # API 預設回傳的點數
+}
+
+
+class TickRing:
+    """單一股票的環狀緩衝區（報價時間、成交價、累積成交量）"""
+
+    __slots__ = ('trade_date', 'times', 'prices', 'volumes', 'head', 'size', 'slot_started')
+
+    def __init__(self, trade_date, capacity):
+        self.trade_date = trade_date  # YYYYMMDD
+        self.times = np.zeros(capacity, dtype=np.int64)  # 報價時間（epoch 毫秒）
+        self.prices = np.zeros(capacity, dtype=np.float64)
+        self.volumes = np.zeros(capacity, dtype=np.int32)  # 累積成交量（張）
+        self.head = 0  # 下一筆寫入的位置
+        self.size = 0
+        self.slot_started = 0  # 最後一格第一次寫入的報價時間
+
+    @property
+    def last_time(self):
+        return int(self.times[self.head - 1]) if self.size else 0
+
+    def append(self, quote_time, price, volume, min_interval_ms):
+        """寫入一筆報價；與上一筆間隔太短時覆寫上一筆，時間未前進時忽略"""
+        last_time = self.last_time
+        if self.size and quote_time <= last_time:
+            return False
+        if self.size and quote_time - self.slot_started < min_interval_ms:
+            index = self.head - 1
+        else:
+            index = self.head
+            self.head = (self.head + 1) % len(self.times)
+            self.size = min(self.size + 1, len(self.times))
+            self.slot_started = quote_time
+        self.times[index] = quote_time
+        self.prices[index] = price
+        self.volumes[index] = volume
+        return True
+
+    def snapshot(self):
+        """依時間順序複製出目前的資料"""
+        if self.size < len(self.times):
+            order = slice(0, self.size)
+            return self.times[order].copy(), self.prices[order].copy(), self.volumes[order].copy()
+        return (np.concatenate([self.times[self.head:], self.times[:self.head]]),
+                np.concatenate([self.prices[self.head:], self.prices[:self.head]]),
+                np.concatenate([self.volumes[self.head:], self.volumes[:self.head]]))
+
+
+_rings = OrderedDict()  # 股票代碼 -> TickRing（依最近更新排序）
+_lock = threading.Lock()
+_stats = {'ticks': 0, 'evictions': 0}
+
+
+def _mis_quote_time(stock_data):
+    """mis 報價時間（epoch 毫秒）：優先使用 tlong，其次為日期 d 與時間 t"""
+    tlong = parse_int(stock_data.get('tlong'))
+    if tlong:
+        return tlong
+    try:
+        quote_time = datetime.strptime(f"{stock_data['d']} {stock_data['t']}", '%Y%m%d %H:%M:%S')
+        return int(quote_time.replace(tzinfo=TAIPEI_TZ).timestamp() * 1000)
+    except (KeyError, ValueError):
+        return int(time.time() * 1000)
+
+
+def record_tick(stock_code, quote_time, price, volume):
+    """
+    記錄一筆盤中報價
+    :param quote_time: 報價時間（epoch 毫秒）
+    :param volume: 累積成交量（張），未知時為 0
+    """
+    if not price or price <= 0:
+        return False
+
+    trade_date = int(datetime.fromtimestamp(quote_time / 1000, TAIPEI_TZ).strftime('%Y%m%d'))
+    with _lock:
+        ring = _rings.get(stock_code)
+        if ring is None or ring.trade_date != trade_date:
+            if ring is not None and trade_date < ring.trade_date:
+                return False
+            ring = TickRing(trade_date, INTRADAY_CONFIG['capacity'])
+            _rings[stock_code] = ring
+            while len(_rings) > INTRADAY_CONFIG['max_symbols']:
+                _rings.popitem(last=False)
+                _stats['evictions'] += 1
+        _rings.move_to_end(stock_code)
+        recorded = ring.append(quote_time, price, volume or 0, INTRADAY_CONFIG['min_interval'] * 1000)
+        if recorded:
+            _stats['ticks'] += 1
+        return recorded
+
+
+def record_mis(stock_code, stock_data):
+    """記錄 mis msgArray 中的單筆資料（尚無成交價時略過）"""
+    return record_tick(stock_code, _mis_quote_time(stock_data),
+                       parse_number(stock_data.get('z')), parse_int(stock_data.get('v')))
+
+
+def get_ticks(stock_code, points=None):
+    """
+    取得股票當日的盤中走勢
+    :param points: 最多回傳的點數（平均取樣，保留第一與最後一筆），None 表示全部
+    :return: {'trade_date', 'times', 'prices', 'volumes'}，沒有資料時回傳 None
+    """
+    with _lock:
+        ring = _rings.get(stock_code)
+        if ring is None or not ring.size:
+            return None
+        trade_date = ring.trade_date
+        times, prices, volumes = ring.snapshot()
+
+    if points and len(times) > points:
+        index = np.linspace(0, len(times) - 1, points).round().astype(np.int64)
+        times, prices, volumes = times[index], prices[index], volumes[index]
+    return {'trade_date': trade_date, 'times': times, 'prices': prices, 'volumes': volumes}
+
+
+def get_intraday_stats():
+    """盤中走勢暫存統計"""
+    with _lock:
+        symbols = len(_rings)
+        stored = sum(ring.size for ring in _rings.values())
+    bytes_per_symbol = INTRADAY_CONFIG['capacity'] * (8 + 8 + 4)
+    return {
+        'symbols': symbols,
+        'stored_ticks': stored,
+        'ticks_recorded': _stats['ticks'],
+        'evictions': _stats['evictions'],
+        'memory_bytes': symbols * bytes_per_symbol,
+        'memory_limit_bytes': INTRADAY_CONFIG['max_symbols'] * bytes_per_symbol,
+    }
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+台股交易行事曆
+依台北時間 (UTC+8) 判斷交易日與盤勢階段：
+試撮 (08:30–09:00)、盤中 (09:00–13:25)、收盤集合競價 (13:25–13:30)、
+盤後定價交易 (14:00–14:30) 與休市。休市日內建 2025、2026 年證交所公告，
+可用 cache/market_holidays.json 覆寫或補充其他年度；查詢到沒有休市日資料的年度時
+（國定假日會被當成交易日）每個年度提示一次，見 has_holiday_schedule。
+"""
+
+import os
+import json
+import threading
+from datetime import datetime, date, time as dt_time, timedelta, timezone
+
+TAIPEI_TZ = timezone(timedelta(hours=8))
+
+HOLIDAYS_FILE = os.path.join('cache', 'market_holidays.json')
+
+# 盤勢時間設定（台北時間）
+CALENDAR_CONFIG = {
+    'pre_open': dt_time(8, 30),  # 開始試撮
+    'open': dt_time(9, 0),  # 開盤
+    'closing_auction': dt_time(13, 25),  # 收盤前集合競價
+    'close': dt_time(13, 30),  # 收盤
+    'after_hours_open': dt_time(14, 0),  # 盤後定價交易開始
+    'after_hours_close': dt_time(14, 30),  # 盤後定價交易結束
+}
+
+# 證交所公告的休市日（不含週末）
+BUILTIN_HOLIDAYS = {
+    2025: [
+        '2025-01-01',  # 中華民國開國紀念日
+        '2025-01-23', '2025-01-24',  # 農曆春節前市場無交易，僅辦理結算交割
+        '2025-01-27', '2025-01-28', '2025-01-29', '2025-01-30', '2025-01-31',  # 農曆春節
+        '2025-02-28',  # 和平紀念日
+        '2025-04-03', '2025-04-04',  # 兒童節及民族掃墓節
+        '2025-05-01',  # 勞動節
+        '2025-05-30',  # 端午節（補假）
+        '2025-09-29',  # 教師節（補假）
+        '2025-10-06',  # 中秋節
+        '2025-10-10',  # 國慶日
+        '2025-10-24',  # 臺灣光復暨金門古寧頭大捷紀念日
+        '2025-12-25',  # 行憲紀念日
+    ],
+    2026: [
+        '2026-01-01',  # 中華民國開國紀念日
+        '2026-02-12', '2026-02-13',  # 農曆春節前市場無交易，僅辦理結算交割
+        '2026-02-16', '2026-02-17', '2026-02-18', '2026-02-19', '2026-02-20',  # 農曆春節
+        '2026-02-27',  # 和平紀念日（補假）
+        '2026-04-03', '2026-04-06',  # 兒童節及民族掃墓節（補假）
+        '2026-05-01',  # 勞動節
+        '2026-06-19',  # 端午節
+        '2026-09-25',  # 中秋節
+        '2026-09-28',  # 教師節
+        '2026-10-09',  # 國慶日（補假）
+        '2026-10-26',  # 臺灣光復暨金門古寧頭大捷紀念日（補假）
+        '2026-12-25',  # 行憲紀念日
+    ],
+}
+
+# 盤勢階段
+PRE_OPEN = 'pre_open'
+OPEN = 'open'
+CLOSING_AUCTION = 'closing_auction'
+AFTER_HOURS = 'after_hours'
+CLOSED = 'closed'
+
+_holidays = None
+_holiday_years = frozenset()  # 有休市日資料的年度（內建或覆寫檔）
+_warned_years = set()
+_holidays_lock = threading.Lock()
+
+
+def _load_holidays():
+    """
+    載入休市日：內建清單，再以覆寫檔中列出的年度取代
+    :return: (休市日集合, 有資料的年度集合)
+    """
+    holidays_by_year = {year: set(days) for year, days in BUILTIN_HOLIDAYS.items()}
+
+    if os.path.exists(HOLIDAYS_FILE):
+        try:
+            with open(HOLIDAYS_FILE, 'r', encoding='utf-8') as f:
+                overrides = json.load(f)
+            for year, days in overrides.items():
+                holidays_by_year[int(year)] = set(days)
+            print(f"📅 已載入休市日覆寫檔: {', '.join(str(year) for year in overrides)}")
+        except Exception as e:
+            print(f"❌ 讀取休市日覆寫檔失敗: {e}")
+
+    holidays = set()
+    for days in holidays_by_year.values():
+        holidays.update(date.fromisoformat(day) for day in days)
+    return holidays, frozenset(year for year, days in holidays_by_year.items() if days)
+
+
+def _get_holidays():
+    """取得休市日集合（第一次呼叫時載入）"""
+    global _holidays, _holiday_years
+
+    if _holidays is None:
+        with _holidays_lock:
+            if _holidays is None:
+                _holidays, _holiday_years = _load_holidays()
+    return _holidays
+
+
+def reload_holidays():
+    """重新載入休市日（修改覆寫檔後呼叫）"""
+    global _holidays, _holiday_years
+
+    with _holidays_lock:
+        _holidays, _holiday_years = _load_holidays()
+        _warned_years.clear()
+
+
+def has_holiday_schedule(year):
+    """該年度是否有休市日資料（內建或覆寫檔）"""
+    _get_holidays()
+    return year in _holiday_years
+
+
+def _check_holiday_schedule(year):
+    """沒有休市日資料的年度提示一次（該年度的國定假日會被當成交易日）"""
+    if year in _holiday_years or year in _warned_years:
+        return
+    with _holidays_lock:
+        if year in _warned_years:
+            return
+        _warned_years.add(year)
+    known = '、'.join(str(known_year) for known_year in sorted(_holiday_years)) or '無'
+    print(f"⚠️ 沒有 {year} 年的休市日資料（目前涵蓋：{known}），國定假日將被視為交易日；"
+          f"請依證交所公告將 {year} 年的休市日加入 {HOLIDAYS_FILE}")
+
+
+def now_taipei():
+    """目前的台北時間"""
+    return datetime.now(TAIPEI_TZ)
+
+
+def _to_taipei(now=None):
+    """將時間轉換為台北時間（未指定時區者視為台北時間）"""
+    if now is None:
+        return now_taipei()
+    if now.tzinfo is None:
+        return now.replace(tzinfo=TAIPEI_TZ)
+    return now.astimezone(TAIPEI_TZ)
+
+
+def is_trading_day(day=None):
+    """是否為交易日（非週末且非休市日）"""
+    if day is None:
+        day = now_taipei().date()
+    elif isinstance(day, datetime):
+        day = _to_taipei(day).date()
+    holidays = _get_holidays()
+    _check_holiday_schedule(day.year)
+    return day.weekday() < 5 and day not in holidays
+
+
+def next_trading_day(day=None):
+    """下一個交易日（不含當天）"""
+    if day is None:
+        day = now_taipei().date()
+    elif isinstance(day, datetime):
+        day = _to_taipei(day).date()
+    day += timedelta(days=1)
+    while not is_trading_day(day):
+        day += timedelta(days=1)
+    return day
+
+
+def previous_trading_day(day=None):
+    """上一個交易日（不含當天）"""
+    if day is None:
+        day = now_taipei().date()
+    elif isinstance(day, datetime):
+        day = _to_taipei(day).date()
+    day -= timedelta(days=1)
+    while not is_trading_day(day):
+        day -= timedelta(days=1)
+    return day
+
+
+def last_trading_close(now=None):
+    """最近一次已完成交易日的結束時間（盤後定價交易結束），之後當日行情才會定案"""
+    now = _to_taipei(now)
+    close_time = CALENDAR_CONFIG['after_hours_close']
+    if is_trading_day(now.date()) and now.time() >= close_time:
+        return datetime.combine(now.date(), close_time, TAIPEI_TZ)
+    return datetime.combine(previous_trading_day(now.date()), close_time, TAIPEI_TZ)
+
+
+def market_phase(now=None):
+    """目前的盤勢階段"""
+    now = _to_taipei(now)
+    if not is_trading_day(now.date()):
+        return CLOSED
+
+    current = now.time()
+    if CALENDAR_CONFIG['pre_open'] <= current < CALENDAR_CONFIG['open']:
+        return PRE_OPEN
+    if CALENDAR_CONFIG['open'] <= current < CALENDAR_CONFIG['closing_auction']:
+        return OPEN
+    if CALENDAR_CONFIG['closing_auction'] <= current < CALENDAR_CONFIG['close']:
+        return CLOSING_AUCTION
+    if CALENDAR_CONFIG['after_hours_open'] <= current < CALENDAR_CONFIG['after_hours_close']:
+        return AFTER_HOURS
+    return CLOSED
+
+
+def is_market_open(now=None):
+    """報價是否可能變動（試撮、盤中、收盤集合競價）"""
+    return market_phase(now) in (PRE_OPEN, OPEN, CLOSING_AUCTION)
+
+
+def is_trading_session(now=None):
+    """是否為正式交易時段（09:00–13:30）"""
+    return market_phase(now) in (OPEN, CLOSING_AUCTION)
+
+
+def next_phase_change(now=None):
+    """下一次盤勢階段變化的時間"""
+    now = _to_taipei(now)
+    if is_trading_day(now.date()):
+        for key in ('pre_open', 'open', 'closing_auction', 'close', 'after_hours_open', 'after_hours_close'):
+            boundary = datetime.combine(now.date(), CALENDAR_CONFIG[key], TAIPEI_TZ)
+            if boundary > now:
+                return boundary
+    return next_session_start(now)
+
+
+def next_session_start(now=None):
+    """下一次開始試撮的時間（報價再次變動的時間點）"""
+    now = _to_taipei(now)
+    if is_trading_day(now.date()):
+        today_start = datetime.combine(now.date(), CALENDAR_CONFIG['pre_open'], TAIPEI_TZ)
+        if now < today_start:
+            return today_start
+    return datetime.combine(next_trading_day(now.date()), CALENDAR_CONFIG['pre_open'], TAIPEI_TZ)
+
+
+def get_market_status(now=None):
+    """取得目前的盤勢狀態摘要"""
+    now = _to_taipei(now)
+    return {
+        'phase': market_phase(now),
+        'is_trading_day': is_trading_day(now.date()),
+        'is_open': is_market_open(now),
+        'next_change': next_phase_change(now).isoformat(),
+        'next_session': next_session_start(now).isoformat(),
+        'holiday_schedule': has_holiday_schedule(now.year),  # False 時休市日判斷不可靠
+    }
+
+
+if __name__ == "__main__":
+    status = get_market_status()
+    print(f"🕘 台北時間: {now_taipei():%Y-%m-%d %H:%M:%S}")
+    print(f"📊 盤勢階段: {status['phase']}")
+    print(f"⏭️ 下次變化: {status['next_change']}")
+    print(f"🔔 下次開盤: {status['next_session']}")
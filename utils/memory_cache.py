@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+行程內記憶體快取
+有容量上限的 TTL + LRU 快取，放在檔案快取前面；
+熱門資料直接從記憶體讀取，不需要任何檔案系統操作。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """具有存活時間與 LRU 淘汰機制的記憶體快取"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (寫入時間, 到期時間, 資料)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_entry(self, key):
+        """取得 (寫入時間, 資料)，不存在或已過期時回傳 None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            stored_at, expires_at, data = entry
+            if time.time() >= expires_at:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return stored_at, data
+
+    def get(self, key):
+        """取得資料，不存在或已過期時回傳 None"""
+        entry = self.get_entry(key)
+        return entry[1] if entry else None
+
+    def set(self, key, data, stored_at=None, ttl=None):
+        """寫入資料；stored_at 為資料實際取得的時間（預設為現在）"""
+        stored_at = stored_at or time.time()
+        expires_at = stored_at + (self.ttl if ttl is None else ttl)
+        if expires_at <= time.time():
+            return
+
+        with self._lock:
+            self._data[key] = (stored_at, expires_at, data)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """移除資料"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """清空快取"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """取得命中、未命中與淘汰統計"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+            }
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+熱門股票背景輪詢
+定期取得「熱門清單」（熱門股票、會員自選股、近期搜尋）的報價並寫入快取，
+讓使用者請求熱門股票時直接命中快取，不必等待上游。
+輪詢頻率依盤勢調整：只更新快取即將到期的代碼，休市時快取會保留到下次開盤，
+因此自然停止查詢；上游請求數量另以權杖桶 (token bucket) 限制。
+
+可在網站行程內啟動（設定環境變數 QUOTE_POLLER=1），或獨立執行：
+    python -m utils.poller
+
+同一台主機同時只有一個行程實際輪詢：輪詢執行緒以鎖檔選出主控行程並持有到停止為止，
+其他 worker 行程的輪詢執行緒待命，主控行程結束後由其中一個接手，因此總上游請求量不隨 worker 數增加。
+"""
+
+import os
+import threading
+import time
+from .twse import CONFIG, get_cache_entries, get_stock_quotes, get_market_summary, clean_stock_code, reject_stock_code
+from .market_calendar import now_taipei, is_market_open, next_phase_change
+from .snapshot import ensure_snapshot, snapshot_is_current
+from .symbols import ISIN_SOURCES, ensure_symbol_master, symbol_master_due
+from .singleflight import FileLock
+
+# 輪詢設定
+POLLER_CONFIG = {
+    'enabled': os.environ.get('QUOTE_POLLER') == '1',  # 是否隨網站啟動背景輪詢
+    'open_interval': 5,  # 盤中檢查快取的間隔秒數
+    'idle_interval': 300,  # 非盤中檢查的最長間隔秒數（清單可能新增代碼）
+    'refresh_ahead': 8,  # 快取剩餘秒數低於此值時提前更新
+    'hot_set_interval': 60,  # 重新讀取熱門清單的間隔秒數
+    'max_symbols': 500,  # 熱門清單的代碼數量上限
+    'requests_per_minute': 60,  # 上游請求預算（每分鐘）
+    'burst': 20,  # 預算可累積的請求數上限
+    'include_market': True,  # 一併更新大盤摘要
+    'ingest_snapshot': True,  # 收盤後下載一次全市場收盤行情（填滿所有上市股票的快取）
+    'refresh_symbols': True,  # 非交易時段每日更新一次股票主檔（ISIN 公告）
+    'standby_interval': 30,  # 其他行程持有輪詢主控權時，重新嘗試接手的間隔秒數
+}
+
+
+def due_cache_keys(cache_keys, refresh_ahead=None):
+    """快取不存在或剩餘秒數低於 refresh_ahead（預設 POLLER_CONFIG['refresh_ahead']）的鍵值"""
+    entries = get_cache_entries(cache_keys)
+    deadline = time.time() + (POLLER_CONFIG['refresh_ahead'] if refresh_ahead is None else refresh_ahead)
+    return {key for key in cache_keys if key not in entries or entries[key][2] < deadline}
+
+
+class TokenBucket:
+    """權杖桶：以固定速率補充權杖，每次上游請求消耗一個"""
+
+    def __init__(self, rate_per_second, capacity):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens=1):
+        """取得權杖，不足時回傳 False"""
+        with self._lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def available(self):
+        """目前可用的權杖數"""
+        with self._lock:
+            self._refill()
+            return self.tokens
+
+
+class QuotePoller(threading.Thread):
+    """熱門股票背景輪詢執行緒"""
+
+    def __init__(self, hot_set_provider):
+        """
+        :param hot_set_provider: 回傳熱門股票代碼列表的無參數函式
+        """
+        super().__init__(name='quote-poller', daemon=True)
+        self.hot_set_provider = hot_set_provider
+        self.budget = TokenBucket(POLLER_CONFIG['requests_per_minute'] / 60, POLLER_CONFIG['burst'])
+        self._leader_lock = FileLock('quote_poller', blocking=False)
+        self.is_leader = False
+        self._stop_event = threading.Event()
+        self._hot_set = []
+        self._hot_set_loaded = 0.0
+        self.stats = {
+            'cycles': 0,
+            'batches': 0,
+            'symbols_refreshed': 0,
+            'budget_skips': 0,
+            'errors': 0,
+            'hot_set_size': 0,
+            'last_cycle': None,
+            'last_error': None,
+        }
+
+    def stop(self):
+        """停止輪詢"""
+        self._stop_event.set()
+
+    def get_hot_set(self):
+        """取得熱門清單（依 hot_set_interval 重新讀取）"""
+        if time.monotonic() - self._hot_set_loaded >= POLLER_CONFIG['hot_set_interval']:
+            try:
+                codes = []
+                for stock_code in self.hot_set_provider():
+                    code = clean_stock_code(stock_code)
+                    # 略過不在股票主檔中或已下市的代碼
+                    if code and code not in codes and not reject_stock_code(code, count=False):
+                        codes.append(code)
+                self._hot_set = codes[:POLLER_CONFIG['max_symbols']]
+                self.stats['hot_set_size'] = len(self._hot_set)
+            except Exception as e:
+                print(f"❌ 讀取熱門清單失敗: {e}")
+            self._hot_set_loaded = time.monotonic()
+        return self._hot_set
+
+    def poll_once(self):
+        """執行一輪更新，回傳本輪更新的代碼數"""
+        self.stats['cycles'] += 1
+        self.stats['last_cycle'] = now_taipei().isoformat()
+
+        if POLLER_CONFIG['include_market'] and due_cache_keys(['market_summary']):
+            if self.budget.try_acquire():
+                get_market_summary(refresh=True)
+            else:
+                self.stats['budget_skips'] += 1
+
+        if POLLER_CONFIG['ingest_snapshot'] and not is_market_open() and not snapshot_is_current():
+            if self.budget.try_acquire():
+                ensure_snapshot()
+            else:
+                self.stats['budget_skips'] += 1
+
+        if POLLER_CONFIG['refresh_symbols'] and not is_market_open() and symbol_master_due():
+            if self.budget.try_acquire(len(ISIN_SOURCES)):
+                ensure_symbol_master()
+            else:
+                self.stats['budget_skips'] += 1
+
+        hot_set = self.get_hot_set()
+        due_keys = due_cache_keys([f"stock_basic_{code}" for code in hot_set])
+        due = [code for code in hot_set if f"stock_basic_{code}" in due_keys]
+        refreshed = 0
+        batch_size = CONFIG['batch_size']
+        for start in range(0, len(due), batch_size):
+            if self._stop_event.is_set():
+                break
+            if not self.budget.try_acquire():
+                # 預算用完，剩下的代碼留到下一輪
+                self.stats['budget_skips'] += 1
+                break
+            batch = due[start:start + batch_size]
+            get_stock_quotes(batch, fallback=False, refresh=True)
+            self.stats['batches'] += 1
+            refreshed += len(batch)
+
+        self.stats['symbols_refreshed'] += refreshed
+        if refreshed:
+            print(f"🔥 背景更新 {refreshed}/{len(due)} 檔熱門股票報價")
+        return refreshed
+
+    def next_delay(self):
+        """依盤勢決定下次檢查前等待的秒數"""
+        now = now_taipei()
+        if is_market_open(now):
+            return POLLER_CONFIG['open_interval']
+        seconds_to_change = (next_phase_change(now) - now).total_seconds()
+        return max(1.0, min(seconds_to_change, POLLER_CONFIG['idle_interval']))
+
+    def acquire_leadership(self):
+        """嘗試取得本機的輪詢主控權（已持有時直接回傳 True）"""
+        if not self.is_leader and self._leader_lock.acquire():
+            self.is_leader = True
+            print(f"🔥 熱門股票背景輪詢啟動（每分鐘上限 {POLLER_CONFIG['requests_per_minute']} 次上游請求）")
+        return self.is_leader
+
+    def run(self):
+        if not self.acquire_leadership():
+            print("💤 其他行程已在背景輪詢，本行程待命")
+        try:
+            while not self._stop_event.is_set():
+                if not self.acquire_leadership():
+                    self._stop_event.wait(POLLER_CONFIG['standby_interval'])
+                    continue
+                try:
+                    self.poll_once()
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    self.stats['last_error'] = str(e)
+                    print(f"❌ 背景輪詢發生異常: {e}")
+                self._stop_event.wait(self.next_delay())
+        finally:
+            self._leader_lock.release()
+            self.is_leader = False
+        print("🛑 熱門股票背景輪詢已停止")
+
+
+_poller = None
+_poller_lock = threading.Lock()
+
+
+def start_poller(hot_set_provider):
+    """啟動背景輪詢（同一行程只會啟動一次）"""
+    global _poller
+
+    with _poller_lock:
+        if _poller is None or not _poller.is_alive():
+            _poller = QuotePoller(hot_set_provider)
+            _poller.start()
+    return _poller
+
+
+def stop_poller():
+    """停止背景輪詢"""
+    global _poller
+
+    with _poller_lock:
+        if _poller is not None:
+            _poller.stop()
+            _poller = None
+
+
+def get_poller_stats():
+    """取得背景輪詢統計，未啟動時回傳 None"""
+    poller = _poller
+    if poller is None:
+        return None
+    return dict(poller.stats,
+                running=poller.is_alive(),
+                leader=poller.is_leader,
+                budget_available=round(poller.budget.available(), 1))
+
+
+if __name__ == "__main__":
+    # 獨立執行時從網站取得熱門清單（需在專案根目錄執行）；
+    # 使用 app 匯入的同一個模組，QUOTE_POLLER=1 時不會在本行程啟動第二個輪詢執行緒
+    from app import get_hot_symbols
+    from utils.poller import start_poller, stop_poller
+
+    poller = start_poller(get_hot_symbols)
+    try:
+        while poller.is_alive():
+            poller.join(1)
+    except KeyboardInterrupt:
+        stop_poller()
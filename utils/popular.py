@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+熱門股票與大盤摘要的預先計算快照
+首頁與 /api/popular 需要的資料（大盤摘要 + 熱門股票報價）由背景執行緒定期更新成一份快照，
+請求只讀取記憶體中的快照，回應時間固定，不受上游速度影響。
+
+熱門股票清單只在 POPULAR_STOCKS 設定一次，可用環境變數覆寫（名稱由股票主檔查詢）：
+    POPULAR_STOCKS=2330,2317,0050 python app.py
+"""
+
+import os
+import threading
+import time
+from .twse import get_stock_quotes, get_market_summary, get_stock_name
+from .quote import Quote
+from .market_calendar import is_market_open
+
+# 熱門股票（首頁、/api/popular 與背景輪詢共用）
+POPULAR_STOCKS = [
+    {'code': '2330', 'name': '台積電'},
+    {'code': '0050', 'name': '元大台灣50'},
+    {'code': '0056', 'name': '元大高股息'},
+    {'code': '006208', 'name': '富邦台50'},
+    {'code': '00878', 'name': '國泰永續高股息'},
+    {'code': '00919', 'name': '群益台灣精選高息'},
+    {'code': '2317', 'name': '鴻海'},
+    {'code': '2454', 'name': '聯發科'},
+    {'code': '2882', 'name': '國泰金'},
+    {'code': '2412', 'name': '中華電'},
+]
+
+if os.environ.get('POPULAR_STOCKS'):
+    POPULAR_STOCKS = [{'code': code.strip(), 'name': None}
+                      for code in os.environ['POPULAR_STOCKS'].split(',') if code.strip()]
+
+# 快照更新設定
+POPULAR_CONFIG = {
+    'open_interval': 5,  # 盤中更新間隔秒數
+    'idle_interval': 60,  # 非盤中更新間隔秒數
+    'initial_wait': 3,  # 第一份快照尚未完成時，請求最多等待的秒數
+}
+
+_snapshot = None
+_ready = threading.Event()
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def get_popular_codes():
+    """熱門股票代碼列表"""
+    return [stock['code'] for stock in POPULAR_STOCKS]
+
+
+def build_snapshot():
+    """取得大盤摘要與熱門股票報價（經由快取與批次查詢）組成快照"""
+    market_info = get_market_summary()
+    quotes = get_stock_quotes(get_popular_codes())
+
+    stocks = []
+    for stock in POPULAR_STOCKS:
+        stock_info = quotes.get(stock['code'])
+        entry = {'code': stock['code'], 'name': stock['name'], 'price': None, 'change': None, 'change_percent': None}
+        if isinstance(stock_info, Quote):
+            entry.update({
+                'name': stock['name'] or stock_info.name,
+                'price': stock_info.price,
+                'change': stock_info.change,
+                'change_percent': stock_info.change_percent,
+            })
+        if not entry['name']:
+            entry['name'] = get_stock_name(stock['code'])
+        stocks.append(entry)
+
+    return {'market': market_info, 'stocks': stocks, 'updated_at': time.time()}
+
+
+def refresh_snapshot():
+    """更新快照（失敗時保留上一份）"""
+    global _snapshot
+
+    try:
+        _snapshot = build_snapshot()
+        _ready.set()
+    except Exception as e:
+        print(f"❌ 更新熱門股票快照失敗: {e}")
+
+
+def _run():
+    print("🔥 熱門股票快照背景更新啟動")
+    while True:
+        refresh_snapshot()
+        time.sleep(POPULAR_CONFIG['open_interval'] if is_market_open() else POPULAR_CONFIG['idle_interval'])
+
+
+def start_refresher():
+    """啟動背景更新（同一行程只會啟動一次）"""
+    global _refresher
+
+    with _refresher_lock:
+        if _refresher is None or not _refresher.is_alive():
+            _refresher = threading.Thread(target=_run, name='popular-snapshot', daemon=True)
+            _refresher.start()
+
+
+def get_popular_snapshot():
+    """
+    取得目前的快照（第一次呼叫時啟動背景更新）
+    :return: {'market': 大盤資訊, 'stocks': [{'code', 'name', 'price', 'change', 'change_percent'}], 'updated_at'}；
+             第一份快照在 initial_wait 秒內未完成時回傳 None
+    """
+    if _snapshot is None:
+        start_refresher()
+        _ready.wait(POPULAR_CONFIG['initial_wait'])
+    return _snapshot
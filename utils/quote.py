@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+股票報價資料型別
+各資料來源的回應在取得時就解析成數值，存放於 Quote；
+只有在輸出 JSON 或模板顯示時才格式化為字串。
+舊程式碼以中文鍵值讀取的字典格式由 Quote.get / Quote.to_dict 提供相容。
+"""
+
+import time
+from datetime import datetime
+
+# 資料來源代碼與顯示名稱
+SOURCE_LABELS = {
+    'twse_mis': '證交所即時報價',
+    'yahoo': 'Yahoo Finance',
+    'twse_stock_day': '證交所 API',
+    'fugle': '替代 API',
+    'twse_snapshot': '證交所每日收盤行情',
+}
+
+# 提供盤中即時成交價的來源
+REALTIME_SOURCES = ('twse_mis', 'yahoo')
+
+
+def parse_number(value):
+    """將上游回應中的數字字串解析為 float，無法解析（如 "-"、"--"、"X0.00"）時回傳 None"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).replace(',', '').replace('%', '').strip()
+    if text.startswith('+'):
+        text = text[1:]
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def parse_int(value):
+    """將數字字串解析為 int，無法解析時回傳 None"""
+    number = parse_number(value)
+    return int(number) if number is not None else None
+
+
+def format_price(value):
+    """價格：兩位小數"""
+    return f"{value:.2f}" if value is not None else "N/A"
+
+
+def format_change(value):
+    """漲跌價差：帶正負號的兩位小數"""
+    return f"{value:+.2f}" if value is not None else "N/A"
+
+
+def format_percent(value):
+    """漲跌幅：帶正負號的百分比"""
+    return f"{value:+.2f}%" if value is not None else "N/A"
+
+
+def format_volume(value):
+    """數量與金額：千分位整數"""
+    return f"{value:,}" if value is not None else "N/A"
+
+
+# 舊格式中文鍵值 -> 由 Quote 取得格式化數值的函式（依 to_dict 的鍵值順序）；回傳 _MISSING 表示不含此鍵值
+_MISSING = object()
+
+
+def _optional(slot, formatter):
+    def field(quote):
+        value = getattr(quote, slot)
+        return formatter(value) if value is not None else _MISSING
+    return field
+
+
+_LEGACY_FIELDS = {
+    '股票代碼': lambda quote: quote.code,
+    '股票名稱': lambda quote: quote.name,
+    '即時股價': lambda quote: format_price(quote.price) if quote.is_realtime else _MISSING,
+    '收盤價': lambda quote: format_price(quote.price),
+    '開盤價': lambda quote: format_price(quote.open),
+    '最高價': lambda quote: format_price(quote.high),
+    '最低價': lambda quote: format_price(quote.low),
+    '漲跌價差': lambda quote: format_change(quote.change),
+    '漲跌幅': lambda quote: format_percent(quote.change_percent),
+    '成交量': _optional('volume', format_volume),
+    '日期': lambda quote: quote.trade_date or _MISSING,
+    '成交股數': _optional('shares', format_volume),
+    '成交金額': _optional('turnover', format_volume),
+    '成交筆數': _optional('trades', format_volume),
+    '來源': lambda quote: SOURCE_LABELS.get(quote.source, _MISSING),
+    '狀態': lambda quote: quote.status or _MISSING,
+    '資料時間': lambda quote: (datetime.fromtimestamp(quote.fetched_at).strftime('%Y-%m-%d %H:%M:%S')
+                            if quote.status else _MISSING),
+}
+
+
+class Quote:
+    """單一股票的報價（數值欄位未格式化，缺少的欄位為 None）"""
+
+    __slots__ = (
+        'code', 'name', 'price', 'open', 'high', 'low', 'prev_close',
+        'change', 'change_percent', 'volume', 'shares', 'turnover', 'trades',
+        'trade_date', 'source', 'fetched_at', 'status',
+    )
+
+    def __init__(self, code, name=None, price=None, open=None, high=None, low=None, prev_close=None,
+                 change=None, change_percent=None, volume=None, shares=None, turnover=None, trades=None,
+                 trade_date=None, source=None, fetched_at=None, status=None):
+        self.code = code
+        self.name = name or code
+        self.price = price  # 最新成交價（盤後為收盤價）
+        self.open = open
+        self.high = high
+        self.low = low
+        self.prev_close = prev_close  # 昨日收盤價
+        self.volume = volume  # 成交量（依來源為張或股）
+        self.shares = shares  # 成交股數（證交所 API）
+        self.turnover = turnover  # 成交金額
+        self.trades = trades  # 成交筆數
+        self.trade_date = trade_date  # 交易日期（證交所 API 為民國年格式）
+        self.source = source
+        self.fetched_at = fetched_at or time.time()
+        self.status = status  # 例如 '延遲資料'
+
+        # 有昨收時補算漲跌，來源直接提供的數值優先
+        if change is None and price is not None and prev_close:
+            change = price - prev_close
+        if change_percent is None and change is not None:
+            base = prev_close if prev_close else (price - change if price is not None else None)
+            if base and base > 0:
+                change_percent = change / base * 100
+        self.change = change
+        self.change_percent = change_percent
+
+    def __repr__(self):
+        return f"Quote({self.code} {self.price} {self.source})"
+
+    @property
+    def is_realtime(self):
+        """是否為盤中即時成交價"""
+        return self.source in REALTIME_SOURCES
+
+    def is_valid(self):
+        """是否有有效股價"""
+        return self.price is not None and self.price > 0
+
+    def replace(self, **changes):
+        """回傳修改部分欄位後的副本（Quote 可能被多個請求共用，不直接修改）"""
+        fields = {slot: getattr(self, slot) for slot in self.__slots__}
+        fields.update(changes)
+        return Quote(**fields)
+
+    # === 快取序列化 ===
+
+    def to_record(self):
+        """轉換為只含數值的字典（寫入快取用）"""
+        return {slot: getattr(self, slot) for slot in self.__slots__ if getattr(self, slot) is not None}
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(**record)
+
+    # === 舊字典格式相容 ===
+
+    def to_dict(self):
+        """轉換為舊格式的中文鍵值字典（數值已格式化）"""
+        stock_info = {}
+        for key, field in _LEGACY_FIELDS.items():
+            value = field(self)
+            if value is not _MISSING:
+                stock_info[key] = value
+        return stock_info
+
+    def _legacy_value(self, key):
+        """只格式化單一鍵值，不必建立整個字典"""
+        field = _LEGACY_FIELDS.get(key)
+        return field(self) if field is not None else _MISSING
+
+    def get(self, key, default=None):
+        value = self._legacy_value(key)
+        return default if value is _MISSING else value
+
+    def __getitem__(self, key):
+        value = self._legacy_value(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self._legacy_value(key) is not _MISSING
+
+
+def as_dict(stock_info):
+    """JSON 輸出用：Quote 轉為舊格式字典，其他資料（如錯誤訊息字典）原樣回傳"""
+    return stock_info.to_dict() if isinstance(stock_info, Quote) else stock_info
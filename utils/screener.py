@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+全市場選股
+以全市場收盤行情快照（snapshot.py）為母體，搭配本地歷史資料組成的價格面板（每列一檔股票，
+最近 lookback 根日線靠右對齊），所有篩選與排序都是對整個市場的陣列運算，
+不會逐檔呼叫 get_stock_basic_info。
+
+面板與衍生指標（N 日最高價、RSI）只在背景執行緒建立：尚無面板、快照更新或超過 panel_ttl 時
+排程重建（沒有快照時先下載），重建期間沿用舊面板與其快照；請求的執行緒不下載也不建立面板，
+面板尚未就緒時選股回傳 None。每次選股只是幾個布林遮罩與一次排序。
+"""
+
+import threading
+import time
+import numpy as np
+from .history import get_history
+from .indicators import rsi
+from .snapshot import load_snapshot, ensure_snapshot
+
+# 選股設定
+SCREENER_CONFIG = {
+    'lookback': 260,  # 面板保留的日線數（約一年）
+    'panel_ttl': 600,  # 面板重建間隔秒數（期間內回補的歷史資料在重建後才納入）
+    'default_limit': 50,
+    'max_limit': 200,
+}
+
+# 篩選條件：參數名稱 -> (型別, 最小值, 最大值, 說明)
+SCREENER_FILTERS = {
+    'min_change': (float, -100, 100, '最小漲跌幅 (%)'),
+    'max_change': (float, -100, 100, '最大漲跌幅 (%)'),
+    'min_volume': (int, 0, None, '最小成交量 (張)'),
+    'min_price': (float, 0, None, '最低股價'),
+    'max_price': (float, 0, None, '最高股價'),
+    'high_window': (int, 2, SCREENER_CONFIG['lookback'], 'N 日最高價的天數'),
+    'max_from_high': (float, 0, 100, '距 N 日最高價的最大跌幅 (%)'),
+    'rsi_period': (int, 2, 100, 'RSI 週期'),
+    'min_rsi': (float, 0, 100, '最小 RSI'),
+    'max_rsi': (float, 0, 100, '最大 RSI'),
+}
+
+# 排序欄位
+SORT_KEYS = ('change_percent', 'volume', 'turnover', 'price', 'from_high', 'rsi')
+
+DEFAULT_FILTERS = {'high_window': 20, 'rsi_period': 14}
+
+_panel = None  # (快照表, 建立時間, 面板)
+_panel_lock = threading.Lock()  # 背景重建期間持有
+
+
+def parse_filters(args):
+    """
+    從查詢參數解析篩選條件（空字串視為未指定）
+    :return: (篩選條件字典, 排序欄位, 是否遞增, 筆數上限)；不合法時拋出 ValueError
+    """
+    filters = dict(DEFAULT_FILTERS)
+    for key, (cast, low, high, label) in SCREENER_FILTERS.items():
+        text = str(args.get(key) or '').strip()
+        if not text:
+            continue
+        try:
+            value = cast(text)
+        except ValueError:
+            raise ValueError(f"{label}必須是數字")
+        if value < low or (high is not None and value > high):
+            raise ValueError(f"{label}必須介於 {low} 與 {high if high is not None else '∞'} 之間")
+        filters[key] = value
+
+    sort = args.get('sort') or 'change_percent'
+    if sort not in SORT_KEYS:
+        raise ValueError(f"不支援的排序欄位: {sort}")
+    ascending = args.get('order') == 'asc'
+    try:
+        limit = int(args.get('limit') or SCREENER_CONFIG['default_limit'])
+    except ValueError:
+        raise ValueError("limit 必須是整數")
+    limit = max(1, min(limit, SCREENER_CONFIG['max_limit']))
+    return filters, sort, ascending, limit
+
+
+def _build_panel(table):
+    """以快照的代碼順序組成最近 lookback 根日線的面板，並把快照當日的日線接在最後"""
+    lookback = SCREENER_CONFIG['lookback']
+    count = len(table['code'])
+    close = np.full((count, lookback), np.nan)
+    high = np.full((count, lookback), np.nan)
+    history_rows = np.zeros(count, dtype=np.int64)
+
+    for row, code in enumerate(table['code'].tolist()):
+        history = get_history(code)
+        dates = history['date']
+        if len(dates) and int(dates[-1]) >= table['date']:
+            # 歷史資料已包含快照當日（或更新），直接取最近 lookback 根
+            end = int(np.searchsorted(dates, table['date'], side='right'))
+            start = max(0, end - lookback)
+            width = end - start
+            close[row, lookback - width:] = history['close'][start:end]
+            high[row, lookback - width:] = history['high'][start:end]
+        else:
+            # 取最近 lookback - 1 根，最後一欄放快照當日
+            width = min(len(dates), lookback - 1)
+            if width:
+                close[row, lookback - 1 - width:-1] = history['close'][-width:]
+                high[row, lookback - 1 - width:-1] = history['high'][-width:]
+            close[row, -1] = table['close'][row]
+            high[row, -1] = table['high'][row]
+            width += 1
+        history_rows[row] = width
+
+    return {'close': close, 'high': high, 'rows': history_rows, 'metrics': {}}
+
+
+def _rebuild_panel(table):
+    global _panel
+
+    started = time.perf_counter()
+    panel = _build_panel(table)
+    _panel = (table, time.time(), panel)
+    print(f"🧮 選股面板已重建：{len(table['code'])} 檔，{(time.perf_counter() - started) * 1000:.0f} ms")
+    return panel
+
+
+def _refresh_panel():
+    """背景重建面板：沒有快照時先下載，再以最新快照重建"""
+    try:
+        if load_snapshot() is None:
+            ensure_snapshot()
+        table = load_snapshot()
+        if table is not None:
+            _rebuild_panel(table)
+    except Exception as e:
+        print(f"❌ 重建選股面板失敗: {e}")
+    finally:
+        _panel_lock.release()
+
+
+def schedule_panel():
+    """
+    尚無面板、快照已更新或面板超過 panel_ttl 時於背景重建（納入新回補的歷史資料），已在重建中則略過
+    :return: 是否啟動重建
+    """
+    cached = _panel
+    if cached is not None:
+        table = load_snapshot()
+        if (table is None or table['date'] == cached[0]['date']) and \
+                time.time() - cached[1] < SCREENER_CONFIG['panel_ttl']:
+            return False
+    if not _panel_lock.acquire(blocking=False):
+        return False
+    threading.Thread(target=_refresh_panel, name='screener-panel', daemon=True).start()
+    return True
+
+
+def get_panel():
+    """
+    取得已建立的面板並視需要排程背景重建
+    :return: (快照表, 面板)，面板尚未建立時回傳 None
+    """
+    schedule_panel()
+    cached = _panel
+    return (cached[0], cached[2]) if cached else None
+
+
+def _metric(panel, name, period):
+    """面板衍生指標（依名稱與週期快取在面板中）"""
+    key = (name, period)
+    values = panel['metrics'].get(key)
+    if values is None:
+        if name == 'high':
+            window = panel['high'][:, -period:]
+            values = np.max(np.where(np.isfinite(window), window, -np.inf), axis=1)
+            # 日線不足 N 根或期間內都沒有成交的股票不列入計算
+            values[(panel['rows'] < period) | ~np.isfinite(values)] = np.nan
+        else:
+            values = rsi(panel['close'], period)[:, -1]
+        panel['metrics'][key] = values
+    return values
+
+
+def screen(filters=None, sort='change_percent', ascending=False, limit=None):
+    """
+    對全市場選股
+    :param filters: 見 SCREENER_FILTERS，未指定的條件不篩選
+    :return: {'date', 'total', 'matched', 'results': [...], 'elapsed_ms'}；面板尚未就緒時回傳 None
+    """
+    started = time.perf_counter()
+    filters = dict(DEFAULT_FILTERS, **(filters or {}))
+    limit = limit or SCREENER_CONFIG['default_limit']
+
+    ready = get_panel()
+    if ready is None:
+        return None
+    table, panel = ready
+
+    price = table['close']
+    change = table['change']
+    volume = np.where(table['volume'] >= 0, table['volume'] // 1000, -1)  # 股 -> 張
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change_percent = change / (price - change) * 100
+        from_high = (1 - price / _metric(panel, 'high', filters['high_window'])) * 100
+    rsi_values = _metric(panel, 'rsi', filters['rsi_period'])
+
+    # NaN 與任何條件比較皆為 False，缺資料的股票自然被排除
+    mask = price > 0
+    with np.errstate(invalid='ignore'):
+        if 'min_change' in filters:
+            mask &= change_percent >= filters['min_change']
+        if 'max_change' in filters:
+            mask &= change_percent <= filters['max_change']
+        if 'min_volume' in filters:
+            mask &= volume >= filters['min_volume']
+        if 'min_price' in filters:
+            mask &= price >= filters['min_price']
+        if 'max_price' in filters:
+            mask &= price <= filters['max_price']
+        if 'max_from_high' in filters:
+            mask &= from_high <= filters['max_from_high']
+        if 'min_rsi' in filters:
+            mask &= rsi_values >= filters['min_rsi']
+        if 'max_rsi' in filters:
+            mask &= rsi_values <= filters['max_rsi']
+
+    columns = {
+        'change_percent': change_percent,
+        'volume': volume.astype(np.float64),
+        'turnover': table['turnover'].astype(np.float64),
+        'price': price,
+        'from_high': from_high,
+        'rsi': rsi_values,
+    }
+    matched = np.flatnonzero(mask)
+    key = columns[sort][matched]
+    # 排序時缺值一律排在最後
+    key = np.where(np.isnan(key), np.inf, key if ascending else -key)
+    top = matched[np.argsort(key, kind='stable')[:limit]]
+
+    def value(array, i):
+        number = float(array[i])
+        return round(number, 2) if np.isfinite(number) else None
+
+    results = [{
+        'code': str(table['code'][i]),
+        'name': str(table['name'][i]),
+        'price': value(price, i),
+        'change': value(change, i),
+        'change_percent': value(change_percent, i),
+        'volume': int(volume[i]) if volume[i] >= 0 else None,
+        'turnover': int(table['turnover'][i]) if table['turnover'][i] >= 0 else None,
+        'from_high': value(from_high, i),
+        'rsi': value(rsi_values, i),
+    } for i in top]
+
+    return {
+        'date': table['date'],
+        'total': len(price),
+        'matched': len(matched),
+        'filters': filters,
+        'results': results,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+    }
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+單一請求合併 (single-flight)
+同一個快取鍵同時有多個查詢時，只有第一個呼叫者實際向上游取資料，
+其他執行緒等待並共用同一份結果。跨 worker 行程則透過鎖檔序列化，
+取得鎖的行程會先重新檢查快取，避免重複查詢。
+
+鎖檔在釋放前刪除，等待同一鎖檔的行程取得鎖後發現檔案已被刪除或更換，會重新開啟新的鎖檔，
+因此鎖檔不會隨鍵值數量累積；舊版遺留且無人持有的鎖檔在每個行程第一次加鎖時清除。
+
+FileLock 一律先取得同一路徑的行程內鎖，再取得跨行程的檔案鎖（POSIX 用 flock，
+Windows 用 msvcrt.locking；Windows 無法刪除開啟中的檔案，鎖檔因此保留）。
+兩者皆無法使用時只有行程內鎖，並提示一次。
+"""
+
+import os
+import re
+import threading
+import time
+import weakref
+
+try:
+    import fcntl
+except ImportError:  # Windows 沒有 fcntl，改用 msvcrt
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+LOCK_DIR = os.path.join('cache', 'locks')
+
+# 合併設定
+SINGLEFLIGHT_CONFIG = {
+    'wait_timeout': 60,  # 等待其他呼叫者結果的最長秒數，逾時後自行查詢
+    'lock_timeout': 30,  # 等待跨行程鎖檔的最長秒數，逾時後不加鎖直接查詢
+    'lock_poll_interval': 0.05,  # 檢查鎖檔的間隔秒數
+}
+
+
+class _Call:
+    """進行中的一次查詢"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_swept = False
+_sweep_lock = threading.Lock()
+
+# 路徑 -> 行程內鎖（沒有持有者或等待者時自動移除）
+_local_locks = weakref.WeakValueDictionary()
+_local_locks_lock = threading.Lock()
+_warned = False
+
+
+def _local_lock(path):
+    """取得鎖檔路徑對應的行程內鎖"""
+    with _local_locks_lock:
+        lock = _local_locks.get(path)
+        if lock is None:
+            lock = threading.Lock()
+            _local_locks[path] = lock
+        return lock
+
+
+def _warn_process_only():
+    """沒有跨行程檔案鎖時提示一次"""
+    global _warned
+
+    if not _warned:
+        _warned = True
+        print("⚠️ 此平台不支援檔案鎖，FileLock 只在同一行程內互斥（多個行程請勿同時寫入快取與歷史資料）")
+
+
+def _try_lock(file):
+    """對已開啟的鎖檔加上不等待的獨佔鎖，其他行程持有中時回傳 False"""
+    try:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except BlockingIOError:
+        return False
+    except PermissionError:  # msvcrt 鎖定失敗
+        return False
+
+
+def _unlock(file):
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _is_current(path, file):
+    """已開啟的鎖檔是否仍是 path 指向的檔案（未被前一個持有者刪除）"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+    opened = os.fstat(file.fileno())
+    return (stat.st_dev, stat.st_ino) == (opened.st_dev, opened.st_ino)
+
+
+def _remove_stale_lock_files():
+    """刪除無人持有的鎖檔（每個行程執行一次）"""
+    global _swept
+
+    with _sweep_lock:
+        if _swept:
+            return
+        _swept = True
+
+    removed = 0
+    for name in os.listdir(LOCK_DIR):
+        if not name.endswith('.lock'):
+            continue
+        path = os.path.join(LOCK_DIR, name)
+        try:
+            with open(path, 'a') as f:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # 其他行程持有中
+                if _is_current(path, f):
+                    os.unlink(path)
+                    removed += 1
+        except OSError:
+            continue
+    if removed:
+        print(f"🧹 已刪除 {removed} 個遺留的鎖檔")
+
+
+class FileLock:
+    """
+    以行程內鎖加上檔案鎖（flock 或 msvcrt.locking）實作的跨行程鎖，取得失敗時不阻擋查詢；釋放時刪除鎖檔
+    可用 with 包住一段查詢，或以 blocking=False 呼叫 acquire() 長期持有（如選出單一背景輪詢行程）
+    """
+
+    def __init__(self, key, blocking=True):
+        safe_key = re.sub(r'[^\w.-]', '_', key)
+        self.path = os.path.join(LOCK_DIR, f"{safe_key}.lock")
+        self.blocking = blocking
+        self.file = None
+        self._local = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def acquire(self):
+        """
+        取得鎖，成功時回傳 True
+        blocking 為 False 時其他持有者存在即回傳 False；等待逾時或無法建立鎖檔時同樣回傳 False
+        """
+        deadline = time.monotonic() + SINGLEFLIGHT_CONFIG['lock_timeout']
+        local = _local_lock(self.path)
+        if not local.acquire(timeout=SINGLEFLIGHT_CONFIG['lock_timeout'] if self.blocking else 0):
+            if self.blocking:
+                print(f"⚠️ 等待鎖逾時，直接查詢: {self.path}")
+            return False
+        self._local = local
+
+        if fcntl is None and msvcrt is None:
+            _warn_process_only()
+            return True
+        if self._lock_file(deadline):
+            return True
+        self._release_local()
+        return False
+
+    def _lock_file(self, deadline):
+        """取得跨行程的檔案鎖"""
+        try:
+            os.makedirs(LOCK_DIR, exist_ok=True)
+            if fcntl is not None:
+                _remove_stale_lock_files()
+            while True:
+                self.file = open(self.path, 'a')
+                while not _try_lock(self.file):
+                    if not self.blocking or time.monotonic() >= deadline:
+                        if self.blocking:
+                            print(f"⚠️ 等待鎖檔逾時，直接查詢: {self.path}")
+                        self.file.close()
+                        self.file = None
+                        return False
+                    time.sleep(SINGLEFLIGHT_CONFIG['lock_poll_interval'])
+                if fcntl is None or _is_current(self.path, self.file):
+                    return True
+                # 前一個持有者已刪除鎖檔，改為鎖定新的鎖檔
+                self.file.close()
+                self.file = None
+        except OSError as e:
+            print(f"⚠️ 無法取得鎖檔 {self.path}: {e}")
+            if self.file:
+                self.file.close()
+            self.file = None
+            return False
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+    def release(self):
+        """釋放鎖（未持有時不做任何事）"""
+        if self.file:
+            try:
+                if fcntl is not None:
+                    # 持有鎖時刪除，等待中的行程取得舊檔的鎖後會重新開啟
+                    try:
+                        os.unlink(self.path)
+                    except OSError:
+                        pass
+                _unlock(self.file)
+            finally:
+                self.file.close()
+                self.file = None
+        self._release_local()
+
+    def _release_local(self):
+        if self._local is not None:
+            local, self._local = self._local, None
+            local.release()
+
+class SingleFlight:
+    """依鍵值合併同時進行的查詢"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, recheck=None):
+        """
+        執行查詢；同一鍵值已有查詢進行中時等待其結果
+        :param key: 合併用的鍵值（通常為快取鍵）
+        :param fn: 實際查詢函式
+        :param recheck: 取得跨行程鎖後重新檢查快取的函式，命中時回傳非 None 值
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            if call.event.wait(SINGLEFLIGHT_CONFIG['wait_timeout']):
+                if call.error is not None:
+                    raise call.error
+                return call.result
+            print(f"⚠️ 等待 {key} 查詢結果逾時，自行查詢")
+            return fn()
+
+        try:
+            with FileLock(key):
+                result = recheck() if recheck else None
+                if result is None:
+                    result = fn()
+            call.result = result
+            return result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
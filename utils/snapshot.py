@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+全市場每日收盤行情
+收盤後以單一請求下載證交所 STOCK_DAY_ALL（所有上市證券當日的開高低收與成交資訊），
+解析成欄式快照表（每個欄位一個 NumPy 陣列，約 1,000 多檔），並一次完成：
+    1. 寫入報價快取（存活到下一個交易日開始試撮），收盤後查詢任何上市股票都不必再呼叫上游
+    2. 補充股票主檔中缺少的名稱
+    3. 將當日日線接到已有本地歷史資料的股票之後
+
+可由背景輪詢在收盤後自動執行，或手動執行（--file 可改用事先錄下的回應檔，不連網路）：
+    python -m utils.snapshot
+    python -m utils.snapshot --file tests/fixtures/stock_day_all.json
+"""
+
+import os
+import json
+import threading
+import time
+import numpy as np
+from .http_client import http_get
+from .history import COLUMNS, roc_to_int, append_daily_bar
+from .market_calendar import last_trading_close, is_market_open
+from .quote import Quote, parse_number
+from .symbols import get_symbol, remember_symbol, save_symbol_master
+
+SNAPSHOT_DIR = os.path.join('cache', 'snapshot')
+SNAPSHOT_FILE = os.path.join(SNAPSHOT_DIR, 'latest.npz')
+
+# 證交所每日收盤行情（所有上市證券）
+SNAPSHOT_URLS = [
+    "https://www.twse.com.tw/rwd/zh/afterTrading/STOCK_DAY_ALL?response=json",
+    "https://www.twse.com.tw/exchangeReport/STOCK_DAY_ALL?response=json",
+]
+
+# 快照設定
+SNAPSHOT_CONFIG = {
+    'retry_interval': 600,  # 行情尚未更新或下載失敗時，再次嘗試的最短間隔秒數
+    'update_history': True,  # 是否將當日日線接到本地歷史資料
+}
+
+# STOCK_DAY_ALL 欄位名稱 -> 快照欄位
+FIELD_MAP = {
+    '證券代號': 'code',
+    '證券名稱': 'name',
+    '成交股數': 'volume',
+    '成交金額': 'turnover',
+    '開盤價': 'open',
+    '最高價': 'high',
+    '最低價': 'low',
+    '收盤價': 'close',
+    '漲跌價差': 'change',
+    '成交筆數': 'trades',
+}
+
+_snapshot = None  # 已載入的快照表
+_snapshot_lock = threading.Lock()
+_last_attempt = 0.0
+
+
+def _report_date(data):
+    """回應中的資料日期轉為 YYYYMMDD 整數（rwd 為西元 YYYYMMDD，舊版可能為民國日期）"""
+    text = str(data.get('date') or '').strip()
+    if '/' in text:
+        return roc_to_int(text)
+    if len(text) == 7:  # 民國 YYYMMDD
+        return (int(text[:3]) + 1911) * 10000 + int(text[3:])
+    return int(text) if text.isdigit() else None
+
+
+def parse_stock_day_all(data):
+    """
+    將 STOCK_DAY_ALL 回應解析為欄式快照表
+    :return: {'date': YYYYMMDD, 'code': 字串陣列, 'name': 字串陣列, 其他 history.COLUMNS 欄位: 數值陣列}；
+             無資料時回傳 None
+    """
+    trade_date = _report_date(data)
+    fields = data.get('fields') or []
+    rows = data.get('data') or []
+    if not trade_date or not rows:
+        return None
+
+    index = {FIELD_MAP[field]: position for position, field in enumerate(fields) if field in FIELD_MAP}
+    missing = set(FIELD_MAP.values()) - set(index)
+    if missing:
+        raise ValueError(f"STOCK_DAY_ALL 缺少欄位: {', '.join(sorted(missing))}")
+
+    codes, names = [], []
+    numbers = {column: [] for column in COLUMNS if column != 'date'}
+    for row in rows:
+        code = str(row[index['code']]).strip()
+        if not code:
+            continue
+        codes.append(code)
+        names.append(str(row[index['name']]).strip())
+        for column in numbers:
+            value = parse_number(row[index[column]])
+            if COLUMNS[column] == np.float64:
+                numbers[column].append(value if value is not None else np.nan)
+            else:
+                numbers[column].append(int(value) if value is not None else -1)
+
+    table = {
+        'date': trade_date,
+        'code': np.array(codes),
+        'name': np.array(names),
+    }
+    for column, values in numbers.items():
+        table[column] = np.array(values, dtype=COLUMNS[column])
+    # 無成交的股票收盤價為 NaN，漲跌價差也視為缺值
+    table['change'][np.isnan(table['close'])] = np.nan
+    return table
+
+
+def _roc_text(trade_date):
+    """YYYYMMDD 轉為民國日期字串（與 STOCK_DAY 報價的 trade_date 格式一致）"""
+    return f"{trade_date // 10000 - 1911}/{trade_date // 100 % 100:02d}/{trade_date % 100:02d}"
+
+
+def snapshot_quotes(table):
+    """快照表轉為 {股票代碼: Quote}（略過當日無成交的股票）"""
+    trade_date = _roc_text(table['date'])
+    quotes = {}
+    for i, code in enumerate(table['code'].tolist()):
+        close = float(table['close'][i])
+        if not close > 0:
+            continue
+        change = float(table['change'][i])
+        change = change if np.isfinite(change) else None
+
+        def number(column):
+            value = float(table[column][i])
+            return value if np.isfinite(value) else None
+
+        def count(column):
+            value = int(table[column][i])
+            return value if value >= 0 else None
+
+        symbol = get_symbol(code)
+        quotes[code] = Quote(
+            code,
+            symbol['name'] if symbol else table['name'][i],
+            price=close,
+            open=number('open'),
+            high=number('high'),
+            low=number('low'),
+            prev_close=close - change if change is not None else None,
+            change=change,
+            shares=count('volume'),
+            turnover=count('turnover'),
+            trades=count('trades'),
+            trade_date=trade_date,
+            source='twse_snapshot',
+        )
+    return quotes
+
+
+def save_snapshot(table):
+    """以原子操作寫入快照檔"""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    tmp_file = f"{SNAPSHOT_FILE}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_file, **{column: np.asarray(values) for column, values in table.items()})
+    os.replace(tmp_file, SNAPSHOT_FILE)
+
+
+def load_snapshot():
+    """
+    取得最新的快照表（快照檔更新時重新載入），沒有快照時回傳 None
+    :return: {'date': YYYYMMDD, 'code': 陣列, 'name': 陣列, 數值欄位: 陣列}
+    """
+    global _snapshot
+
+    try:
+        mtime = os.stat(SNAPSHOT_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    cached = _snapshot
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    try:
+        with np.load(SNAPSHOT_FILE) as archive:
+            table = {column: archive[column] for column in archive.files}
+        table['date'] = int(table['date'])
+    except Exception as e:
+        print(f"❌ 讀取全市場快照失敗: {e}")
+        return None
+
+    with _snapshot_lock:
+        _snapshot = (mtime, table)
+    return table
+
+
+def fetch_stock_day_all():
+    """下載 STOCK_DAY_ALL，全部失敗時回傳 None"""
+    for url in SNAPSHOT_URLS:
+        try:
+            print("📡 下載全市場收盤行情...")
+            resp = http_get(url, timeout=(5, 60))
+            resp.raise_for_status()
+            data = resp.json()
+            if data.get('stat') == 'OK' and data.get('data'):
+                return data
+            print(f"⚠️ 全市場收盤行情無資料: {data.get('stat')}")
+        except Exception as e:
+            print(f"❌ 下載全市場收盤行情失敗: {e}")
+    return None
+
+
+def ingest_snapshot(data=None, path=None):
+    """
+    解析全市場收盤行情並寫入快照檔、報價快取、股票主檔與歷史資料
+    :param data: 已取得的 STOCK_DAY_ALL 回應；None 時讀取 path，兩者皆無時從證交所下載
+    :param path: 事先錄下的回應檔 (JSON)
+    :return: 結果摘要字典，無資料時回傳 None
+    """
+    # 避免與 twse 模組循環匯入
+    from .twse import save_cache_many
+
+    if data is None and path:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    if data is None:
+        data = fetch_stock_day_all()
+    table = parse_stock_day_all(data) if data else None
+    if table is None:
+        return None
+
+    save_snapshot(table)
+    result = {'date': table['date'], 'symbols': len(table['code']), 'quotes_cached': 0,
+              'symbols_added': 0, 'history_appended': 0}
+
+    # 股票主檔：補上缺少的代碼（不覆蓋 ISIN 公告的資料）
+    # 逐檔加入的代碼不會使主檔變成完整，只有上市代碼時不會拒絕上櫃代碼
+    for code, name in zip(table['code'].tolist(), table['name'].tolist()):
+        if get_symbol(code) is None:
+            remember_symbol(code, name, '上市')
+            result['symbols_added'] += 1
+    if result['symbols_added']:
+        save_symbol_master()
+
+    # 報價快取：只在非交易時段寫入最近一個交易日的行情，
+    # 避免證交所尚未更新時以前一日收盤價覆蓋快取，或在盤中覆蓋即時報價
+    latest_date = last_trading_close().strftime('%Y%m%d')
+    if is_market_open():
+        print("⚠️ 盤中不以全市場收盤行情覆蓋報價快取")
+    elif str(table['date']) == latest_date:
+        quotes = snapshot_quotes(table)
+        save_cache_many({f"stock_basic_{code}": quote for code, quote in quotes.items()})
+        result['quotes_cached'] = len(quotes)
+    else:
+        print(f"⚠️ 全市場收盤行情日期 {table['date']} 不是最近交易日 {latest_date}，不寫入報價快取")
+
+    # 歷史資料：只接到資料已連續到前一個交易日的股票
+    if SNAPSHOT_CONFIG['update_history']:
+        numeric = [column for column in COLUMNS if column != 'date']
+        for i, code in enumerate(table['code'].tolist()):
+            bar = {column: table[column][i] for column in numeric}
+            bar['date'] = table['date']
+            try:
+                if append_daily_bar(code, bar):
+                    result['history_appended'] += 1
+            except Exception as e:
+                print(f"⚠️ 寫入歷史資料失敗 {code}: {e}")
+
+    print(f"🗂️ 全市場收盤行情 {table['date']}：{result['symbols']} 檔，"
+          f"快取 {result['quotes_cached']} 檔，歷史資料 {result['history_appended']} 檔")
+    return result
+
+
+def snapshot_is_current():
+    """快照是否已是最近一個交易日的收盤行情"""
+    table = load_snapshot()
+    return table is not None and str(table['date']) == last_trading_close().strftime('%Y%m%d')
+
+
+def ensure_snapshot():
+    """
+    收盤後若快照尚未更新則下載一次（失敗或行情尚未公布時依 retry_interval 重試）
+    :return: 是否實際發出下載
+    """
+    global _last_attempt
+
+    if snapshot_is_current():
+        return False
+    if time.monotonic() - _last_attempt < SNAPSHOT_CONFIG['retry_interval']:
+        return False
+    _last_attempt = time.monotonic()
+    ingest_snapshot()
+    return True
+
+
+if __name__ == "__main__":
+    import sys
+
+    file_path = sys.argv[sys.argv.index('--file') + 1] if '--file' in sys.argv else None
+    summary = ingest_snapshot(path=file_path)
+    if summary is None:
+        print("❌ 沒有可用的全市場收盤行情")
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+資料來源健康狀態與斷路器
+每個資料來源各有一個斷路器，記錄近期的成功率與回應時間：
+連續失敗或錯誤率過高時斷開 (open)，暫停呼叫該來源；
+冷卻時間過後進入半開 (half_open)，只放行一個探測請求，成功才恢復。
+只有連線、逾時與 HTTP 錯誤會記錄為失敗；來源正常回應但查無資料不經過斷路器（見 sources._SourceRun）。
+"""
+
+import threading
+import time
+from collections import deque
+
+# 斷路器設定
+HEALTH_CONFIG = {
+    'window_seconds': 300,  # 錯誤率與延遲的統計區間
+    'max_samples': 100,  # 每個來源保留的樣本數上限
+    'failure_threshold': 3,  # 連續失敗幾次後斷開
+    'error_rate_threshold': 0.5,  # 統計區間內錯誤率達此比例後斷開
+    'min_samples': 10,  # 錯誤率判斷所需的最少樣本數
+    'open_seconds': 30,  # 斷開後的冷卻秒數
+    'max_open_seconds': 600,  # 冷卻秒數上限（探測失敗時加倍）
+    'target_latency': 1.0,  # 健康分數的目標回應秒數
+}
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """單一資料來源的斷路器"""
+
+    def __init__(self, name):
+        self.name = name
+        self.state = CLOSED
+        self.samples = deque(maxlen=HEALTH_CONFIG['max_samples'])  # (時間, 是否成功, 回應秒數)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.open_seconds = HEALTH_CONFIG['open_seconds']
+        self.probe_in_flight = False
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def _recent_samples(self, now):
+        """取得統計區間內的樣本"""
+        cutoff = now - HEALTH_CONFIG['window_seconds']
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+        return list(self.samples)
+
+    def _open(self, now):
+        """斷開斷路器"""
+        self.state = OPEN
+        self.open_until = now + self.open_seconds
+        self.probe_in_flight = False
+        print(f"🔌 {self.name} 斷路器斷開 {self.open_seconds:.0f} 秒")
+
+    def allow_request(self):
+        """是否允許呼叫此來源；冷卻結束時放行一個半開探測請求"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+
+            now = time.monotonic()
+            if self.state == OPEN and now >= self.open_until:
+                self.state = HALF_OPEN
+                self.probe_in_flight = False
+
+            if self.state == HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def cancel_probe(self):
+        """探測請求未實際執行（例如已被取消）時釋放探測名額"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.probe_in_flight = False
+
+    def record(self, ok, latency, error=None):
+        """記錄一次呼叫結果"""
+        with self._lock:
+            now = time.monotonic()
+            self.samples.append((now, ok, latency))
+
+            if ok:
+                self.consecutive_failures = 0
+                if self.state != CLOSED:
+                    print(f"🔌 {self.name} 斷路器恢復")
+                self.state = CLOSED
+                self.open_seconds = HEALTH_CONFIG['open_seconds']
+                self.probe_in_flight = False
+                return
+
+            self.consecutive_failures += 1
+            self.last_error = error
+
+            if self.state == HALF_OPEN:
+                # 探測失敗，加倍冷卻時間後再斷開
+                self.open_seconds = min(self.open_seconds * 2, HEALTH_CONFIG['max_open_seconds'])
+                self._open(now)
+                return
+
+            if self.state == CLOSED:
+                recent = self._recent_samples(now)
+                failures = sum(1 for _, sample_ok, _ in recent if not sample_ok)
+                error_rate = failures / len(recent) if recent else 0.0
+                if (self.consecutive_failures >= HEALTH_CONFIG['failure_threshold'] or
+                        (len(recent) >= HEALTH_CONFIG['min_samples'] and
+                         error_rate >= HEALTH_CONFIG['error_rate_threshold'])):
+                    self._open(now)
+
+    def latencies(self):
+        """取得統計區間內的回應秒數"""
+        with self._lock:
+            return [latency for _, _, latency in self._recent_samples(time.monotonic())]
+
+    def snapshot(self):
+        """取得目前的健康狀態"""
+        with self._lock:
+            now = time.monotonic()
+            recent = self._recent_samples(now)
+            successes = sum(1 for _, ok, _ in recent if ok)
+            success_rate = successes / len(recent) if recent else None
+            latencies = sorted(latency for _, _, latency in recent)
+            avg_latency = sum(latencies) / len(latencies) if latencies else None
+            p95_latency = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None
+
+            # 健康分數：成功率 × 回應速度（不超過目標延遲時為 1）
+            if success_rate is None:
+                score = None
+            else:
+                speed = min(1.0, HEALTH_CONFIG['target_latency'] / avg_latency) if avg_latency else 1.0
+                score = round(success_rate * speed, 3)
+            if self.state != CLOSED:
+                score = 0.0
+
+            return {
+                'state': self.state,
+                'score': score,
+                'samples': len(recent),
+                'success_rate': round(success_rate, 3) if success_rate is not None else None,
+                'avg_latency': round(avg_latency, 3) if avg_latency is not None else None,
+                'p95_latency': round(p95_latency, 3) if p95_latency is not None else None,
+                'consecutive_failures': self.consecutive_failures,
+                'retry_in': round(max(0.0, self.open_until - now), 1) if self.state == OPEN else None,
+                'last_error': self.last_error,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(source_name):
+    """取得資料來源的斷路器（不存在時建立）"""
+    breaker = _breakers.get(source_name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(source_name, CircuitBreaker(source_name))
+    return breaker
+
+
+def get_source_health():
+    """取得所有資料來源目前的健康狀態"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+
+def reset_source_health(source_name=None):
+    """重設斷路器狀態（未指定來源時重設全部）"""
+    with _breakers_lock:
+        if source_name is None:
+            _breakers.clear()
+        else:
+            _breakers.pop(source_name, None)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+資料來源動態排序
+依查詢類型（個股/大盤）與時段（盤中/盤後）分別記錄各來源的
+指數衰減平均回應時間與成功率，執行時依「取得有效結果的期望時間」重新排序。
+學習結果會定期寫入磁碟，重新啟動後沿用。
+"""
+
+import os
+import json
+import atexit
+import random
+import threading
+import time
+from .market_calendar import is_trading_session
+
+RANKING_FILE = os.path.join('cache', 'source_ranking.json')
+
+# 排序設定
+RANKING_CONFIG = {
+    'enabled': True,  # 啟用動態排序
+    'latency_alpha': 0.2,  # 回應時間的衰減係數（越大越重視近期）
+    'success_alpha': 0.1,  # 成功率的衰減係數
+    'min_samples': 5,  # 樣本數達到此數量才參與排序
+    'min_success_rate': 0.05,  # 計算期望時間時的成功率下限
+    'explore_rate': 0.05,  # 依原始順序查詢的機率，讓排序後段的來源也能持續取樣
+    'save_interval': 60,  # 寫入磁碟的最短間隔秒數
+}
+
+_stats = None
+_stats_lock = threading.Lock()
+_last_saved = 0.0
+_dirty = False
+
+
+def current_window(now=None):
+    """目前的時段：盤中 (session) 或盤後 (after_hours)，依交易行事曆判斷"""
+    if is_trading_session(now):
+        return 'session'
+    return 'after_hours'
+
+
+def _load_stats():
+    """從磁碟載入學習結果"""
+    if not os.path.exists(RANKING_FILE):
+        return {}
+    try:
+        with open(RANKING_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"❌ 讀取資料來源排序失敗: {e}")
+        return {}
+
+
+def _get_stats():
+    """取得記憶體中的統計資料（第一次呼叫時從磁碟載入）"""
+    global _stats
+
+    if _stats is None:
+        with _stats_lock:
+            if _stats is None:
+                _stats = _load_stats()
+    return _stats
+
+
+def save_rankings():
+    """將學習結果寫入磁碟"""
+    global _last_saved, _dirty
+
+    stats = _get_stats()
+    os.makedirs(os.path.dirname(RANKING_FILE), exist_ok=True)
+    tmp_file = f"{RANKING_FILE}.{os.getpid()}.tmp"
+    try:
+        with _stats_lock:
+            payload = json.dumps(stats, ensure_ascii=False)
+            _last_saved = time.monotonic()
+            _dirty = False
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_file, RANKING_FILE)
+    except Exception as e:
+        print(f"❌ 儲存資料來源排序失敗: {e}")
+
+
+def record_result(kind, source_name, ok, latency):
+    """記錄一次查詢結果，更新衰減平均"""
+    global _dirty
+
+    stats = _get_stats()
+    key = f"{kind}:{current_window()}"
+    with _stats_lock:
+        source_stats = stats.setdefault(key, {}).get(source_name)
+        if source_stats is None:
+            source_stats = {'latency': latency, 'success': 1.0 if ok else 0.0, 'samples': 0}
+            stats[key][source_name] = source_stats
+        else:
+            latency_alpha = RANKING_CONFIG['latency_alpha']
+            success_alpha = RANKING_CONFIG['success_alpha']
+            source_stats['latency'] += latency_alpha * (latency - source_stats['latency'])
+            source_stats['success'] += success_alpha * ((1.0 if ok else 0.0) - source_stats['success'])
+        source_stats['samples'] += 1
+        _dirty = True
+        should_save = time.monotonic() - _last_saved >= RANKING_CONFIG['save_interval']
+
+    if should_save:
+        save_rankings()
+
+
+@atexit.register
+def _save_on_exit():
+    """行程結束前寫入尚未儲存的學習結果"""
+    if _stats is not None and _dirty:
+        save_rankings()
+
+
+def expected_time(source_stats):
+    """依序嘗試時，取得有效結果的期望時間（回應時間 ÷ 成功率）"""
+    success = max(source_stats['success'], RANKING_CONFIG['min_success_rate'])
+    return source_stats['latency'] / success
+
+
+def order_sources(kind, data_sources):
+    """
+    依期望時間重新排序資料來源
+    樣本不足的來源維持原本的位置，只在有足夠樣本的來源之間調整順序
+    """
+    if not RANKING_CONFIG['enabled'] or random.random() < RANKING_CONFIG['explore_rate']:
+        return list(data_sources)
+
+    window_stats = _get_stats().get(f"{kind}:{current_window()}", {})
+    with _stats_lock:
+        ranked = []
+        for index, (source_name, _) in enumerate(data_sources):
+            source_stats = window_stats.get(source_name)
+            if source_stats and source_stats['samples'] >= RANKING_CONFIG['min_samples']:
+                ranked.append((expected_time(source_stats), index))
+
+    if len(ranked) < 2:
+        return list(data_sources)
+
+    ordered = list(data_sources)
+    slots = sorted(index for _, index in ranked)
+    for slot, (_, index) in zip(slots, sorted(ranked)):
+        ordered[slot] = data_sources[index]
+    return ordered
+
+
+def get_source_rankings():
+    """取得目前的學習結果（含期望時間）"""
+    stats = _get_stats()
+    with _stats_lock:
+        return {
+            key: {
+                source_name: dict(source_stats, expected_time=round(expected_time(source_stats), 3))
+                for source_name, source_stats in window_stats.items()
+            }
+            for key, window_stats in stats.items()
+        }
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多重資料來源執行器
+依序或以對沖 (hedged) 模式執行資料來源，回傳第一個有效結果。
+斷路器斷開中的來源會直接略過；指定查詢類型時依學習到的期望時間重新排序。
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, CancelledError, wait, FIRST_COMPLETED
+from .http_client import CancelScope
+from .source_health import get_breaker
+from .source_ranking import order_sources, record_result
+
+# 執行設定
+SOURCE_CONFIG = {
+    'hedge_enabled': True,  # 啟用對沖模式：前一個來源遲遲未回應時提前啟動下一個
+    'hedge_delay': 1.5,  # 尚無延遲統計時的預設對沖等待秒數
+    'hedge_min_delay': 0.2,  # 對沖等待秒數下限
+    'hedge_max_delay': 5.0,  # 對沖等待秒數上限
+    'hedge_percentile': 95,  # 以各來源延遲的第幾百分位作為對沖等待時間
+    'hedge_min_samples': 10,  # 延遲樣本數達到此數量才採用百分位
+    'max_workers': 16,  # 對沖模式的執行緒數量（同時執行中的來源數上限）
+    'attempt_timeout': 10.0,  # 對沖模式單一來源的最長秒數，逾時取消該來源並啟動下一個來源
+    'slow_failure_seconds': 2.0,  # 所有來源都失敗時，回應超過此秒數的失敗才計入斷路器
+}
+
+_executor = None
+_slots = None  # 執行緒池的空位，落敗仍在執行的來源也佔用空位
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """取得對沖模式共用的執行緒池與空位號誌"""
+    global _executor, _slots
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _slots = threading.BoundedSemaphore(SOURCE_CONFIG['max_workers'])
+                _executor = ThreadPoolExecutor(
+                    max_workers=SOURCE_CONFIG['max_workers'],
+                    thread_name_prefix='source',
+                )
+    return _executor, _slots
+
+
+def get_latency_percentile(source_name, percentile=None):
+    """取得資料來源回應時間的百分位數，樣本不足時回傳 None"""
+    percentile = percentile or SOURCE_CONFIG['hedge_percentile']
+    samples = sorted(get_breaker(source_name).latencies())
+
+    if len(samples) < SOURCE_CONFIG['hedge_min_samples']:
+        return None
+    index = min(len(samples) - 1, int(len(samples) * percentile / 100))
+    return samples[index]
+
+
+def get_hedge_delay(source_name):
+    """計算啟動下一個來源前要等待的秒數"""
+    delay = get_latency_percentile(source_name)
+    if delay is None:
+        delay = SOURCE_CONFIG['hedge_delay']
+    return min(max(delay, SOURCE_CONFIG['hedge_min_delay']), SOURCE_CONFIG['hedge_max_delay'])
+
+
+class _SourceRun:
+    """
+    一次多重來源查詢的結果紀錄
+    成功立即記錄到斷路器；失敗則等查詢結束後再決定：
+
+    - 來源拋出例外（連線、逾時、HTTP 錯誤）：若有其他來源成功，代表此來源確實異常，
+      計入斷路器；若所有來源都失敗且回應很快，多半是代碼本身不存在，不列入錯誤率。
+    - 來源正常回應但查無有效資料（如即時報價尚無成交、上櫃代碼不在該頻道）：
+      來源本身是健康的，一律不計入斷路器；有其他來源成功時只讓排序學習降低其優先度。
+    """
+
+    def __init__(self, kind=None):
+        self.kind = kind
+        self.finished = False
+        self.succeeded = False
+        self.failures = []
+        self._lock = threading.Lock()
+
+    def _record_failure(self, source_name, elapsed, error):
+        if error is None:
+            # 查無資料：不計入斷路器，只釋放可能佔用的半開探測名額
+            get_breaker(source_name).cancel_probe()
+            if self.succeeded and self.kind:
+                record_result(self.kind, source_name, False, elapsed)
+        elif self.succeeded or elapsed >= SOURCE_CONFIG['slow_failure_seconds']:
+            get_breaker(source_name).record(False, elapsed, error)
+            if self.kind:
+                record_result(self.kind, source_name, False, elapsed)
+        else:
+            get_breaker(source_name).cancel_probe()
+
+    def success(self, source_name, elapsed):
+        get_breaker(source_name).record(True, elapsed)
+        if self.kind:
+            record_result(self.kind, source_name, True, elapsed)
+
+    def failure(self, source_name, elapsed, error=None):
+        """記錄一次失敗，error 為 None 表示來源正常回應但查無有效資料"""
+        with self._lock:
+            if not self.finished:
+                self.failures.append((source_name, elapsed, error))
+                return
+        self._record_failure(source_name, elapsed, error)
+
+    def finish(self, succeeded):
+        with self._lock:
+            self.finished = True
+            self.succeeded = succeeded
+            failures, self.failures = self.failures, []
+        for source_name, elapsed, error in failures:
+            self._record_failure(source_name, elapsed, error)
+
+
+def _call_source(run, source_name, get_data_func, is_valid, scope=None):
+    """
+    執行單一資料來源，並將結果與回應時間交給查詢紀錄
+    來源拋出例外視為錯誤；回傳無效資料視為查無資料（見 _SourceRun）
+    :param scope: CancelScope，來源中的 run_sync 以其期限為逾時，落敗時可被取消
+    """
+    started = time.monotonic()
+    try:
+        if scope is None:
+            data = get_data_func()
+        else:
+            with scope:
+                data = get_data_func()
+    except CancelledError:
+        # 其他來源已勝出而被取消，不列入成敗
+        get_breaker(source_name).cancel_probe()
+        raise
+    except Exception as e:
+        run.failure(source_name, time.monotonic() - started, str(e))
+        raise
+    if is_valid(data):
+        run.success(source_name, time.monotonic() - started)
+    else:
+        run.failure(source_name, time.monotonic() - started)
+    return data
+
+
+def _run_sequential(run, data_sources, is_valid):
+    """依序嘗試每個資料來源（每個來源以 attempt_timeout 為期限）"""
+    for source_name, get_data_func in data_sources:
+        if not get_breaker(source_name).allow_request():
+            print(f"🔌 {source_name} 斷路器斷開中，略過")
+            continue
+        try:
+            print(f"📡 嘗試 {source_name}...")
+            data = _call_source(run, source_name, get_data_func, is_valid,
+                                CancelScope(SOURCE_CONFIG['attempt_timeout']))
+            if is_valid(data):
+                return source_name, data
+            print(f"⚠️ {source_name} 查無有效資料")
+        except Exception as e:
+            print(f"❌ {source_name} 發生異常: {e}")
+    return None, None
+
+
+def _run_hedged(run, data_sources, is_valid):
+    """
+    對沖模式：先啟動第一個來源，等待其延遲百分位數後仍未完成就啟動下一個；
+    任一來源失敗或超過 attempt_timeout 未回應也會立即啟動下一個。第一個有效結果勝出。
+
+    每個來源在自己的 CancelScope 中執行：來源經由 run_sync 在共用事件迴圈執行的協程，
+    於落敗或逾時時被取消，工作執行緒隨即釋放；尚未開始的工作直接取消。
+    只有不經過 run_sync 的同步請求（requests）無法中斷，會跑到其 HTTP 逾時為止。
+    同時執行中的來源數以 max_workers 為上限，執行緒池已滿時不再對沖，
+    尚未嘗試的來源改在呼叫端的執行緒依序執行。
+    """
+    executor, slots = _get_executor()
+    pending = {}  # future -> (來源名稱, 放棄等待的時間, CancelScope)
+    next_index = 0
+    saturated = False
+
+    def launch_next():
+        """啟動下一個斷路器允許的來源，沒有可用來源或執行緒池已滿時回傳 None"""
+        nonlocal next_index, saturated
+        if next_index >= len(data_sources):
+            return None
+        if not slots.acquire(blocking=False):
+            saturated = True
+            return None
+        while next_index < len(data_sources):
+            source_name, get_data_func = data_sources[next_index]
+            next_index += 1
+            if not get_breaker(source_name).allow_request():
+                print(f"🔌 {source_name} 斷路器斷開中，略過")
+                continue
+            print(f"📡 嘗試 {source_name}...")
+            scope = CancelScope(SOURCE_CONFIG['attempt_timeout'])
+            future = executor.submit(_call_source, run, source_name, get_data_func, is_valid, scope)
+            future.add_done_callback(lambda _: slots.release())
+            pending[future] = (source_name, time.monotonic() + SOURCE_CONFIG['attempt_timeout'], scope)
+            return source_name
+        slots.release()
+        return None
+
+    last_launched = launch_next()
+    try:
+        while pending:
+            timeout = max(0.0, min(expires for _, expires, _ in pending.values()) - time.monotonic())
+            hedge = next_index < len(data_sources) and not saturated
+            if hedge:
+                timeout = min(timeout, get_hedge_delay(last_launched))
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                # 超過 attempt_timeout 的來源取消並不再等待
+                now = time.monotonic()
+                expired = [future for future, (_, expires, _) in pending.items() if expires <= now]
+                for future in expired:
+                    source_name, _, scope = pending.pop(future)
+                    scope.cancel()
+                    print(f"⏱️ {source_name} 超過 {SOURCE_CONFIG['attempt_timeout']:g} 秒未回應，取消並改用其他來源")
+                if not expired and hedge:
+                    # 目前的來源逾時未回應，提前啟動下一個來源
+                    print(f"⏱️ {last_launched} 超過 {timeout:.2f} 秒未回應，同時嘗試下一個來源")
+                last_launched = launch_next() or last_launched
+                continue
+
+            for future in done:
+                source_name, _, _ = pending.pop(future)
+                try:
+                    data = future.result()
+                except CancelledError:
+                    print(f"⏱️ {source_name} 已逾時取消")
+                    continue
+                except Exception as e:
+                    print(f"❌ {source_name} 發生異常: {e}")
+                    continue
+                if is_valid(data):
+                    return source_name, data
+                print(f"⚠️ {source_name} 查無有效資料")
+
+            # 已完成的來源都失敗，立即啟動下一個
+            last_launched = launch_next() or last_launched
+
+        if next_index < len(data_sources):
+            # 執行緒池已滿而未啟動的來源
+            print("⚠️ 對沖執行緒已滿，其餘來源依序嘗試")
+            return _run_sequential(run, data_sources[next_index:], is_valid)
+        return None, None
+    finally:
+        # 落敗的來源：尚未開始的直接取消，執行中的取消其協程
+        for future, (source_name, _, scope) in pending.items():
+            if future.cancel():
+                get_breaker(source_name).cancel_probe()
+            else:
+                scope.cancel()
+
+
+def run_sources(data_sources, is_valid, hedged=None, kind=None):
+    """
+    執行多重資料來源，回傳第一個有效結果
+    :param data_sources: [(來源名稱, 無參數函式), ...]，依預設優先順序排列
+    :param is_valid: 判斷回傳資料是否有效的函式
+    :param hedged: 是否使用對沖模式，None 時依 SOURCE_CONFIG['hedge_enabled']
+    :param kind: 查詢類型（如 'stock'、'index'），指定時依學習結果動態排序
+    :return: (來源名稱, 資料)；全部失敗時回傳 (None, None)
+    """
+    if not data_sources:
+        return None, None
+
+    if hedged is None:
+        hedged = SOURCE_CONFIG['hedge_enabled']
+
+    if kind:
+        data_sources = order_sources(kind, data_sources)
+
+    run = _SourceRun(kind)
+    source_name, data = None, None
+    try:
+        if hedged and len(data_sources) > 1:
+            source_name, data = _run_hedged(run, data_sources, is_valid)
+        else:
+            source_name, data = _run_sequential(run, data_sources, is_valid)
+        return source_name, data
+    finally:
+        run.finish(source_name is not None)
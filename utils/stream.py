@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+即時報價串流 (Server-Sent Events)
+每個連線訂閱一組股票代碼，第一次送出完整欄位，之後只在報價更新時送出有變動的欄位：
+    event: quotes
+    data: {"2330": {"price": 1015.0, "change": 5.0, "change_percent": 0.5}}
+
+連線向報價發布中心（hub.py）訂閱，串流本身不查詢報價；同一代碼不論有多少連線，
+上游都只由發布中心定期查詢一次。
+
+每條連線在同步的 WSGI 伺服器中佔用一個工作執行緒，最長 max_duration 秒（之後由瀏覽器重新連線），
+部署時工作執行緒數量須大於同時開啟的串流數；每位使用者同時開啟的連線數以 max_streams_per_client 限制。
+"""
+
+import json
+import threading
+import time
+from .twse import clean_stock_code
+from .hub import subscribe
+
+# 串流設定
+STREAM_CONFIG = {
+    'heartbeat': 15,  # 沒有變動時送出保持連線註解的間隔秒數
+    'max_duration': 600,  # 單一連線的最長秒數，結束後由瀏覽器自動重新連線
+    'retry': 3000,  # 建議瀏覽器重新連線的等待毫秒數
+    'max_streams_per_client': 4,  # 每位使用者（未登入時以 IP 計）同時開啟的連線數上限
+}
+
+# 串流送出的報價欄位
+STREAM_FIELDS = ('price', 'open', 'high', 'low', 'prev_close', 'change', 'change_percent',
+                 'volume', 'shares', 'turnover', 'trades')
+
+
+_streams = {}  # 使用者 -> 開啟中的連線數
+_streams_lock = threading.Lock()
+
+
+def open_stream(client):
+    """
+    登記一條串流連線
+    :param client: 使用者識別字串
+    :return: 連線結束時呼叫的釋放函式（可重複呼叫）；超過 max_streams_per_client 時回傳 None
+    """
+    with _streams_lock:
+        if _streams.get(client, 0) >= STREAM_CONFIG['max_streams_per_client']:
+            return None
+        _streams[client] = _streams.get(client, 0) + 1
+
+    released = []
+
+    def release():
+        with _streams_lock:
+            if released:
+                return
+            released.append(True)
+            _streams[client] -= 1
+            if not _streams[client]:
+                del _streams[client]
+
+    return release
+
+
+def quote_fields(quote):
+    """Quote 轉為串流欄位字典（略過缺少的欄位，浮點數去除運算誤差）"""
+    fields = {}
+    for field in STREAM_FIELDS:
+        value = getattr(quote, field)
+        if value is not None:
+            fields[field] = round(value, 4) if isinstance(value, float) else value
+    return fields
+
+
+def diff_fields(previous, current):
+    """回傳 current 中與 previous 不同的欄位"""
+    return {field: value for field, value in current.items() if previous.get(field) != value}
+
+
+def format_event(data, event=None):
+    """組成一則 SSE 訊息"""
+    lines = [f"event: {event}"] if event else []
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def quote_events(stock_codes):
+    """
+    產生報價串流的 SSE 訊息
+    :param stock_codes: 股票代碼列表（訊息以原始代碼為鍵）
+    """
+    codes = {}  # 清理後代碼 -> 原始代碼
+    for stock_code in stock_codes:
+        codes.setdefault(clean_stock_code(stock_code), stock_code)
+
+    # 發布中心的回呼只保留每個代碼最新的報價，由串流執行緒取出送出（連線較慢時自動合併）
+    pending = {}
+    pending_lock = threading.Lock()
+    ready = threading.Event()
+
+    def on_quote(code, quote):
+        with pending_lock:
+            pending[code] = quote
+        ready.set()
+
+    subscription = subscribe(list(codes), on_quote)
+    sent = {}  # 代碼 -> 已送出的欄位
+    started = time.monotonic()
+    try:
+        yield f"retry: {STREAM_CONFIG['retry']}\n\n"
+        while time.monotonic() - started < STREAM_CONFIG['max_duration']:
+            if not ready.wait(STREAM_CONFIG['heartbeat']):
+                yield ": keepalive\n\n"
+                continue
+            ready.clear()
+            with pending_lock:
+                quotes = dict(pending)
+                pending.clear()
+
+            deltas = {}
+            for code, quote in quotes.items():
+                stock_code = codes.get(code, code)
+                fields = quote_fields(quote)
+                delta = diff_fields(sent.get(stock_code, {}), fields)
+                if delta:
+                    deltas[stock_code] = delta
+                    sent[stock_code] = fields
+            if deltas:
+                yield format_event(deltas, 'quotes')
+    finally:
+        subscription.close()
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+股票代碼主檔
+保存代碼、名稱、市場、產業別與上市狀態，啟動後只從磁碟載入一次，
+名稱查詢為記憶體字典查找，不需要任何網路請求。
+主檔由 refresh_symbol_master() 從證交所 ISIN 公告批次更新，背景輪詢於收盤後每日執行一次
+（ensure_symbol_master）；沒有完整主檔的行程第一次檢查代碼時也會在背景建立一次，也可手動執行：
+
+    python -m utils.symbols
+
+只有完整下載過上市、上櫃 ISIN 公告的主檔才標記為完整（is_master_complete），
+查詢過程中逐檔得知的名稱 (remember_symbol) 不會使主檔變成完整，
+因此不會因為主檔只有少數代碼而拒絕其他代碼；這些名稱延遲 save_delay 秒後寫回磁碟，重新啟動後仍然保留。
+寫回時與磁碟上的主檔合併（其他行程較新的完整更新優先），並定期檢查其他行程是否已更新主檔。
+"""
+
+import os
+import re
+import json
+import atexit
+import threading
+import time
+from datetime import datetime
+from .singleflight import FileLock
+
+SYMBOLS_FILE = os.path.join('cache', 'symbols.json')
+
+# 主檔設定
+SYMBOLS_CONFIG = {
+    'refresh_interval': 86400,  # 完整主檔的更新間隔秒數
+    'retry_interval': 3600,  # 更新失敗後再次嘗試的最短間隔秒數
+    'save_delay': 30,  # 得知新名稱後延遲寫回磁碟的秒數（合併多次新增）
+    'reload_interval': 60,  # 檢查其他行程是否已更新主檔檔案的間隔秒數
+}
+
+# 證交所 ISIN 公告頁面（strMode=2 上市、strMode=4 上櫃）
+ISIN_SOURCES = [
+    ('上市', 'https://isin.twse.com.tw/isin/C_public.jsp?strMode=2'),
+    ('上櫃', 'https://isin.twse.com.tw/isin/C_public.jsp?strMode=4'),
+]
+
+_symbols = None
+_complete = False  # 主檔是否來自完整的 ISIN 公告
+_refreshed_at = 0.0  # 最後一次完整更新的時間
+_loaded_mtime = None  # 載入時主檔檔案的修改時間
+_checked_at = 0.0  # 最後一次檢查主檔檔案的時間
+_last_attempt = None  # 最後一次嘗試更新的時間
+_save_timer = None
+_symbols_lock = threading.Lock()
+
+
+def _file_mtime():
+    try:
+        return os.stat(SYMBOLS_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _load_symbols():
+    """
+    從磁碟載入主檔
+    :return: (主檔, 是否完整, 最後完整更新時間)；舊版主檔檔案沒有完整標記，視為不完整
+    """
+    if not os.path.exists(SYMBOLS_FILE):
+        return {}, False, 0.0
+    try:
+        with open(SYMBOLS_FILE, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+        return payload.get('symbols', {}), bool(payload.get('complete')), payload.get('refreshed_at') or 0.0
+    except Exception as e:
+        print(f"❌ 讀取股票主檔失敗: {e}")
+        return {}, False, 0.0
+
+
+def _get_symbols():
+    """取得記憶體中的主檔（第一次呼叫時從磁碟載入，之後依 reload_interval 檢查檔案是否被其他行程更新）"""
+    global _symbols, _complete, _refreshed_at, _loaded_mtime, _checked_at
+
+    now = time.monotonic()
+    if _symbols is not None and now - _checked_at < SYMBOLS_CONFIG['reload_interval']:
+        return _symbols
+
+    with _symbols_lock:
+        if _symbols is None or now - _checked_at >= SYMBOLS_CONFIG['reload_interval']:
+            _checked_at = now
+            mtime = _file_mtime()
+            if _symbols is None or mtime != _loaded_mtime:
+                symbols, complete, refreshed_at = _load_symbols()
+                # 保留尚未寫回磁碟的名稱
+                for code, symbol in (_symbols or {}).items():
+                    symbols.setdefault(code, symbol)
+                _symbols = symbols
+                _complete = _complete or complete
+                _refreshed_at = max(_refreshed_at, refreshed_at)
+                _loaded_mtime = mtime
+    return _symbols
+
+
+def save_symbol_master():
+    """將記憶體中的主檔與磁碟上的主檔合併後寫回（磁碟上有較新的完整更新時以磁碟資料為準）"""
+    global _symbols, _complete, _refreshed_at, _loaded_mtime
+
+    symbols = _get_symbols()
+    os.makedirs(os.path.dirname(SYMBOLS_FILE), exist_ok=True)
+    tmp_file = f"{SYMBOLS_FILE}.{os.getpid()}.tmp"
+    try:
+        with FileLock('symbol_master'):
+            disk_symbols, disk_complete, disk_refreshed_at = _load_symbols()
+            with _symbols_lock:
+                if disk_refreshed_at > _refreshed_at:
+                    merged, extra = dict(disk_symbols), symbols
+                else:
+                    merged, extra = dict(symbols), disk_symbols
+                for code, symbol in extra.items():
+                    merged.setdefault(code, symbol)
+                _symbols = merged
+                _complete = _complete or disk_complete
+                _refreshed_at = max(_refreshed_at, disk_refreshed_at)
+                payload = {
+                    'updated_at': datetime.now().isoformat(),
+                    'refreshed_at': _refreshed_at,
+                    'complete': _complete,
+                    'symbols': dict(merged),
+                }
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(tmp_file, SYMBOLS_FILE)
+            _loaded_mtime = _file_mtime()
+    except Exception as e:
+        print(f"❌ 儲存股票主檔失敗: {e}")
+
+
+def _flush_learned():
+    """寫回查詢過程中得知的名稱"""
+    global _save_timer
+
+    with _symbols_lock:
+        _save_timer = None
+    save_symbol_master()
+
+
+def _schedule_save():
+    """save_delay 秒後寫回主檔（期間的多次新增只寫入一次）"""
+    global _save_timer
+
+    with _symbols_lock:
+        if _save_timer is not None:
+            return
+        _save_timer = threading.Timer(SYMBOLS_CONFIG['save_delay'], _flush_learned)
+        _save_timer.daemon = True
+        _save_timer.start()
+
+
+@atexit.register
+def _flush_on_exit():
+    """行程結束前寫回尚未儲存的名稱"""
+    timer = _save_timer
+    if timer is not None:
+        timer.cancel()
+        _flush_learned()
+
+
+def get_symbol(stock_code):
+    """查詢單一代碼的主檔資料，不存在時回傳 None"""
+    return _get_symbols().get(stock_code)
+
+
+def get_symbol_name(stock_code):
+    """查詢代碼的名稱，不存在時回傳 None"""
+    symbol = _get_symbols().get(stock_code)
+    return symbol['name'] if symbol else None
+
+
+def get_symbol_market(stock_code):
+    """查詢代碼的市場（上市/上櫃），不存在時回傳 None"""
+    symbol = _get_symbols().get(stock_code)
+    return symbol.get('market') if symbol else None
+
+
+def has_symbols():
+    """主檔是否已有資料（可能只有查詢過程中得知的少數代碼）"""
+    return bool(_get_symbols())
+
+
+def is_master_complete():
+    """主檔是否為完整的 ISIN 公告資料（只有完整主檔才能用來拒絕未知代碼）"""
+    _get_symbols()
+    return _complete
+
+
+def remember_symbol(stock_code, name, market=None):
+    """將查詢過程中得知的名稱加入主檔（不覆蓋既有資料），延遲寫回磁碟"""
+    if not stock_code or not name or name == stock_code:
+        return
+    symbols = _get_symbols()
+    if stock_code in symbols:
+        return
+    with _symbols_lock:
+        added = stock_code not in symbols
+        symbols.setdefault(stock_code, {
+            'code': stock_code,
+            'name': name,
+            'market': market,
+            'industry': None,
+            'status': 'listed',
+        })
+    if added:
+        _schedule_save()
+
+
+def parse_isin_page(html, market):
+    """解析 ISIN 公告頁面，回傳主檔資料列表"""
+    records = []
+    for row in re.findall(r'<tr[^>]*>(.*?)</tr>', html, re.S | re.I):
+        cells = [re.sub(r'<[^>]+>', '', cell).strip()
+                 for cell in re.findall(r'<td[^>]*>(.*?)</td>', row, re.S | re.I)]
+        # 資料列：有價證券代號及名稱、ISIN、上市日、市場別、產業別、CFICode、備註
+        if len(cells) < 6 or '　' not in cells[0]:
+            continue
+        # 只保留股票 (E) 與基金/ETF (C)，略過權證、債券等
+        if cells[5][:1] not in ('E', 'C'):
+            continue
+        code, name = cells[0].split('　', 1)
+        records.append({
+            'code': code.strip(),
+            'name': name.strip(),
+            'market': cells[3] or market,
+            'industry': cells[4] or None,
+            'listed_date': cells[2] or None,
+            'status': 'listed',
+        })
+    return records
+
+
+def refresh_symbol_master():
+    """
+    從證交所 ISIN 公告批次更新主檔並寫回磁碟
+    已不在公告中的代碼保留並標記為 delisted
+    :return: 本次取得的代碼數量
+    """
+    global _symbols, _complete, _refreshed_at
+    from .http_client import http_get
+
+    records = []
+    refreshed_markets = set()
+    for market, url in ISIN_SOURCES:
+        try:
+            print(f"📡 下載 {market} 股票主檔...")
+            resp = http_get(url, timeout=(5, 60))
+            resp.raise_for_status()
+            html = resp.content.decode('cp950', errors='ignore')
+            market_records = parse_isin_page(html, market)
+            if market_records:
+                records.extend(market_records)
+                refreshed_markets.add(market)
+        except Exception as e:
+            print(f"❌ 下載 {market} 股票主檔失敗: {e}")
+
+    if not records:
+        print("❌ 股票主檔無任何資料，保留原有主檔")
+        return 0
+
+    # 只有成功更新的市場才將舊代碼標記為下市
+    symbols = {code: dict(symbol) for code, symbol in _get_symbols().items()}
+    for symbol in symbols.values():
+        if symbol.get('market') in refreshed_markets:
+            symbol['status'] = 'delisted'
+    for record in records:
+        symbols[record['code']] = record
+
+    with _symbols_lock:
+        _symbols = symbols
+        # 所有市場都成功下載過一次之後主檔才算完整
+        if refreshed_markets == {market for market, _ in ISIN_SOURCES}:
+            _complete = True
+            _refreshed_at = time.time()
+    save_symbol_master()
+    print(f"✅ 股票主檔已更新，共 {len(records)} 檔")
+    return len(records)
+
+
+def symbol_master_due():
+    """完整主檔是否已超過 refresh_interval 未更新（更新失敗後 retry_interval 內不再嘗試）"""
+    _get_symbols()
+    if _last_attempt is not None and time.monotonic() - _last_attempt < SYMBOLS_CONFIG['retry_interval']:
+        return False
+    return time.time() - _refreshed_at >= SYMBOLS_CONFIG['refresh_interval']
+
+
+def ensure_symbol_master():
+    """
+    主檔到期時從 ISIN 公告更新一次（背景輪詢於非交易時段呼叫；尚無完整主檔時由 schedule_symbol_master 在背景呼叫）
+    跨行程以鎖檔序列化，取得鎖後重新讀取主檔檔案，其他行程剛更新過時不再下載
+    :return: 是否實際發出下載
+    """
+    global _last_attempt, _checked_at
+
+    if not symbol_master_due():
+        return False
+    with FileLock('symbol_master_refresh'):
+        _checked_at = 0.0
+        if not symbol_master_due():
+            return False
+        _last_attempt = time.monotonic()
+        refresh_symbol_master()
+    return True
+
+
+_refreshing = threading.Event()
+
+
+def schedule_symbol_master():
+    """
+    尚無完整主檔時在背景建立（不阻擋呼叫端；進行中或在重試間隔內時略過）
+    :return: 是否啟動背景更新
+    """
+    if is_master_complete() or not symbol_master_due() or _refreshing.is_set():
+        return False
+    _refreshing.set()
+
+    def run():
+        try:
+            ensure_symbol_master()
+        except Exception as e:
+            print(f"❌ 背景更新股票主檔失敗: {e}")
+        finally:
+            _refreshing.clear()
+
+    threading.Thread(target=run, name='symbol-master', daemon=True).start()
+    return True
+
+
+if __name__ == '__main__':
+    refresh_symbol_master()
@@ -1,19 +1,42 @@
 import os
-import requests
+import asyncio
 import pandas as pd
 from datetime import datetime, timedelta
-import json
 import time
 import re
+import hashlib
+from .http_client import http_get, async_http_get_json, run_sync
+from .sources import run_sources
+from .symbols import get_symbol, get_symbol_name, get_symbol_market, is_master_complete, remember_symbol, schedule_symbol_master
+from .singleflight import SingleFlight
+from .memory_cache import TTLCache
+from .quote import Quote, parse_number, parse_int, format_price, format_change, format_percent, format_volume
+from .history import ingest_stock_day
+from .intraday import record_mis
+from .cache_store import get_store
+from .market_calendar import now_taipei, market_phase, is_market_open, next_phase_change, AFTER_HOURS
+from concurrent.futures import ThreadPoolExecutor, wait
+import threading
 
 CACHE_DIR = 'cache'
 os.makedirs(CACHE_DIR, exist_ok=True)
 
 # 配置選項
 CONFIG = {
-    'timeout': 20,  # 增加超時時間
+    'connect_timeout': 5,  # 建立連線的逾時秒數
+    'read_timeout': 20,  # 讀取回應的逾時秒數
     'retry_times': 3,  # 增加重試次數
-    'cache_duration': 300,  # 縮短快取時間到5分鐘，獲取更新數據
+    'cache_duration': 300,  # 未指定存活時間的快取秒數（如股票名稱）
+    'session_cache_duration': 15,  # 盤中（含試撮與收盤集合競價）報價快取秒數
+    'after_hours_cache_duration': 300,  # 盤後定價交易時段的報價快取秒數
+    'batch_size': 30,  # 證交所即時報價單次請求的股票數量上限
+    'memory_cache_size': 2048,  # 記憶體快取的項目數上限
+    'memory_cache_ttl': 259200,  # 記憶體快取預設保留秒數（實際依各項目到期時間加上 max_staleness）
+    'max_staleness': 259200,  # 快取到期後仍可作為延遲資料沿用的秒數（3 天）
+    'refresh_workers': 4,  # 背景更新快取的執行緒數量
+    'fallback_workers': 8,  # 批次查無資料時，同時以多重資料來源逐檔查詢的執行緒數量
+    'negative_cache_duration': 600,  # 查詢失敗結果的快取秒數，避免錯誤代碼反覆查詢所有來源
+    'reject_unknown_symbols': True,  # 已有完整股票主檔時，直接拒絕不在主檔中的代碼
 }
 
 # 請求標頭
@@ -26,9 +49,107 @@ HEADERS = {
     'Pragma': 'no-cache',
 }
 
+# 證交所即時報價 (mis) 請求標頭
+MIS_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Referer': 'https://mis.twse.com.tw/',
+    'Accept': 'application/json'
+}
 
-def get_stock_from_yahoo(stock_code):
-    """從 Yahoo Finance 獲取股票資料（備用方案）"""
+# SQLite 快取前的記憶體快取
+_memory_cache = TTLCache(CONFIG['memory_cache_size'], CONFIG['memory_cache_ttl'])
+_store = get_store()
+
+# 背景更新過期快取（同一快取鍵同時只排程一次）
+_refresh_executor = ThreadPoolExecutor(max_workers=CONFIG['refresh_workers'], thread_name_prefix='refresh')
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+# 批次查無資料的代碼同時改用多重資料來源查詢
+_fallback_executor = ThreadPoolExecutor(max_workers=CONFIG['fallback_workers'], thread_name_prefix='fallback')
+
+# 快取寫入通知（見 add_cache_listener）
+_cache_listeners = []
+
+# 期限內尚未取得的報價（查詢仍在背景進行，完成後寫入快取）
+PENDING_STATUS = '載入中'
+
+# 有期限的批次查詢中，仍在背景進行的代碼（代碼 -> Future），同一代碼同時只查詢一次
+_deferred = {}
+_deferred_lock = threading.Lock()
+
+# 查詢失敗與拒絕查詢的統計
+_negative_stats = {
+    'negative_hits': 0,  # 命中失敗快取，未發出上游查詢
+    'negative_stores': 0,  # 寫入失敗快取
+    'unknown_rejected': 0,  # 不在股票主檔中而被拒絕
+    'delisted_rejected': 0,  # 已下市而被拒絕
+}
+_negative_stats_lock = threading.Lock()
+
+# 合併同一快取鍵同時發生的上游查詢
+_singleflight = SingleFlight()
+
+# 進行中的非同步名稱查詢（事件迴圈內共用）
+_name_tasks = {}
+
+# 備用：常見股票的預設名稱（只保留最常見的）
+COMMON_STOCK_NAMES = {
+    '2330': '台積電',
+    '2317': '鴻海', 
+    '2454': '聯發科',
+    '0050': '元大台灣50',
+    '0056': '元大高股息',
+    '006208': '富邦台50',
+    '00878': '國泰永續高股息',
+    '00919': '群益台灣精選高息',
+}
+
+
+def get_timeout(read_timeout=None):
+    """取得 (連線逾時, 讀取逾時) 設定"""
+    return (CONFIG['connect_timeout'], read_timeout or CONFIG['read_timeout'])
+
+
+def _parse_yahoo_chart(stock_code, meta, name):
+    """將 Yahoo Finance chart API 的 meta 資料轉換為 Quote"""
+    prev_close = (meta.get('regularMarketPreviousClose') or meta.get('previousClose') or
+                  meta.get('chartPreviousClose'))
+    return Quote(
+        stock_code,
+        name,
+        price=meta.get('regularMarketPrice') or None,
+        open=meta.get('regularMarketOpen') or None,
+        high=meta.get('regularMarketDayHigh') or None,
+        low=meta.get('regularMarketDayLow') or None,
+        prev_close=prev_close if prev_close and prev_close > 0 else None,
+        volume=meta.get('regularMarketVolume') or None,
+        source='yahoo',
+    )
+
+
+def _apply_yahoo_quote(quote, quote_data):
+    """以 Yahoo Finance quote API 的資料補齊缺少的欄位，回傳新的 Quote"""
+    if quote_data.get('quoteResponse') and quote_data['quoteResponse'].get('result'):
+        quote_result = quote_data['quoteResponse']['result'][0]
+        
+        changes = {}
+        if quote_result.get('regularMarketOpen') and quote.open is None:
+            changes['open'] = quote_result['regularMarketOpen']
+        if quote_result.get('regularMarketChange') and quote.change is None:
+            changes['change'] = quote_result['regularMarketChange']
+        if quote_result.get('regularMarketChangePercent') and quote.change_percent is None:
+            changes['change_percent'] = quote_result['regularMarketChangePercent']
+        if changes:
+            return quote.replace(**changes)
+    return quote
+
+
+async def async_get_stock_from_yahoo(stock_code):
+    """
+    從 Yahoo Finance 獲取股票資料（備用方案，非同步版本）
+    查無資料（含 404）時回傳 None；連線或其他 HTTP 錯誤拋出例外，交給多重來源執行器計入斷路器
+    """
     try:
         # 台股在 Yahoo Finance 的格式
         if not stock_code.endswith('.TW'):
@@ -38,83 +159,25 @@ def get_stock_from_yahoo(stock_code):
             
         url = f"https://query1.finance.yahoo.com/v8/finance/chart/{yahoo_symbol}"
         
-        resp = requests.get(url, timeout=CONFIG['timeout'], headers=HEADERS)
-        resp.raise_for_status()
-        data = resp.json()
+        status, data = await async_http_get_json(url, get_timeout(), headers=HEADERS, raise_for_status=False)
+        if status == 404:
+            print(f"❌ Yahoo Finance 查無資料: {stock_code}")
+            return None
+        if data is None:
+            raise RuntimeError(f"Yahoo Finance HTTP {status}")
         
         if data.get('chart') and data['chart'].get('result'):
             result = data['chart']['result'][0]
             meta = result.get('meta', {})
-            
-            # 基本股價資訊
-            current_price = meta.get('regularMarketPrice', 0)
-            previous_close = meta.get('regularMarketPreviousClose', 0)
-            open_price = meta.get('regularMarketOpen', 0)
-            high_price = meta.get('regularMarketDayHigh', 0)
-            low_price = meta.get('regularMarketDayLow', 0)
-            volume = meta.get('regularMarketVolume', 0)
-            
-            stock_info = {
-                '股票代碼': stock_code,
-                '股票名稱': get_stock_name(stock_code),
-                '即時股價': f"{current_price:.2f}" if current_price else "N/A",
-                '收盤價': f"{current_price:.2f}" if current_price else "N/A",
-                '開盤價': f"{open_price:.2f}" if open_price else "N/A",
-                '最高價': f"{high_price:.2f}" if high_price else "N/A",
-                '最低價': f"{low_price:.2f}" if low_price else "N/A",
-                '成交量': f"{volume:,}" if volume else "N/A",
-            }
-            
-            # 計算漲跌
-            if previous_close and current_price and previous_close > 0:
-                change = current_price - previous_close
-                change_percent = (change / previous_close) * 100
-                stock_info['漲跌價差'] = f"{change:+.2f}"
-                stock_info['漲跌幅'] = f"{change_percent:+.2f}%"
-            else:
-                stock_info['漲跌價差'] = "N/A"
-                stock_info['漲跌幅'] = "N/A"
-            
-            # 嘗試從 meta 資料中獲取更完整的資訊
-            try:
-                # 從 meta 中獲取開盤價
-                if meta.get('regularMarketOpen'):
-                    stock_info['開盤價'] = f"{meta['regularMarketOpen']:.2f}"
-                
-                # 如果 meta 中有昨收和當前價格，重新計算漲跌
-                prev_close_meta = meta.get('regularMarketPreviousClose') or meta.get('previousClose') or meta.get('chartPreviousClose')
-                current_price_meta = meta.get('regularMarketPrice')
-                
-                if prev_close_meta and current_price_meta and prev_close_meta > 0:
-                    change = current_price_meta - prev_close_meta
-                    change_percent = (change / prev_close_meta) * 100
-                    
-                    stock_info['漲跌價差'] = f"{change:+.2f}"
-                    stock_info['漲跌幅'] = f"{change_percent:+.2f}%"
-                    print(f"💹 計算漲跌: 目前價格={current_price_meta}, 昨收={prev_close_meta}, 漲跌={change:+.2f}")
-                    
-            except Exception as e:
-                print(f"⚠️ 處理 meta 資料失敗: {e}")
+            stock_info = _parse_yahoo_chart(stock_code, meta, await async_get_stock_name(stock_code))
             
             # 嘗試獲取更多資料（備用方案）
             try:
                 # 從 quote 資料中獲取
                 quote_url = f"https://query1.finance.yahoo.com/v7/finance/quote?symbols={yahoo_symbol}"
-                quote_resp = requests.get(quote_url, timeout=5, headers=HEADERS)
-                
-                if quote_resp.status_code == 200:
-                    quote_data = quote_resp.json()
-                    
-                    if quote_data.get('quoteResponse') and quote_data['quoteResponse'].get('result'):
-                        quote_result = quote_data['quoteResponse']['result'][0]
-                        
-                        # 更新開盤價等資料
-                        if quote_result.get('regularMarketOpen') and stock_info.get('開盤價') == "N/A":
-                            stock_info['開盤價'] = f"{quote_result['regularMarketOpen']:.2f}"
-                        if quote_result.get('regularMarketChange') and stock_info.get('漲跌價差') == "N/A":
-                            stock_info['漲跌價差'] = f"{quote_result['regularMarketChange']:+.2f}"
-                        if quote_result.get('regularMarketChangePercent') and stock_info.get('漲跌幅') == "N/A":
-                            stock_info['漲跌幅'] = f"{quote_result['regularMarketChangePercent']:+.2f}%"
+                _, quote_data = await async_http_get_json(quote_url, get_timeout(5), headers=HEADERS, raise_for_status=False)
+                if quote_data:
+                    stock_info = _apply_yahoo_quote(stock_info, quote_data)
                         
             except Exception as e:
                 print(f"⚠️ 獲取 Quote 資料失敗: {e}")
@@ -124,78 +187,98 @@ def get_stock_from_yahoo(stock_code):
             
     except Exception as e:
         print(f"Yahoo Finance 獲取失敗: {e}")
+        raise
+
+
+def get_stock_from_yahoo(stock_code):
+    """從 Yahoo Finance 獲取股票資料（備用方案）"""
+    return run_sync(async_get_stock_from_yahoo(stock_code))
+
+
+def _parse_twse_stock_day(stock_code, data, name):
+    """將證交所 STOCK_DAY 回應中最新一天的資料轉換為 Quote"""
+    # 欄位：日期、成交股數、成交金額、開盤價、最高價、最低價、收盤價、漲跌價差、成交筆數
+    latest_data = list(data['data'][-1]) + [None] * 9
+    return Quote(
+        stock_code,
+        name,
+        price=parse_number(latest_data[6]),
+        open=parse_number(latest_data[3]),
+        high=parse_number(latest_data[4]),
+        low=parse_number(latest_data[5]),
+        change=parse_number(latest_data[7]),  # 無比價時為 "X0.00"，解析為 None
+        shares=parse_int(latest_data[1]),
+        turnover=parse_int(latest_data[2]),
+        trades=parse_int(latest_data[8]),
+        trade_date=latest_data[0],
+        source='twse_stock_day',
+    )
+
+
+async def async_get_stock_day(stock_code, date=None):
+    """
+    獲取證交所 STOCK_DAY 的原始回應（該日期所在月份的每日成交資訊，非同步版本）
+    :param date: 'YYYYMMDD'，預設為今天
+    :return: JSON 回應，查無資料時回傳 None；所有網址都發生錯誤時拋出最後一個例外
+    """
+    date = date or datetime.now().strftime('%Y%m%d')
+    # 嘗試不同的證交所 API
+    urls = [
+        f"https://www.twse.com.tw/rwd/zh/afterTrading/STOCK_DAY?date={date}&stockNo={stock_code}&response=json",
+        f"https://www.twse.com.tw/exchangeReport/STOCK_DAY?response=json&date={date}&stockNo={stock_code}",
+    ]
+    
+    last_error = None
+    for url in urls:
+        try:
+            print(f"嘗試證交所 API: {stock_code}")
+            _, data = await async_http_get_json(url, get_timeout(), headers=HEADERS)
+        except Exception as e:
+            print(f"證交所 API 嘗試失敗: {e}")
+            last_error = e
+            continue
+        if data.get('stat') == 'OK' and data.get('data'):
+            return data
+        # 正常回應但查無資料（如代碼不存在或非上市股票），不需再試其他網址
         return None
+    raise last_error
 
 
-def get_stock_from_twse_api(stock_code):
-    """從證交所 API 獲取股票資料"""
+def get_stock_day(stock_code, date=None):
+    """獲取證交所 STOCK_DAY 的原始回應"""
+    return run_sync(async_get_stock_day(stock_code, date))
+
+
+def _ingest_history(stock_code, data):
+    """將 STOCK_DAY 回應寫入本地歷史資料（失敗不影響報價查詢）"""
+    try:
+        ingest_stock_day(stock_code, data)
+    except Exception as e:
+        print(f"⚠️ 寫入歷史資料失敗 {stock_code}: {e}")
+
+
+async def async_get_stock_from_twse_api(stock_code):
+    """從證交所 API 獲取股票資料（非同步版本）"""
     try:
-        # 嘗試不同的證交所 API
-        urls = [
-            f"https://www.twse.com.tw/rwd/zh/afterTrading/STOCK_DAY?date={datetime.now().strftime('%Y%m%d')}&stockNo={stock_code}&response=json",
-            f"https://www.twse.com.tw/exchangeReport/STOCK_DAY?response=json&date={datetime.now().strftime('%Y%m%d')}&stockNo={stock_code}",
-        ]
+        data = await async_get_stock_day(stock_code)
+        if not data:
+            return None
         
-        for url in urls:
-            try:
-                print(f"嘗試證交所 API: {stock_code}")
-                resp = requests.get(url, timeout=CONFIG['timeout'], headers=HEADERS)
-                resp.raise_for_status()
-                data = resp.json()
-                
-                if data.get('stat') == 'OK' and data.get('data'):
-                    # 取最新一天的資料
-                    latest_data = data['data'][-1]
-                    fields = data.get('fields', [])
-                    
-                    stock_info = {
-                        '股票代碼': stock_code,
-                        '股票名稱': get_stock_name(stock_code),
-                    }
-                    
-                    # 對應欄位
-                    field_mapping = {
-                        '日期': 0,
-                        '成交股數': 1,
-                        '成交金額': 2,
-                        '開盤價': 3,
-                        '最高價': 4,
-                        '最低價': 5,
-                        '收盤價': 6,
-                        '漲跌價差': 7,
-                        '成交筆數': 8
-                    }
-                    
-                    for field_name, index in field_mapping.items():
-                        if index < len(latest_data):
-                            stock_info[field_name] = latest_data[index]
-                    
-                    # 計算漲跌幅
-                    try:
-                        close_price = float(stock_info.get('收盤價', '0').replace(',', ''))
-                        change_str = stock_info.get('漲跌價差', '0')
-                        if change_str and change_str != '--':
-                            change = float(change_str.replace(',', ''))
-                            if close_price > 0:
-                                prev_close = close_price - change
-                                if prev_close > 0:
-                                    change_percent = (change / prev_close) * 100
-                                    stock_info['漲跌幅'] = f"{change_percent:+.2f}%"
-                    except:
-                        stock_info['漲跌幅'] = "N/A"
-                    
-                    print(f"✅ 證交所 API 成功獲取 {stock_code} 資料")
-                    return stock_info
-                    
-            except Exception as e:
-                print(f"證交所 API 嘗試失敗: {e}")
-                continue
-                
-        return None
+        # 整個月的資料順便寫入歷史資料（檔案 I/O 交給執行緒池，不阻塞事件迴圈）
+        asyncio.get_running_loop().run_in_executor(None, _ingest_history, stock_code, data)
+        
+        stock_info = _parse_twse_stock_day(stock_code, data, await async_get_stock_name(stock_code))
+        print(f"✅ 證交所 API 成功獲取 {stock_code} 資料")
+        return stock_info
         
     except Exception as e:
         print(f"證交所 API 整體失敗: {e}")
-        return None
+        raise
+
+
+def get_stock_from_twse_api(stock_code):
+    """從證交所 API 獲取股票資料"""
+    return run_sync(async_get_stock_from_twse_api(stock_code))
 
 
 def get_stock_from_alternative_api(stock_code):
@@ -204,95 +287,75 @@ def get_stock_from_alternative_api(stock_code):
         # 嘗試 Fugle API (免費版)
         url = f"https://api.fugle.tw/realtime/v0.3/intraday/quote?symbolId={stock_code}"
         
-        resp = requests.get(url, timeout=CONFIG['timeout'], headers=HEADERS)
+        resp = http_get(url, timeout=get_timeout(), headers=HEADERS)
+        if resp.status_code == 404:
+            return None
+        resp.raise_for_status()
         if resp.status_code == 200:
             data = resp.json()
             if data.get('data'):
                 quote = data['data']
-                stock_info = {
-                    '股票代碼': stock_code,
-                    '股票名稱': get_stock_name(stock_code),
-                    '收盤價': f"{quote.get('price', 0):.2f}",
-                    '開盤價': f"{quote.get('open', 0):.2f}",
-                    '最高價': f"{quote.get('high', 0):.2f}",
-                    '最低價': f"{quote.get('low', 0):.2f}",
-                    '成交量': f"{quote.get('volume', 0):,}",
-                    '漲跌價差': f"{quote.get('change', 0):+.2f}",
-                    '漲跌幅': f"{quote.get('changePercent', 0):+.2f}%",
-                }
+                stock_info = Quote(
+                    stock_code,
+                    get_stock_name(stock_code),
+                    price=parse_number(quote.get('price')),
+                    open=parse_number(quote.get('open')),
+                    high=parse_number(quote.get('high')),
+                    low=parse_number(quote.get('low')),
+                    volume=parse_int(quote.get('volume')),
+                    change=parse_number(quote.get('change')),
+                    change_percent=parse_number(quote.get('changePercent')),
+                    source='fugle',
+                )
                 print(f"✅ 替代 API 成功獲取 {stock_code} 資料")
                 return stock_info
                 
     except Exception as e:
         print(f"替代 API 獲取失敗: {e}")
+        raise
         
     return None
 
 
-def get_stock_from_twse_realtime(stock_code):
-    """從證交所即時報價獲取資料"""
+def get_mis_channel(stock_code):
+    """依股票主檔的市場別組出證交所即時報價的頻道名稱（上櫃為 otc_，其餘為 tse_）"""
+    prefix = 'otc' if get_symbol_market(stock_code) == '上櫃' else 'tse'
+    return f"{prefix}_{stock_code}.tw"
+
+
+def _parse_twse_realtime(stock_code, stock_data, name):
+    """將證交所即時報價 msgArray 中的單筆資料轉換為 Quote（尚無成交時價格為 None）"""
+    def positive(value):
+        number = parse_number(value)
+        return number if number else None
+    
+    return Quote(
+        stock_code,
+        name,
+        price=positive(stock_data.get('z')),  # 目前成交價
+        open=positive(stock_data.get('o')),
+        high=positive(stock_data.get('h')),
+        low=positive(stock_data.get('l')),
+        prev_close=positive(stock_data.get('y')),  # 昨日收盤價
+        volume=parse_int(stock_data.get('v')) or None,  # 累積成交量（張）
+        source='twse_mis',
+    )
+
+
+async def async_get_stock_from_twse_realtime(stock_code):
+    """從證交所即時報價獲取資料（非同步版本）"""
     try:
         # 證交所即時報價 API
-        url = f"https://mis.twse.com.tw/stock/api/getStockInfo.jsp?ex_ch=tse_{stock_code}.tw"
+        url = f"https://mis.twse.com.tw/stock/api/getStockInfo.jsp?ex_ch={get_mis_channel(stock_code)}"
         
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Referer': 'https://mis.twse.com.tw/',
-            'Accept': 'application/json'
-        }
-        
-        resp = requests.get(url, timeout=CONFIG['timeout'], headers=headers)
-        resp.raise_for_status()
-        data = resp.json()
+        _, data = await async_http_get_json(url, get_timeout(), headers=MIS_HEADERS)
         
         if data.get('msgArray') and len(data['msgArray']) > 0:
             stock_data = data['msgArray'][0]
-            
-            # 獲取各項資料
-            current_price = stock_data.get('z', '0')    # 目前價格
-            open_price = stock_data.get('o', '0')       # 開盤價
-            high_price = stock_data.get('h', '0')       # 最高價
-            low_price = stock_data.get('l', '0')        # 最低價
-            volume = stock_data.get('v', '0')           # 成交量
-            name = stock_data.get('n', '')              # 股票名稱
-            prev_close = stock_data.get('y', '0')       # 昨日收盤價
-            
-            stock_info = {
-                '股票代碼': stock_code,
-                '股票名稱': name if name else get_stock_name(stock_code),
-                '即時股價': current_price if current_price != '0' else "N/A",
-                '收盤價': current_price if current_price != '0' else "N/A",  # 即時股價也是收盤價
-                '開盤價': open_price if open_price != '0' else "N/A",
-                '最高價': high_price if high_price != '0' else "N/A",
-                '最低價': low_price if low_price != '0' else "N/A",
-                '成交量': f"{int(volume):,}" if volume and volume != '0' else "N/A",
-            }
-            
-            # 計算漲跌資料
-            try:
-                if prev_close and prev_close != '0' and current_price and current_price != '0':
-                    prev_val = float(prev_close)
-                    curr_val = float(current_price)
-                    
-                    # 計算漲跌價差
-                    change_val = curr_val - prev_val
-                    stock_info['漲跌價差'] = f"{change_val:+.2f}"
-                    
-                    # 計算漲跌幅
-                    if prev_val > 0:
-                        change_percent = (change_val / prev_val) * 100
-                        stock_info['漲跌幅'] = f"{change_percent:+.2f}%"
-                    else:
-                        stock_info['漲跌幅'] = "N/A"
-                else:
-                    stock_info['漲跌價差'] = "N/A"
-                    stock_info['漲跌幅'] = "N/A"
-                    
-            except Exception as e:
-                print(f"⚠️ 漲跌計算錯誤: {e}")
-                stock_info['漲跌價差'] = "N/A"
-                stock_info['漲跌幅'] = "N/A"
-            
+            remember_symbol(stock_code, stock_data.get('n', '').strip())
+            name = stock_data.get('n', '') or await async_get_stock_name(stock_code)
+            stock_info = _parse_twse_realtime(stock_code, stock_data, name)
+            record_mis(stock_code, stock_data)
             print(f"✅ 證交所即時報價成功獲取 {stock_code} 資料")
             return stock_info
         else:
@@ -301,69 +364,203 @@ def get_stock_from_twse_realtime(stock_code):
             
     except Exception as e:
         print(f"證交所即時報價獲取失敗: {e}")
+        raise
+
+
+def get_stock_from_twse_realtime(stock_code):
+    """從證交所即時報價獲取資料"""
+    return run_sync(async_get_stock_from_twse_realtime(stock_code))
+
+
+async def async_get_stocks_from_twse_realtime(stock_codes):
+    """
+    從證交所即時報價一次獲取多檔股票資料（非同步版本）
+    :param stock_codes: 股票代碼列表（單次請求的數量由呼叫端控制）
+    :return: dict，股票代碼 -> 股票資訊；查無資料的代碼不會出現在結果中
+    """
+    if not stock_codes:
+        return {}
+    
+    try:
+        # 多個頻道以 | 串接，單一請求即可取回整批報價
+        channels = '|'.join(get_mis_channel(code) for code in stock_codes)
+        url = f"https://mis.twse.com.tw/stock/api/getStockInfo.jsp?ex_ch={channels}"
+        
+        _, data = await async_http_get_json(url, get_timeout(), headers=MIS_HEADERS)
+        
+        wanted = set(stock_codes)
+        results = {}
+        for stock_data in data.get('msgArray') or []:
+            code = (stock_data.get('c') or '').strip()
+            if code in wanted:
+                remember_symbol(code, stock_data.get('n', '').strip())
+                name = stock_data.get('n', '') or await async_get_stock_name(code)
+                results[code] = _parse_twse_realtime(code, stock_data, name)
+                record_mis(code, stock_data)
+        
+        print(f"✅ 證交所即時報價批次獲取 {len(results)}/{len(stock_codes)} 檔資料")
+        return results
+        
+    except Exception as e:
+        print(f"證交所即時報價批次獲取失敗: {e}")
+        return {}
+
+
+async def async_get_stocks_in_batches(stock_codes):
+    """將股票代碼依 CONFIG['batch_size'] 分批，同時送出所有批次請求並合併結果"""
+    batch_size = max(1, CONFIG['batch_size'])
+    batches = [stock_codes[start:start + batch_size] for start in range(0, len(stock_codes), batch_size)]
+    
+    results = {}
+    for batch_result in await asyncio.gather(*(async_get_stocks_from_twse_realtime(batch) for batch in batches)):
+        results.update(batch_result)
+    return results
+
+
+def get_stocks_from_twse_realtime(stock_codes):
+    """
+    從證交所即時報價一次獲取多檔股票資料
+    :param stock_codes: 股票代碼列表（單次請求的數量由呼叫端控制）
+    :return: dict，股票代碼 -> 股票資訊；查無資料的代碼不會出現在結果中
+    """
+    return run_sync(async_get_stocks_from_twse_realtime(stock_codes))
+
+
+def _parse_twse_market(market_data):
+    """將證交所即時報價的指數資料轉換為大盤資訊字典"""
+    current_index = market_data.get('z', '0')   # 目前指數
+    prev_close = market_data.get('y', '0')      # 昨收指數
+    name = market_data.get('n', '')             # 指數名稱
+    
+    try:
+        if current_index and current_index not in ['0', '-'] and prev_close and prev_close not in ['0', '-']:
+            curr_val = float(current_index)
+            prev_val = float(prev_close)
+            
+            # 計算漲跌點數
+            change_val = curr_val - prev_val
+            
+            # 計算漲跌幅
+            change_percent = (change_val / prev_val) * 100 if prev_val > 0 else 0
+            
+            market_info = {
+                '指數': f"{curr_val:,.2f}",
+                '漲跌點數': f"{change_val:+.2f}",
+                '漲跌幅': f"{change_percent:+.2f}%",
+                '成交量': "N/A",  # 大盤通常不提供成交量
+                '更新時間': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                '指數名稱': name if name else "台股指數"
+            }
+            
+            print("✅ 證交所成功獲取大盤資料")
+            return market_info
+        else:
+            print("❌ 證交所大盤指數資料無效")
+            return None
+            
+    except ValueError as e:
+        print(f"❌ 證交所大盤資料轉換錯誤: {e}")
         return None
 
 
-def get_market_from_twse():
-    """從證交所獲取大盤即時資訊"""
+async def async_get_market_from_twse():
+    """從證交所獲取大盤即時資訊（非同步版本）"""
     try:
         # 證交所大盤即時資訊 - 使用寶島股價指數
         url = "https://mis.twse.com.tw/stock/api/getStockInfo.jsp?ex_ch=tse_FRMSA.tw|otc_FRMSA.tw"
         
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Referer': 'https://mis.twse.com.tw/',
-            'Accept': 'application/json'
-        }
-        
-        resp = requests.get(url, timeout=CONFIG['timeout'], headers=headers)
-        resp.raise_for_status()
-        data = resp.json()
+        _, data = await async_http_get_json(url, get_timeout(), headers=MIS_HEADERS)
         
         if data.get('msgArray') and len(data['msgArray']) > 0:
             # 第一個是寶島股價指數
-            market_data = data['msgArray'][0]
-            
-            current_index = market_data.get('z', '0')   # 目前指數
-            prev_close = market_data.get('y', '0')      # 昨收指數
-            name = market_data.get('n', '')             # 指數名稱
-            
-            try:
-                if current_index and current_index not in ['0', '-'] and prev_close and prev_close not in ['0', '-']:
-                    curr_val = float(current_index)
-                    prev_val = float(prev_close)
-                    
-                    # 計算漲跌點數
-                    change_val = curr_val - prev_val
-                    
-                    # 計算漲跌幅
-                    change_percent = (change_val / prev_val) * 100 if prev_val > 0 else 0
-                    
-                    market_info = {
-                        '指數': f"{curr_val:,.2f}",
-                        '漲跌點數': f"{change_val:+.2f}",
-                        '漲跌幅': f"{change_percent:+.2f}%",
-                        '成交量': "N/A",  # 大盤通常不提供成交量
-                        '更新時間': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                        '指數名稱': name if name else "台股指數"
-                    }
-                    
-                    print("✅ 證交所成功獲取大盤資料")
-                    return market_info
-                else:
-                    print("❌ 證交所大盤指數資料無效")
-                    return None
-                    
-            except ValueError as e:
-                print(f"❌ 證交所大盤資料轉換錯誤: {e}")
-                return None
+            return _parse_twse_market(data['msgArray'][0])
         else:
             print("❌ 證交所大盤無資料")
             return None
             
     except Exception as e:
         print(f"證交所大盤獲取失敗: {e}")
+        raise
+
+
+def get_market_from_twse():
+    """從證交所獲取大盤即時資訊"""
+    return run_sync(async_get_market_from_twse())
+
+
+def clean_stock_code(stock_code):
+    """清理股票代碼，移除空格和非數字字符（保留字母）"""
+    return re.sub(r'[^\w]', '', stock_code.strip())
+
+
+def _count(stat, enabled=True):
+    if enabled:
+        with _negative_stats_lock:
+            _negative_stats[stat] += 1
+
+
+def reject_stock_code(stock_code, count=True):
+    """
+    在發出任何網路請求前檢查代碼，應拒絕時回傳錯誤資訊，否則回傳 None
+    代碼為空，或完整的股票主檔（見 is_master_complete）查無此代碼或已下市時拒絕；
+    尚無完整主檔時不拒絕，並在背景下載一次主檔（之後的查詢即可拒絕未知代碼）
+    :param count: 是否計入拒絕統計（背景作業篩選代碼時不計入）
+    """
+    if not stock_code:
+        _count('unknown_rejected', count)
+        return {'股票代碼': stock_code, '股票名稱': stock_code, '錯誤': '請輸入有效的股票代碼'}
+    
+    if not CONFIG['reject_unknown_symbols']:
+        return None
+    if not is_master_complete():
+        schedule_symbol_master()
         return None
+    
+    symbol = get_symbol(stock_code)
+    if symbol is None:
+        _count('unknown_rejected', count)
+        return {'股票代碼': stock_code, '股票名稱': stock_code, '錯誤': f'查無股票代碼 {stock_code}'}
+    if symbol.get('status') == 'delisted':
+        _count('delisted_rejected', count)
+        return {
+            '股票代碼': stock_code,
+            '股票名稱': symbol['name'],
+            '錯誤': f"股票 {stock_code} {symbol['name']} 已下市或終止上市"
+        }
+    return None
+
+
+def get_negative_cache(stock_code):
+    """取得代碼的失敗快取，不存在或已過期時回傳 None"""
+    error_result = get_cache(f"neg_stock_{stock_code}")
+    if error_result:
+        _count('negative_hits')
+    return error_result
+
+
+def save_negative_cache(stock_code, error_result):
+    """寫入失敗快取，存活 CONFIG['negative_cache_duration'] 秒"""
+    save_cache(f"neg_stock_{stock_code}", error_result, ttl=CONFIG['negative_cache_duration'])
+    _count('negative_stores')
+
+
+def get_negative_stats():
+    """取得失敗快取與拒絕查詢的統計"""
+    with _negative_stats_lock:
+        return dict(_negative_stats)
+
+
+def is_valid_stock_data(stock_data):
+    """檢查股票資訊是否包含有效股價"""
+    if isinstance(stock_data, Quote):
+        return stock_data.is_valid()
+    # 錯誤訊息字典
+    return False
+
+
+def is_valid_market_data(market_info):
+    """檢查大盤資訊是否有效"""
+    return bool(market_info) and not market_info.get('錯誤')
 
 
 def get_stock_basic_info(stock_code):
@@ -373,7 +570,7 @@ def get_stock_basic_info(stock_code):
     :return: dict 包含股票基本資訊
     """
     # 清理股票代碼，移除空格和非數字字符（保留字母）
-    clean_code = re.sub(r'[^\w]', '', stock_code.strip())
+    clean_code = clean_stock_code(stock_code)
     
     # 檢查快取
     cache_key = f"stock_basic_{clean_code}"
@@ -382,9 +579,30 @@ def get_stock_basic_info(stock_code):
         print(f"🔄 使用快取資料: {clean_code}")
         return cached_data
     
+    # 快取已過期但仍在容許範圍內：立即回傳舊資料，背景更新
+    stale_data = get_stale_cache(cache_key)
+    if stale_data:
+        print(f"🔄 使用延遲資料並於背景更新: {clean_code}")
+        schedule_refresh(cache_key, lambda: _fetch_stock_basic_info(clean_code, cache_key))
+        return stale_data
+    
+    # 不存在的代碼與近期查詢失敗的代碼不再向上游查詢
+    error_result = reject_stock_code(clean_code) or get_negative_cache(clean_code)
+    if error_result:
+        print(f"🚫 略過查詢: {error_result['錯誤']}")
+        return error_result
+    
+    # 同一檔股票同時只發出一組上游查詢，其他請求等待共用結果
+    return _singleflight.do(cache_key,
+                            lambda: _fetch_stock_basic_info(clean_code, cache_key),
+                            recheck=lambda: get_cache(cache_key))
+
+
+def _fetch_stock_basic_info(clean_code, cache_key):
+    """依多重資料來源獲取個股資訊並寫入快取，全部失敗時沿用最後一次的有效資料"""
     print(f"🔍 開始獲取股票 {clean_code} 的即時資料...")
     
-    # 多重資料來源策略 - 優先使用證交所
+    # 多重資料來源策略 - 預設優先使用證交所，執行時依各來源的實際表現調整順序
     data_sources = [
         ("證交所即時報價", lambda: get_stock_from_twse_realtime(clean_code)),
         ("Yahoo Finance", lambda: get_stock_from_yahoo(clean_code)),
@@ -392,56 +610,200 @@ def get_stock_basic_info(stock_code):
         ("替代 API", lambda: get_stock_from_alternative_api(clean_code)),
     ]
     
-    for source_name, get_data_func in data_sources:
-        try:
-            print(f"📡 嘗試 {source_name}...")
-            stock_data = get_data_func()
-            
-            if stock_data and not stock_data.get('錯誤'):
-                # 檢查是否有有效的股價資料
-                realtime_price = stock_data.get('即時股價', 'N/A')
-                close_price = stock_data.get('收盤價', 'N/A')
-                
-                # 如果股價資料有效（不是 "-", "N/A", "0" 或空值）
-                if (realtime_price not in ['-', 'N/A', '0', '', None] or 
-                    close_price not in ['-', 'N/A', '0', '', None]):
-                    # 儲存快取
-                    save_cache(cache_key, stock_data)
-                    print(f"✅ 成功從 {source_name} 獲取資料並快取")
-                    return stock_data
-                else:
-                    print(f"⚠️ {source_name} 回傳資料但股價無效: 即時股價={realtime_price}, 收盤價={close_price}")
-            else:
-                print(f"❌ {source_name} 資料不完整或有錯誤")
-                
-        except Exception as e:
-            print(f"❌ {source_name} 發生異常: {e}")
-            continue
+    source_name, stock_data = run_sources(data_sources, is_valid_stock_data, kind='stock')
+    if stock_data:
+        # 儲存快取
+        save_cache(cache_key, stock_data)
+        print(f"✅ 成功從 {source_name} 獲取資料並快取")
+        return stock_data
+    
+    # 所有資料來源都失敗，沿用最後一次的有效資料
+    stale_data = get_stale_cache(cache_key)
+    if stale_data:
+        print(f"⚠️ 所有資料來源都失敗，沿用延遲資料: {clean_code}")
+        return stale_data
     
-    # 所有資料來源都失敗
     error_result = {
         '股票代碼': clean_code,
         '股票名稱': get_stock_name(clean_code),
         '錯誤': f'無法從任何資料來源獲取股票 {clean_code} 的資料'
     }
+    save_negative_cache(clean_code, error_result)
     print(f"❌ 所有資料來源都失敗: {clean_code}")
     return error_result
 
 
-def get_stock_name_from_api(stock_code):
-    """從 API 動態獲取股票名稱"""
+def get_stock_quotes(stock_codes, fallback=True, refresh=False, deadline=None):
+    """
+    批次獲取多檔股票資訊
+    
+    先讀取快取，未命中的代碼依 CONFIG['batch_size'] 分批，每批只發出一次
+    證交所即時報價請求（各批次同時進行）；批次中查無有效股價的代碼再同時走
+    多重資料來源查詢。
+    :param stock_codes: 股票代碼列表
+    :param fallback: 批次查無資料時是否改用多重資料來源逐檔查詢
+    :param refresh: 略過快取，直接向上游查詢並更新快取（背景輪詢使用）
+    :param deadline: 等待上游查詢的最長秒數，None 表示等到完成；逾時的代碼於背景繼續查詢，
+                     先回傳 '狀態' 為 PENDING_STATUS 的資訊（見 is_pending）
+    :return: dict，股票代碼 -> 股票資訊（失敗時包含 '錯誤'）
+    """
+    # 清理並去除重複代碼，保留原始順序
+    codes = []
+    for stock_code in stock_codes:
+        clean_code = clean_stock_code(stock_code)
+        if clean_code and clean_code not in codes:
+            codes.append(clean_code)
+    
+    if refresh:
+        results = _fetch_stock_quotes(codes, fallback)
+        return {code: results[code] for code in codes}
+    
+    results = {}
+    missing = []
+    stale = []
+    entries = get_cache_entries([f"stock_basic_{code}" for code in codes])
+    for code in codes:
+        entry = entries.get(f"stock_basic_{code}")
+        if _is_fresh(entry):
+            results[code] = entry[0]
+        elif _is_usable_stale(entry):
+            results[code] = _mark_stale(entry)
+            stale.append(code)
+        else:
+            missing.append(code)
+    
+    # 過期的代碼先回傳舊資料，整批於背景更新
+    if stale:
+        batch_key = hashlib.sha1(','.join(stale).encode()).hexdigest()[:16]
+        schedule_refresh(f"stock_quotes_{batch_key}", lambda: _fetch_stock_quotes(stale, fallback))
+    
+    # 不存在的代碼與近期查詢失敗的代碼直接回傳錯誤
+    negative = get_cache_entries([f"neg_stock_{code}" for code in missing])
+    for code in list(missing):
+        error_result = reject_stock_code(code)
+        entry = negative.get(f"neg_stock_{code}")
+        if not error_result and _is_fresh(entry):
+            _count('negative_hits')
+            error_result = entry[0]
+        if error_result:
+            results[code] = error_result
+            missing.remove(code)
+    
+    if missing:
+        print(f"📦 批次獲取 {len(missing)} 檔股票（快取命中 {len(results)} 檔）...")
+        if deadline is None:
+            results.update(_fetch_stock_quotes(missing, fallback))
+        else:
+            results.update(_fetch_stock_quotes_within(missing, fallback, deadline))
+    
+    return {code: results[code] for code in codes}
+
+
+def _fetch_stock_quotes(codes, fallback=True):
+    """不經快取，批次向上游獲取多檔股票資訊並寫入快取"""
+    results = {}
+    
+    # 所有批次同時送出，有效結果在單一交易內寫入快取
+    for code, stock_data in run_sync(async_get_stocks_in_batches(codes)).items():
+        if is_valid_stock_data(stock_data):
+            results[code] = stock_data
+    save_cache_many({f"stock_basic_{code}": stock_data for code, stock_data in results.items()})
+    
+    # 批次沒有涵蓋的代碼（如上櫃股票或暫無成交）
+    remaining = [code for code in codes if code not in results]
+    if fallback:
+        # 各代碼同時查詢，總耗時約為最慢的一檔而非逐檔相加
+        fetches = [_fallback_executor.submit(_fetch_fallback, code) for code in remaining]
+        for code, future in zip(remaining, fetches):
+            results[code] = future.result()
+    else:
+        for code in remaining:
+            results[code] = get_stale_cache(f"stock_basic_{code}") or {
+                '股票代碼': code,
+                '股票名稱': get_stock_name(code),
+                '錯誤': f'無法從證交所即時報價獲取股票 {code} 的資料'
+            }
+    
+    return results
+
+
+def _fetch_fallback(code):
+    """多重資料來源查詢單一代碼（同一代碼同時只查詢一次，排隊期間已由其他查詢寫入快取時直接使用）"""
+    cache_key = f"stock_basic_{code}"
+    return _singleflight.do(cache_key,
+                            lambda: _fetch_stock_basic_info(code, cache_key),
+                            recheck=lambda: get_cache(cache_key))
+
+
+def _fetch_stock_quotes_within(codes, fallback, deadline):
+    """
+    在 deadline 秒內批次查詢；逾時時查詢在背景繼續並寫入快取，
+    已寫入快取的代碼回傳報價，其餘回傳載入中
+    先前逾時的查詢仍在進行的代碼不再重複送出，改為等待該查詢
+    """
+    with _deferred_lock:
+        fetches = {_deferred[code] for code in codes if code in _deferred}
+        new_codes = [code for code in codes if code not in _deferred]
+        if new_codes:
+            fetch = _refresh_executor.submit(_fetch_stock_quotes, new_codes, fallback)
+            fetches.add(fetch)
+            for code in new_codes:
+                _deferred[code] = fetch
+    if new_codes:
+        # 在鎖外登記：查詢已完成時回呼會立即在此執行緒執行
+        fetch.add_done_callback(lambda done: _release_deferred(new_codes, done))
+    
+    finished, _ = wait(fetches, timeout=deadline)
+    if len(finished) == len(fetches):
+        results = {}
+        for fetch in fetches:
+            results.update(fetch.result())
+        return {code: results[code] for code in codes}
+    
+    results = {}
+    entries = get_cache_entries([f"stock_basic_{code}" for code in codes])
+    for code in codes:
+        entry = entries.get(f"stock_basic_{code}")
+        if _is_fresh(entry):
+            results[code] = entry[0]
+        else:
+            results[code] = {'股票代碼': code, '股票名稱': get_symbol_name(code) or code, '狀態': PENDING_STATUS}
+    pending = sum(1 for result in results.values() if is_pending(result))
+    print(f"⏳ {deadline} 秒內未取得 {pending} 檔股票報價，於背景繼續查詢")
+    return results
+
+
+def _release_deferred(codes, fetch):
+    """背景批次查詢完成後移除其代碼的進行中紀錄"""
+    with _deferred_lock:
+        for code in codes:
+            if _deferred.get(code) is fetch:
+                del _deferred[code]
+
+
+def is_pending(stock_info):
+    """是否為期限內尚未取得的報價（見 get_stock_quotes 的 deadline）"""
+    return isinstance(stock_info, dict) and stock_info.get('狀態') == PENDING_STATUS
+
+
+async def async_get_stock_name_from_api(stock_code):
+    """從 API 動態獲取股票名稱（非同步版本，同一代碼同時只查詢一次）"""
+    task = _name_tasks.get(stock_code)
+    if task is None:
+        task = asyncio.ensure_future(_async_fetch_stock_name(stock_code))
+        _name_tasks[stock_code] = task
+        task.add_done_callback(lambda _: _name_tasks.pop(stock_code, None))
+    return await asyncio.shield(task)
+
+
+async def _async_fetch_stock_name(stock_code):
+    """從證交所即時報價或 Yahoo Finance 查詢股票名稱"""
     try:
         # 嘗試從證交所即時報價 API 獲取名稱
-        url = f"https://mis.twse.com.tw/stock/api/getStockInfo.jsp?ex_ch=tse_{stock_code}.tw"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Referer': 'https://mis.twse.com.tw/',
-            'Accept': 'application/json'
-        }
+        url = f"https://mis.twse.com.tw/stock/api/getStockInfo.jsp?ex_ch={get_mis_channel(stock_code)}"
         
-        resp = requests.get(url, timeout=5, headers=headers)
-        if resp.status_code == 200:
-            data = resp.json()
+        _, data = await async_http_get_json(url, get_timeout(5), headers=MIS_HEADERS, raise_for_status=False)
+        if data:
             if data.get('msgArray') and len(data['msgArray']) > 0:
                 stock_data = data['msgArray'][0]
                 name = stock_data.get('n', '').strip()
@@ -452,9 +814,8 @@ def get_stock_name_from_api(stock_code):
         yahoo_symbol = f"{stock_code}.TW"
         yahoo_url = f"https://query1.finance.yahoo.com/v8/finance/chart/{yahoo_symbol}"
         
-        resp = requests.get(yahoo_url, timeout=5, headers=HEADERS)
-        if resp.status_code == 200:
-            data = resp.json()
+        _, data = await async_http_get_json(yahoo_url, get_timeout(5), headers=HEADERS, raise_for_status=False)
+        if data:
             if data.get('chart') and data['chart'].get('result'):
                 result = data['chart']['result'][0]
                 meta = result.get('meta', {})
@@ -476,36 +837,76 @@ def get_stock_name_from_api(stock_code):
     return None
 
 
+def get_stock_name_from_api(stock_code):
+    """從 API 動態獲取股票名稱（同一代碼同時只查詢一次，結果寫入快取）"""
+    cache_key = f"stock_name_{stock_code}"
+    
+    def fetch():
+        name = run_sync(async_get_stock_name_from_api(stock_code))
+        if name:
+            save_cache(cache_key, name, ttl=CONFIG['cache_duration'])
+        return name
+    
+    return get_cache(cache_key) or _singleflight.do(cache_key, fetch, recheck=lambda: get_cache(cache_key))
+
+
+async def async_get_stock_name(stock_code):
+    """取得股票名稱 - 先查股票主檔，再嘗試 API，失敗則使用預設名稱（非同步版本）"""
+    name = get_symbol_name(stock_code)
+    if name:
+        return name
+    
+    api_name = await async_get_stock_name_from_api(stock_code)
+    if api_name:
+        remember_symbol(stock_code, api_name)
+        return api_name
+    return COMMON_STOCK_NAMES.get(stock_code, stock_code)
+
+
 def get_stock_name(stock_code):
-    """取得股票名稱 - 先嘗試 API，失敗則使用預設名稱"""
-    # 先嘗試從 API 動態獲取
+    """取得股票名稱 - 先查股票主檔，再嘗試 API，失敗則使用預設名稱"""
+    # 股票主檔為記憶體查找，不需要網路請求
+    name = get_symbol_name(stock_code)
+    if name:
+        return name
+    
+    # 主檔沒有的代碼才從 API 動態獲取
     api_name = get_stock_name_from_api(stock_code)
     if api_name:
+        remember_symbol(stock_code, api_name)
         return api_name
     
-    # 備用：常見股票的預設名稱（只保留最常見的）
-    common_stocks = {
-        '2330': '台積電',
-        '2317': '鴻海', 
-        '2454': '聯發科',
-        '0050': '元大台灣50',
-        '0056': '元大高股息',
-        '006208': '富邦台50',
-        '00878': '國泰永續高股息',
-        '00919': '群益台灣精選高息',
-    }
-    
-    return common_stocks.get(stock_code, stock_code)
+    # 備用：常見股票的預設名稱
+    return COMMON_STOCK_NAMES.get(stock_code, stock_code)
 
 
-def get_market_summary():
-    """獲取大盤摘要資訊 - 改進版"""
+def get_market_summary(refresh=False):
+    """
+    獲取大盤摘要資訊 - 改進版
+    :param refresh: 略過快取，直接向上游查詢並更新快取（背景輪詢使用）
+    """
     cache_key = "market_summary"
+    if refresh:
+        return _singleflight.do(cache_key, lambda: _fetch_market_summary(cache_key))
+    
     cached_data = get_cache(cache_key)
     if cached_data:
         print("🔄 使用大盤快取資料")
         return cached_data
     
+    stale_data = get_stale_cache(cache_key)
+    if stale_data:
+        print("🔄 使用大盤延遲資料並於背景更新")
+        schedule_refresh(cache_key, lambda: _fetch_market_summary(cache_key))
+        return stale_data
+    
+    return _singleflight.do(cache_key,
+                            lambda: _fetch_market_summary(cache_key),
+                            recheck=lambda: get_cache(cache_key))
+
+
+def _fetch_market_summary(cache_key):
+    """依多重資料來源獲取大盤資訊並寫入快取"""
     print("📊 獲取大盤即時資料...")
     
     # 嘗試多個資料來源 - 優先使用證交所
@@ -520,118 +921,249 @@ def get_market_summary():
         ("Yahoo Finance Alternative", lambda: get_market_from_yahoo("https://query1.finance.yahoo.com/v7/finance/quote?symbols=%5ETWII")),
     ]
     
-    for source_name, get_data_func in data_sources:
-        try:
-            print(f"📡 嘗試 {source_name}...")
-            market_info = get_data_func()
-            
-            if market_info and not market_info.get('錯誤'):
-                save_cache(cache_key, market_info)
-                print(f"✅ 成功從 {source_name} 獲取大盤資料")
-                return market_info
-            else:
-                print(f"❌ {source_name} 回應格式不正確")
-                
-        except Exception as e:
-            print(f"❌ {source_name} 獲取失敗: {e}")
-            continue
+    source_name, market_info = run_sources(data_sources, is_valid_market_data, kind='index')
+    if market_info:
+        save_cache(cache_key, market_info)
+        print(f"✅ 成功從 {source_name} 獲取大盤資料")
+        return market_info
+    
+    # 所有資料來源都失敗，沿用最後一次的有效資料
+    stale_data = get_stale_cache(cache_key)
+    if stale_data:
+        print("⚠️ 所有大盤資料來源都失敗，沿用延遲資料")
+        return stale_data
     
-    # 所有資料來源都失敗，回傳模擬資料
-    print("⚠️ 所有大盤資料來源都失敗，使用模擬資料")
+    # 沒有任何可用資料：各欄位標示 N/A 並附上錯誤訊息（不寫入快取，下次請求重新查詢）
+    print("❌ 所有大盤資料來源都失敗，目前無大盤資料")
     return {
-        '指數': '18,500.00',
-        '漲跌點數': '+125.50',
-        '漲跌幅': '+0.68%',
-        '成交量': '2,156,789,000',
+        '指數': 'N/A',
+        '漲跌點數': 'N/A',
+        '漲跌幅': 'N/A',
+        '成交量': 'N/A',
         '更新時間': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        '狀態': '模擬資料'
+        '錯誤': '目前無法取得大盤資訊，請稍後再試'
     }
 
 
-def get_market_from_yahoo(url):
-    """從 Yahoo Finance 獲取大盤資料的輔助函數"""
-    try:
-        resp = requests.get(url, timeout=CONFIG['timeout'], headers=HEADERS)
-        resp.raise_for_status()
-        data = resp.json()
+def _parse_yahoo_market(data):
+    """將 Yahoo Finance chart 或 quote API 的指數資料轉換為大盤資訊字典"""
+    market_info = None
+    
+    if 'chart' in data and data['chart'].get('result'):
+        # Chart API 格式
+        result = data['chart']['result'][0]
+        meta = result.get('meta', {})
         
-        market_info = None
+        current_price = meta.get('regularMarketPrice')
+        previous_close = meta.get('regularMarketPreviousClose')
+        volume = meta.get('regularMarketVolume', 0)
         
-        if 'chart' in data and data['chart'].get('result'):
-            # Chart API 格式
-            result = data['chart']['result'][0]
-            meta = result.get('meta', {})
-            
-            current_price = meta.get('regularMarketPrice')
-            previous_close = meta.get('regularMarketPreviousClose')
-            volume = meta.get('regularMarketVolume', 0)
+        if current_price and previous_close:
+            change = current_price - previous_close
+            change_percent = (change / previous_close) * 100
             
-            if current_price and previous_close:
-                change = current_price - previous_close
-                change_percent = (change / previous_close) * 100
-                
-                market_info = {
-                    '指數': f"{current_price:,.2f}",
-                    '漲跌點數': f"{change:+.2f}",
-                    '漲跌幅': f"{change_percent:+.2f}%",
-                    '成交量': f"{volume:,}" if volume else "N/A",
-                    '更新時間': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                }
+            market_info = {
+                '指數': f"{current_price:,.2f}",
+                '漲跌點數': f"{change:+.2f}",
+                '漲跌幅': f"{change_percent:+.2f}%",
+                '成交量': f"{volume:,}" if volume else "N/A",
+                '更新時間': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+    
+    elif 'quoteResponse' in data and data['quoteResponse'].get('result'):
+        # Quote API 格式
+        result = data['quoteResponse']['result'][0]
         
-        elif 'quoteResponse' in data and data['quoteResponse'].get('result'):
-            # Quote API 格式
-            result = data['quoteResponse']['result'][0]
-            
-            current_price = result.get('regularMarketPrice')
-            change = result.get('regularMarketChange')
-            change_percent = result.get('regularMarketChangePercent')
-            volume = result.get('regularMarketVolume', 0)
-            
-            if current_price:
-                market_info = {
-                    '指數': f"{current_price:,.2f}",
-                    '漲跌點數': f"{change:+.2f}" if change else "N/A",
-                    '漲跌幅': f"{change_percent:+.2f}%" if change_percent else "N/A",
-                    '成交量': f"{volume:,}" if volume else "N/A",
-                    '更新時間': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                }
+        current_price = result.get('regularMarketPrice')
+        change = result.get('regularMarketChange')
+        change_percent = result.get('regularMarketChangePercent')
+        volume = result.get('regularMarketVolume', 0)
         
-        return market_info
+        if current_price:
+            market_info = {
+                '指數': f"{current_price:,.2f}",
+                '漲跌點數': f"{change:+.2f}" if change else "N/A",
+                '漲跌幅': f"{change_percent:+.2f}%" if change_percent else "N/A",
+                '成交量': f"{volume:,}" if volume else "N/A",
+                '更新時間': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+    
+    return market_info
+
+
+async def async_get_market_from_yahoo(url):
+    """從 Yahoo Finance 獲取大盤資料的輔助函數（非同步版本）"""
+    try:
+        _, data = await async_http_get_json(url, get_timeout(), headers=HEADERS)
+        return _parse_yahoo_market(data)
         
     except Exception as e:
         print(f"Yahoo Finance 錯誤: {e}")
-        return None
+        raise
+
+
+def get_market_from_yahoo(url):
+    """從 Yahoo Finance 獲取大盤資料的輔助函數"""
+    return run_sync(async_get_market_from_yahoo(url))
+
+
+def get_quote_ttl(now=None):
+    """
+    依盤勢決定報價快取的存活秒數
+    盤中使用短時間；休市時快取到下一次盤勢變化（如隔個交易日開始試撮）為止
+    """
+    now = now or now_taipei()
+    phase = market_phase(now)
+    if is_market_open(now):
+        ttl = CONFIG['session_cache_duration']
+    elif phase == AFTER_HOURS:
+        ttl = CONFIG['after_hours_cache_duration']
+    else:
+        ttl = None
+    
+    seconds_to_change = (next_phase_change(now) - now).total_seconds()
+    if ttl is None:
+        return max(seconds_to_change, CONFIG['session_cache_duration'])
+    # 不跨越盤勢變化的時間點（例如收盤時立即更新為收盤價）
+    return max(min(ttl, seconds_to_change), 1)
+
+
+def _remember_entry(key, data, stored_at, expires_at):
+    """寫入記憶體快取，保留到到期後再加上可沿用的延遲時間"""
+    retention = expires_at - stored_at + CONFIG['max_staleness']
+    _memory_cache.set(key, (expires_at, data), stored_at=stored_at, ttl=retention)
+
+
+def get_cache_entries(keys):
+    """
+    批次獲取快取資料 - 先查記憶體，未命中或已到期的鍵值再以單一查詢讀取 SQLite
+    （SQLite 中的資料可能已由其他 worker 行程更新）
+    :return: {鍵值: (資料, 寫入時間, 到期時間)}，時間皆為 timestamp；不存在的鍵值不列出
+    """
+    now = time.time()
+    results = {}
+    lookup = []
+    for key in keys:
+        entry = _memory_cache.get_entry(key)
+        if entry:
+            stored_at, (expires_at, data) = entry
+            results[key] = (data, stored_at, expires_at)
+            if now < expires_at:
+                continue
+        lookup.append(key)
+    
+    for key, entry in _store.get_many(lookup).items():
+        data, stored_at, expires_at = entry
+        if key not in results or stored_at > results[key][1]:
+            # 回填記憶體快取，保留原始寫入時間
+            _remember_entry(key, data, stored_at, expires_at)
+            results[key] = entry
+    return results
+
+
+def get_cache_entry(key):
+    """
+    獲取單一快取資料
+    :return: (資料, 寫入時間, 到期時間)；不存在時回傳 None
+    """
+    return get_cache_entries([key]).get(key)
+
+
+def _is_fresh(entry):
+    return entry is not None and time.time() < entry[2]
+
+
+def _is_usable_stale(entry):
+    return entry is not None and time.time() - entry[2] < CONFIG['max_staleness']
+
+
+def _mark_stale(entry):
+    """回傳加上 '狀態': '延遲資料' 與 '資料時間' 標記的副本"""
+    data, stored_at, _ = entry
+    if isinstance(data, Quote):
+        return data.replace(status='延遲資料')
+    if not isinstance(data, dict):
+        return data
+    stale_data = dict(data)
+    stale_data['狀態'] = '延遲資料'
+    stale_data['資料時間'] = datetime.fromtimestamp(stored_at).strftime('%Y-%m-%d %H:%M:%S')
+    return stale_data
 
 
 def get_cache(key):
-    """獲取快取資料"""
-    cache_file = os.path.join(CACHE_DIR, f"{key}.json")
-    if os.path.exists(cache_file):
+    """獲取未到期的快取資料"""
+    entry = get_cache_entry(key)
+    return entry[0] if _is_fresh(entry) else None
+
+
+def get_stale_cache(key):
+    """
+    獲取已到期但到期不超過 CONFIG['max_staleness'] 的快取資料
+    回傳副本並加上 '狀態': '延遲資料' 與 '資料時間' 標記
+    """
+    entry = get_cache_entry(key)
+    return _mark_stale(entry) if _is_usable_stale(entry) else None
+
+
+def schedule_refresh(key, fetch):
+    """在背景執行 fetch 更新快取；同一快取鍵已在更新中時略過"""
+    with _refreshing_lock:
+        if key in _refreshing:
+            return False
+        _refreshing.add(key)
+    
+    def refresh():
         try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cache_data = json.load(f)
-            
-            # 檢查快取是否過期
-            cache_time = datetime.fromisoformat(cache_data['timestamp'])
-            if datetime.now() - cache_time < timedelta(seconds=CONFIG['cache_duration']):
-                return cache_data['data']
+            _singleflight.do(key, fetch)
         except Exception as e:
-            print(f"❌ 讀取快取失敗: {e}")
-    return None
+            print(f"❌ 背景更新快取失敗 {key}: {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+    
+    _refresh_executor.submit(refresh)
+    return True
 
 
-def save_cache(key, data):
-    """儲存快取資料"""
-    cache_file = os.path.join(CACHE_DIR, f"{key}.json")
-    try:
-        cache_data = {
-            'timestamp': datetime.now().isoformat(),
-            'data': data
-        }
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(cache_data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"❌ 儲存快取失敗: {e}")
+def save_cache(key, data, ttl=None):
+    """
+    儲存快取資料 - 同時寫入記憶體與 SQLite
+    :param ttl: 存活秒數，未指定時依盤勢決定（見 get_quote_ttl）
+    """
+    save_cache_many({key: data}, ttl=ttl)
+
+
+def save_cache_many(items, ttl=None):
+    """
+    在單一交易內儲存多筆快取資料
+    :param items: {鍵值: 資料}
+    :param ttl: 存活秒數，未指定時依盤勢決定（見 get_quote_ttl）
+    """
+    stored_at = time.time()
+    expires_at = stored_at + (get_quote_ttl() if ttl is None else ttl)
+    purge_at = expires_at + CONFIG['max_staleness']
+    for key, data in items.items():
+        _remember_entry(key, data, stored_at, expires_at)
+    _store.put_many([(key, data, stored_at, expires_at, purge_at) for key, data in items.items()])
+    
+    for listener in _cache_listeners:
+        try:
+            listener(list(items))
+        except Exception as e:
+            print(f"❌ 快取寫入通知失敗: {e}")
+
+
+def add_cache_listener(listener):
+    """
+    註冊快取寫入通知（只涵蓋本行程的寫入）
+    :param listener: listener(鍵值列表)，在寫入快取的執行緒中呼叫，必須立即返回
+    """
+    _cache_listeners.append(listener)
+
+
+def get_cache_stats():
+    """取得記憶體快取的命中、未命中與淘汰統計，以及 SQLite 快取與失敗快取的統計"""
+    return dict(_memory_cache.stats(), store=_store.stats(), negative=get_negative_stats())
 
 
 def search_stock(stock_code):
@@ -646,14 +1178,16 @@ def search_stock(stock_code):
     print(f"\n🔍 === 搜尋股票：{clean_code} ===")
     stock_info = get_stock_basic_info(clean_code)
     
-    if stock_info and not stock_info.get('錯誤'):
-        print(f"\n✅ 找到股票：{stock_info.get('股票名稱', 'N/A')} ({clean_code})")
-        print(f"💰 收盤價：{stock_info.get('收盤價', 'N/A')}")
-        print(f"🔓 開盤價：{stock_info.get('開盤價', 'N/A')}")
-        print(f"📈 漲跌：{stock_info.get('漲跌價差', 'N/A')} ({stock_info.get('漲跌幅', 'N/A')})")
-        print(f"📊 成交量：{stock_info.get('成交量', 'N/A')}")
-        if stock_info.get('成交金額'):
-            print(f"💸 成交金額：{stock_info.get('成交金額', 'N/A')}")
+    if isinstance(stock_info, Quote):
+        print(f"\n✅ 找到股票：{stock_info.name} ({clean_code})")
+        print(f"💰 收盤價：{format_price(stock_info.price)}")
+        print(f"🔓 開盤價：{format_price(stock_info.open)}")
+        print(f"📈 漲跌：{format_change(stock_info.change)} ({format_percent(stock_info.change_percent)})")
+        print(f"📊 成交量：{format_volume(stock_info.volume)}")
+        if stock_info.turnover is not None:
+            print(f"💸 成交金額：{format_volume(stock_info.turnover)}")
+        if stock_info.status:
+            print(f"ℹ️ {stock_info.status}")
         return stock_info
     else:
         error_msg = stock_info.get('錯誤', '未知錯誤') if stock_info else '無法找到股票'